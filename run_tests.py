@@ -13,6 +13,7 @@ Opciones:
   suppliers        - Ejecutar tests de suppliers
   coverage         - Ejecutar con coverage
   verbose          - Ejecutar con verbosity=2
+  bench [args]     - Benchmark de CRUD y auditoría (manage.py bench_crud)
   help             - Mostrar esta ayuda
 """
 
@@ -84,6 +85,10 @@ def show_coverage_report():
     except FileNotFoundError:
         pass
 
+def run_benchmark(extra_args):
+    """Ejecutar el benchmark de CRUD y auditoría (ver bench_crud --help)"""
+    return run_command([sys.executable, "manage.py", "bench_crud"] + extra_args)
+
 def show_help():
     """Mostrar ayuda"""
     print(__doc__)
@@ -119,6 +124,8 @@ def main():
         return exit_code
     elif option == "verbose":
         return run_all_tests()
+    elif option == "bench":
+        return run_benchmark(args[1:])
     else:
         print(f"Opción desconocida: {option}")
         print("Usa 'help' para ver las opciones disponibles")
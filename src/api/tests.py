@@ -0,0 +1,205 @@
+import json
+
+from django.test import TestCase
+from django.urls import reverse
+
+from clients.models import Client
+from core.models import AuditLog
+
+
+class EntityApiTests(TestCase):
+    """Tests para /api/v1/clients/ y /api/v1/suppliers/"""
+
+    def setUp(self):
+        """Configuración inicial para las pruebas"""
+        from django.contrib.auth import get_user_model
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.force_login(get_user_model().objects.create_superuser('api', password='x'))
+            self.clients = [
+                Client.objects.create(company_name=f"Empresa {i}", name=f"Contacto {i}", is_active=i % 2 == 0)
+                for i in range(5)
+            ]
+
+    def _send(self, method, url, data, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return getattr(self.client, method)(url, json.dumps(data), content_type='application/json', **kwargs)
+
+    def test_list_with_cursor(self):
+        """Test que el listado pagina por cursor sobre el pk"""
+        url = reverse('api:clients')
+        first = self.client.get(url, {'limit': 2}).json()
+        self.assertEqual([r['id'] for r in first['results']], [c.pk for c in self.clients[:2]])
+        self.assertIsNotNone(first['next'])
+        second = self.client.get(url, {'limit': 2, 'cursor': first['next_cursor']}).json()
+        self.assertEqual([r['id'] for r in second['results']], [c.pk for c in self.clients[2:4]])
+
+    def test_sparse_fieldsets(self):
+        """Test que fields= proyecta sólo las columnas pedidas"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get(reverse('api:clients'), {'fields': 'company_name', 'active': '1'}).json()
+        self.assertEqual(data['results'][0], {'company_name': 'Empresa 0'})
+        self.assertEqual(len(data['results']), 3)
+        self.assertNotIn('"address"', ctx.captured_queries[-1]['sql'])
+
+    def test_unknown_field_and_bad_cursor(self):
+        """Test que campos desconocidos o cursor inválido devuelven 400"""
+        url = reverse('api:clients')
+        self.assertEqual(self.client.get(url, {'fields': 'password'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'cursor': 'xx'}).status_code, 400)
+
+    def test_detail(self):
+        """Test del detalle con fields="""
+        obj = self.clients[0]
+        response = self.client.get(reverse('api:client', args=[obj.pk]), {'fields': 'id,name'})
+        self.assertEqual(response.json(), {'id': obj.pk, 'name': 'Contacto 0'})
+        self.assertEqual(self.client.get(reverse('api:client', args=[9999])).status_code, 404)
+
+    def test_bulk_create(self):
+        """Test del alta masiva con una sola entrada de auditoría por objeto"""
+        AuditLog.objects.all().delete()
+        response = self._send('post', reverse('api:suppliers'), [
+            {'company_name': 'Prov A', 'name': 'Ana'},
+            {'company_name': 'Prov B', 'name': 'Beto', 'is_active': False},
+        ])
+        self.assertEqual(response.status_code, 201)
+        results = response.json()['results']
+        self.assertEqual([r['is_active'] for r in results], [True, False])
+        self.assertEqual(AuditLog.objects.filter(action='create').count(), 2)
+
+    def test_bulk_create_is_all_or_nothing(self):
+        """Test que un objeto inválido cancela todo el alta"""
+        from suppliers.models import Supplier
+
+        response = self._send('post', reverse('api:suppliers'), [
+            {'company_name': 'Prov A', 'name': 'Ana'},
+            {'name': 'Sin razón social', 'email': 'no-es-email'},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()['errors']['1']), {'company_name', 'email'})
+        self.assertFalse(Supplier.objects.exists())
+
+    def test_bulk_update(self):
+        """Test de la modificación masiva parcial"""
+        a, b = self.clients[:2]
+        response = self._send('patch', reverse('api:clients'), [
+            {'id': a.pk, 'name': 'Nuevo'},
+            {'id': b.pk, 'name': b.name},
+        ])
+        self.assertEqual(response.status_code, 200)
+        a.refresh_from_db()
+        self.assertEqual((a.name, a.company_name), ('Nuevo', 'Empresa 0'))
+        update = AuditLog.objects.get(action='update')
+        self.assertEqual(update.object_pk, str(a.pk))
+        self.assertEqual(update.changes, {'name': ['Contacto 0', 'Nuevo']})
+
+    def test_bulk_update_unknown_id(self):
+        """Test que un id inexistente devuelve 400"""
+        response = self._send('patch', reverse('api:clients'), [{'id': 9999, 'name': 'X'}])
+        self.assertEqual(response.status_code, 400)
+
+    def test_filter_by_normalized_tax_id(self):
+        """Test que tax_id= ignora guiones, espacios y puntos"""
+        Client.objects.create(company_name="Con CUIT", name="C", tax_id="20-12345678-9")
+        data = self.client.get(reverse('api:clients'), {'tax_id': '20 12345678 9', 'fields': 'company_name'}).json()
+        self.assertEqual(data['results'], [{'company_name': 'Con CUIT'}])
+
+    def test_writes_require_json(self):
+        """Test que las escrituras exigen Content-Type JSON"""
+        response = self.client.post(reverse('api:clients'), {'company_name': 'X', 'name': 'Y'})
+        self.assertEqual(response.status_code, 415)
+
+
+class AuditApiTests(TestCase):
+    """Tests para /api/v1/audit/"""
+
+    def test_read_only_list_with_filters(self):
+        """Test que la auditoría se lista de la más nueva a la más vieja y filtra"""
+        from django.contrib.auth import get_user_model
+
+        with self.captureOnCommitCallbacks(execute=True):
+            obj = Client.objects.create(company_name="Empresa", name="Contacto")
+        with self.captureOnCommitCallbacks(execute=True):
+            obj.name = "Otro"
+            obj.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.force_login(get_user_model().objects.create_superuser('admin', password='x'))
+        data = self.client.get(reverse('api:audit'), {
+            'content_type': 'clients.client', 'object_pk': obj.pk, 'fields': 'action',
+        }).json()
+        self.assertEqual(data['results'], [{'action': 'update'}, {'action': 'create'}])
+        self.assertEqual(self.client.post(reverse('api:audit')).status_code, 405)
+
+    def test_pages_keep_rows_of_the_same_millisecond(self):
+        """Test que paginar no pierde entradas escritas en el mismo milisegundo"""
+        import datetime
+        from django.contrib.auth import get_user_model
+        from django.utils import timezone
+
+        base = timezone.now().replace(microsecond=500000)
+        entries = [
+            AuditLog.objects.create(action='create', object_repr='x', timestamp=base + datetime.timedelta(microseconds=i))
+            for i in range(5)
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.force_login(get_user_model().objects.create_superuser('admin', password='x'))
+        seen, params = [], {'action': 'create', 'fields': 'id', 'limit': 2}
+        while True:
+            data = self.client.get(reverse('api:audit'), params).json()
+            seen.extend(row['id'] for row in data['results'])
+            if not data['next_cursor']:
+                break
+            params['cursor'] = data['next_cursor']
+        self.assertEqual(seen, [entry.pk for entry in reversed(entries)])
+
+
+class ApiAccessTests(TestCase):
+    """Tests para la autenticación y los permisos de la API"""
+
+    def _user(self, username, *perms, is_staff=False):
+        from django.contrib.auth import get_user_model
+        from django.contrib.auth.models import Permission
+
+        user = get_user_model().objects.create_user(username, password='x', is_staff=is_staff)
+        for perm in perms:
+            app_label, codename = perm.split('.')
+            user.user_permissions.add(Permission.objects.get(content_type__app_label=app_label, codename=codename))
+        return user
+
+    def _post(self, data):
+        return self.client.post(reverse('api:clients'), json.dumps(data), content_type='application/json')
+
+    def test_anonymous_cannot_write(self):
+        """Test que sin sesión el alta y la modificación devuelven 401"""
+        obj = Client.objects.create(company_name="Empresa", name="Contacto")
+        self.assertEqual(self._post({'company_name': 'X', 'name': 'Y'}).status_code, 401)
+        response = self.client.patch(
+            reverse('api:clients'), json.dumps([{'id': obj.pk, 'name': 'Z'}]), content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(list(Client.objects.values_list('name', flat=True)), ["Contacto"])
+
+    def test_writes_need_model_permission(self):
+        """Test que escribir exige el permiso add/change del modelo"""
+        self.client.force_login(self._user('sin-permisos'))
+        self.assertEqual(self._post({'company_name': 'X', 'name': 'Y'}).status_code, 403)
+        self.client.force_login(self._user('carga', 'clients.add_client'))
+        self.assertEqual(self._post({'company_name': 'X', 'name': 'Y'}).status_code, 201)
+
+    def test_audit_requires_staff_with_view_permission(self):
+        """Test que la auditoría exige un usuario staff con permiso de lectura"""
+        url = reverse('api:audit')
+        self.assertEqual(self.client.get(url).status_code, 401)
+        self.client.force_login(self._user('lector', 'core.view_auditlog'))
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(self._user('staff', is_staff=True))
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(self._user('auditor', 'core.view_auditlog', is_staff=True))
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_entity_reads_stay_open(self):
+        """Test que leer entidades no exige sesión, como las páginas del sitio"""
+        self.assertEqual(self.client.get(reverse('api:clients')).status_code, 200)
@@ -0,0 +1,12 @@
+from django.urls import path
+from . import views
+
+app_name = 'api'
+
+urlpatterns = [
+    path('v1/clients/', views.entity_collection, {'target': 'clients'}, name='clients'),
+    path('v1/clients/<int:pk>/', views.entity_detail, {'target': 'clients'}, name='client'),
+    path('v1/suppliers/', views.entity_collection, {'target': 'suppliers'}, name='suppliers'),
+    path('v1/suppliers/<int:pk>/', views.entity_detail, {'target': 'suppliers'}, name='supplier'),
+    path('v1/audit/', views.audit_list, name='audit'),
+]
@@ -0,0 +1,315 @@
+"""API JSON v1 de clientes, proveedores y auditoría.
+
+Las lecturas no construyen instancias: proyectan sólo las columnas pedidas
+con `values(*fields)` (`?fields=id,company_name`) y paginan por cursor sobre
+el pk con `KeysetPaginator`, así que cada página cuesta lo mismo sin
+importar la profundidad. Las escrituras aceptan un objeto o una lista y se
+aplican todas o ninguna: se validan con el mismo `ModelForm` del alta y se
+guardan con un único `bulk_create` / `bulk_update` por request.
+
+Acceso: la lectura de entidades es abierta, como las páginas del sitio. Las
+escrituras exigen una sesión iniciada con el permiso `add_<modelo>` (POST)
+o `change_<modelo>` (PATCH), y la auditoría un usuario staff con
+`core.view_auditlog`, el mismo que pide el admin: sin sesión se responde
+401 y sin permiso 403. Como no se usa el token CSRF, las escrituras exigen
+además `Content-Type: application/json`, que un formulario de otro origen
+no puede enviar sin preflight CORS.
+"""
+import json
+from functools import lru_cache, wraps
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import router, transaction
+from django.forms.models import modelform_factory
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+
+from core import audit, cache, dedup, export, importer, search
+from core.models import AuditLog
+from core.pagination import InvalidCursor, KeysetPaginator, parse_active_filter
+
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 500
+MAX_BULK = 500
+
+AUDIT_FIELDS = (
+    'id', 'timestamp', 'actor_id', 'action', 'content_type_id', 'object_pk',
+    'object_repr', 'changes', 'ip_address', 'path', 'user_agent', 'entry_hash',
+)
+
+
+class ApiError(Exception):
+    def __init__(self, status, message, **extra):
+        super().__init__(message)
+        self.status = status
+        self.payload = {'error': message, **extra}
+
+
+def api_view(*methods):
+    """Métodos permitidos, sin CSRF (ver docstring del módulo) y errores en JSON."""
+    def decorator(view):
+        @csrf_exempt
+        @require_http_methods(list(methods))
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            try:
+                return view(request, *args, **kwargs)
+            except ApiError as exc:
+                return JsonResponse(exc.payload, status=exc.status)
+        return wrapped
+    return decorator
+
+
+def _require_perm(request, perm, staff=False):
+    user = request.user
+    if not user.is_authenticated:
+        raise ApiError(401, "Se requiere iniciar sesión.")
+    if (staff and not user.is_staff) or not user.has_perm(perm):
+        raise ApiError(403, "No tiene permiso para esta operación.")
+
+
+def _model_perm(model, action):
+    return f'{model._meta.app_label}.{action}_{model._meta.model_name}'
+
+
+# --- Lectura ---------------------------------------------------------------
+
+def _fields(request, allowed):
+    raw = request.GET.get('fields')
+    if not raw:
+        return list(allowed)
+    fields = list(dict.fromkeys(name.strip() for name in raw.split(',') if name.strip()))
+    unknown = [name for name in fields if name not in allowed]
+    if unknown:
+        raise ApiError(400, f"Campos desconocidos: {', '.join(unknown)}", allowed=list(allowed))
+    return fields
+
+
+def _limit(request):
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise ApiError(400, "limit debe ser un entero.")
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def _page(request, queryset, fields, ordering):
+    """Página de dicts con sólo `fields`; la clave del cursor se agrega si falta."""
+    keys = [name.lstrip('-') for name in ordering]
+    extra = [key for key in keys if key not in fields]
+    paginator = KeysetPaginator(queryset.values(*fields, *extra), ordering, per_page=_limit(request))
+    try:
+        page = paginator.page(request.GET.get('cursor'))
+    except InvalidCursor:
+        raise ApiError(400, "Cursor inválido.")
+    results = page.object_list
+    if extra:
+        for row in results:
+            for key in extra:
+                del row[key]
+    next_url = None
+    if page.has_next:
+        params = request.GET.copy()
+        params['cursor'] = page.next_cursor
+        next_url = request.build_absolute_uri(f'{request.path}?{params.urlencode()}')
+    return {'results': results, 'next_cursor': page.next_cursor, 'next': next_url}
+
+
+def _entity_queryset(request, model):
+    try:
+        queryset = export.export_queryset(
+            model,
+            active=parse_active_filter(request.GET.get('active')),
+            updated_since=export.parse_since(request.GET.get('updated_since')),
+        )
+    except export.InvalidExport as exc:
+        raise ApiError(400, str(exc))
+    if request.GET.get('tax_id'):
+        queryset = queryset.by_tax_id(request.GET['tax_id'])
+    return queryset
+
+
+def _as_dict(obj, fields):
+    return {name: getattr(obj, name) for name in fields}
+
+
+# --- Escritura -------------------------------------------------------------
+
+def _payload(request):
+    """Cuerpo JSON como lista de objetos (un objeto suelto se envuelve)."""
+    if request.content_type != 'application/json':
+        raise ApiError(415, "Se espera Content-Type: application/json.")
+    try:
+        data = json.loads(request.body or b'null')
+    except ValueError:
+        raise ApiError(400, "JSON inválido.")
+    items = [data] if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        raise ApiError(400, "Se espera un objeto o una lista de objetos.")
+    if len(items) > MAX_BULK:
+        raise ApiError(400, f"Máximo {MAX_BULK} objetos por request.")
+    return items
+
+
+def _form_errors(form):
+    return {field: [error['message'] for error in errors] for field, errors in form.errors.get_json_data().items()}
+
+
+def _raise_if_errors(errors):
+    # Todo o nada: con un solo objeto inválido no se guarda ninguno.
+    if errors:
+        raise ApiError(400, "Hay objetos inválidos; no se guardó ninguno.", errors=errors)
+
+
+def _audit(action, model, objects, request, changes=None):
+    fields = audit.request_fields(request)
+    content_type = ContentType.objects.get_for_model(model)
+    for obj in objects:
+        audit.record(
+            action=action,
+            content_type=content_type,
+            object_pk=str(obj.pk),
+            object_repr=str(obj)[:255],
+            changes=(changes or {}).get(obj.pk) or None,
+            **fields,
+        )
+
+
+def _bulk_create(request, model, form_class):
+    instances, errors = [], {}
+    for i, item in enumerate(_payload(request)):
+        if not isinstance(item, dict):
+            errors[i] = {'__all__': ["Se esperaba un objeto."]}
+            continue
+        # Un checkbox ausente es False en el form; en la API omitirlo es el default del modelo.
+        form = form_class(data={'is_active': True, **item})
+        if form.is_valid():
+            instances.append(form.save(commit=False))
+        else:
+            errors[i] = _form_errors(form)
+    _raise_if_errors(errors)
+
+    with transaction.atomic(using=router.db_for_write(model)):
+        # bulk_create no dispara post_save: índice de búsqueda y auditoría van acá.
+        created = model._default_manager.bulk_create(instances)
+        search.index_instances(model, created)
+        dedup.schedule(model, created)
+        cache.bump(model)
+        _audit('create', model, created, request)
+    fields = export.export_fields(model)
+    return JsonResponse({'results': [_as_dict(obj, fields) for obj in created]}, status=201)
+
+
+@lru_cache(maxsize=64)
+def _partial_form(model, form_class, fields):
+    return modelform_factory(model, form=form_class, fields=fields)
+
+
+def _bulk_update(request, model, form_class):
+    items = _payload(request)
+    ids = [item.get('id') for item in items if isinstance(item, dict)]
+    existing = model._default_manager.in_bulk([pk for pk in ids if isinstance(pk, int)])
+    objects, changes, errors, seen = [], {}, {}, set()
+    for i, item in enumerate(items):
+        obj = existing.get(item.get('id')) if isinstance(item, dict) else None
+        if obj is None:
+            errors[i] = {'id': ["Falta o no existe."]}
+            continue
+        if obj.pk in seen:
+            errors[i] = {'id': ["Repetido en la request."]}
+            continue
+        seen.add(obj.pk)
+        data = {key: value for key, value in item.items() if key != 'id'}
+        unknown = [key for key in data if key not in form_class.base_fields]
+        if unknown:
+            errors[i] = {key: ["Campo desconocido."] for key in unknown}
+            continue
+        # PATCH parcial: el form sólo incluye los campos enviados, así lo no
+        # enviado conserva su valor (y no pasa, p. ej., de None a '').
+        form = _partial_form(model, form_class, tuple(sorted(data)))(data=data, instance=obj)
+        if not form.is_valid():
+            errors[i] = _form_errors(form)
+            continue
+        diff = obj.tracked_changes()
+        if diff:
+            objects.append(obj)
+            changes[obj.pk] = diff
+    _raise_if_errors(errors)
+
+    if objects:
+        columns = sorted({name for diff in changes.values() for name in diff})
+        indexed = set(search.index_fields(model))
+        now = timezone.now()
+        with transaction.atomic(using=router.db_for_write(model)):
+            for obj in objects:
+                obj.updated_at = now  # bulk_update no aplica auto_now
+            model._default_manager.bulk_update(objects, [*columns, 'updated_at'])
+            cache.bump(model, [obj.pk for obj in objects])
+            dedup.schedule(model, [obj for obj in objects if set(changes[obj.pk]) & set(dedup.DEDUP_FIELDS)])
+            for obj in objects:
+                if set(changes[obj.pk]) & indexed:
+                    search.index_instance(obj)
+                obj._snapshot()
+            _audit('update', model, objects, request, changes=changes)
+    fields = export.export_fields(model)
+    results = [_as_dict(existing[item['id']], fields) for item in items]
+    return JsonResponse({'results': results})
+
+
+# --- Vistas ----------------------------------------------------------------
+
+@api_view('GET', 'POST', 'PATCH')
+def entity_collection(request, target):
+    model, form_class = importer.get_target(target)
+    if request.method == 'POST':
+        _require_perm(request, _model_perm(model, 'add'))
+        return _bulk_create(request, model, form_class)
+    if request.method == 'PATCH':
+        _require_perm(request, _model_perm(model, 'change'))
+        return _bulk_update(request, model, form_class)
+    fields = _fields(request, export.export_fields(model))
+    return JsonResponse(_page(request, _entity_queryset(request, model), fields, ('id',)))
+
+
+@api_view('GET')
+def entity_detail(request, target, pk):
+    model, _ = importer.get_target(target)
+    fields = _fields(request, export.export_fields(model))
+    row = model._default_manager.values(*fields).filter(pk=pk).first()
+    if row is None:
+        raise ApiError(404, "No existe.")
+    return JsonResponse(row)
+
+
+@api_view('GET')
+def audit_list(request):
+    """Sólo lectura, de la más nueva a la más vieja. Filtros: `action`,
+    `content_type` ("app_label.model"), `object_pk` y `actor` (id).
+
+    Se ordena por `(-timestamp, -id)`: cada filtro tiene un índice compuesto
+    que termina en `timestamp` (y SQLite agrega el rowid al final), que se
+    recorre al revés, así ninguna combinación ordena en memoria."""
+    _require_perm(request, _model_perm(AuditLog, 'view'), staff=True)
+    queryset = AuditLog.objects.all()
+    if request.GET.get('action'):
+        queryset = queryset.filter(action=request.GET['action'])
+    if request.GET.get('content_type'):
+        try:
+            app_label, model_name = request.GET['content_type'].split('.', 1)
+            content_type = ContentType.objects.get_by_natural_key(app_label, model_name)
+        except (ValueError, ContentType.DoesNotExist):
+            raise ApiError(400, "content_type desconocido.")
+        queryset = queryset.filter(content_type=content_type)
+    if request.GET.get('object_pk'):
+        queryset = queryset.filter(object_pk=request.GET['object_pk'])
+    if request.GET.get('actor'):
+        if not request.GET['actor'].isdigit():
+            raise ApiError(400, "actor debe ser un id.")
+        queryset = queryset.filter(actor_id=request.GET['actor'])
+    fields = _fields(request, AUDIT_FIELDS)
+    if {'path', 'user_agent'} & set(fields):
+        queryset = queryset.with_metadata()
+    return JsonResponse(_page(request, queryset, fields, ('-timestamp', '-id')))
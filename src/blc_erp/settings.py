@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
+import tempfile
 from pathlib import Path
 from django.contrib.messages import constants as messages
 
@@ -41,6 +43,7 @@ INSTALLED_APPS = [
     'core',
     'clients',
     'suppliers',
+    'api',
     'crispy_forms',
     'tailwind',
     'ui',
@@ -54,6 +57,7 @@ CRISPY_TEMPLATE_PACK = 'tailwind'
 INTERNAL_IPS = ["127.0.0.1"]
 
 MIDDLEWARE = [
+    'core.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -68,7 +72,8 @@ ROOT_URLCONF = 'blc_erp.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates que mide el render para Server-Timing (core.instrumentation)
+        'BACKEND': 'core.instrumentation.DjangoTemplates',
         'DIRS': [BASE_DIR / "ui" / "templates"],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -98,12 +103,100 @@ MESSAGE_TAGS = {
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite con varios workers: WAL (las lecturas no bloquean a la escritura),
+# synchronous=NORMAL (con WAL no pierde consistencia, sólo durabilidad del
+# último commit ante un corte de luz) y transacciones IMMEDIATE: toman el
+# lock de escritura al empezar y esperan `busy_timeout` en lugar de fallar
+# con "database is locked" al querer escribir después de leer. Las PRAGMAs
+# se aplican en cada conexión nueva. SQLITE_PROFILE=default deja la
+# configuración de fábrica (ver `manage.py bench_sqlite`).
+SQLITE_PROFILE = os.environ.get('SQLITE_PROFILE', 'tuned')
+SQLITE_PRAGMAS = {
+    'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'wal'),
+    'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'normal'),
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 128 * 1024 * 1024)),
+    'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE', -32000)),  # negativo: KiB
+    'temp_store': os.environ.get('SQLITE_TEMP_STORE', 'memory'),
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+    }
+}
+SQLITE_OPTIONS = {
+    'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+    'transaction_mode': os.environ.get('SQLITE_TRANSACTION_MODE', 'IMMEDIATE'),
+    'timeout': SQLITE_PRAGMAS['busy_timeout'] / 1000,
+}
+if SQLITE_PROFILE == 'tuned':
+    DATABASES['default']['OPTIONS'] = SQLITE_OPTIONS
+
+
+# Caché de páginas y fragmentos de entidades (core.cache), invalidada por
+# versión desde los signals. Un solo proceso: locmem. Varios workers: un
+# backend compartido para que todos vean las mismas versiones, p. ej.
+#   CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+#   CACHE_LOCATION=redis://127.0.0.1:6379/1
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'blc-erp',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
     }
 }
+if os.environ.get('CACHE_BACKEND'):
+    CACHES['default'] = {
+        'BACKEND': os.environ['CACHE_BACKEND'],
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+ENTITY_CACHE_ALIAS = 'default'
+
+
+# Auditoría
+# 'sync': cada lote se inserta al commit / fin de request en el mismo hilo.
+# 'background': los lotes se encolan y un hilo los vuelca por tamaño o tiempo.
+AUDIT_SINK_MODE = 'sync'
+AUDIT_SINK_MAX_BATCH = 500
+AUDIT_SINK_FLUSH_INTERVAL = 1.0  # segundos
+
+# Retención: lo más viejo que esto se mueve a AUDIT_ARCHIVE_DIR con archive_auditlog
+AUDIT_RETENTION_DAYS = 365
+AUDIT_ARCHIVE_DIR = BASE_DIR / 'audit_archive'
+
+# Logins fallidos (core.throttle): ventana deslizante por IP y por usuario en
+# la caché LOGIN_THROTTLE_CACHE. Desde LOGIN_THROTTLE_FREE fallos en la ventana
+# cada intento espera el doble (hasta LOGIN_THROTTLE_MAX_DELAY segundos) y la
+# auditoría escribe un resumen por IP cada LOGIN_FAILURE_SUMMARY_INTERVAL, como
+# mucho LOGIN_FAILURE_SUMMARY_MAX por intervalo. La IP es REMOTE_ADDR salvo que
+# venga de un proxy de LOGIN_THROTTLE_TRUSTED_PROXIES: ahí se lee X-Forwarded-For.
+LOGIN_THROTTLE_CACHE = 'default'
+LOGIN_THROTTLE_WINDOW = 900  # segundos
+LOGIN_THROTTLE_FREE = 5
+LOGIN_THROTTLE_MAX_DELAY = 300  # segundos
+LOGIN_THROTTLE_TRUSTED_PROXIES = [
+    ip.strip() for ip in os.environ.get('LOGIN_THROTTLE_TRUSTED_PROXIES', '').split(',') if ip.strip()
+]
+LOGIN_FAILURE_SUMMARY_INTERVAL = 60  # segundos
+LOGIN_FAILURE_SUMMARY_MAX = 20
+
+
+# Métricas por vista (core.instrumentation). SERVER_TIMING agrega la cabecera
+# Server-Timing (db, tpl, audit, total) a cada respuesta; VIEW_INSTRUMENTATION
+# controla los presupuestos por nombre de URL, por defecto sólo con DEBUG.
+SERVER_TIMING = os.environ.get('SERVER_TIMING', '1').lower() in ('1', 'true', 'yes')
+VIEW_INSTRUMENTATION = os.environ.get('VIEW_INSTRUMENTATION', str(DEBUG)).lower() in ('1', 'true', 'yes')
+VIEW_BUDGETS_FILE = BASE_DIR / 'view_budgets.json'
+
+# Endpoint /metrics para Prometheus (core.metrics). Cada worker escribe sus
+# valores en un archivo de METRICS_DIR (compartido por todos los workers de la
+# máquina, vaciarlo al reiniciar); sólo lo leen las IPs de METRICS_ALLOWED_IPS
+# y los usuarios staff.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1').lower() in ('1', 'true', 'yes')
+METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'blc_erp_metrics'))
+METRICS_ALLOWED_IPS = [ip.strip() for ip in os.environ.get('METRICS_ALLOWED_IPS', '127.0.0.1').split(',') if ip.strip()]
 
 
 # Password validation
@@ -0,0 +1,21 @@
+"""Settings de los tests (pytest.ini y `manage.py test`).
+
+Los tests revierten la base al terminar pero no la caché: sin caché para
+que una página cacheada en un test no aparezca en otro. Los tests de
+`core.cache` y `core.throttle` activan una caché en memoria con
+`override_settings`.
+
+Las métricas de cada corrida van a un directorio propio que se borra al
+salir: en el `METRICS_DIR` compartido quedarían los archivos de todas las
+corridas y `/metrics`, que los lee todos, sería cada vez más lento.
+"""
+import atexit
+import shutil
+import tempfile
+
+from .settings import *  # noqa: F401,F403
+
+CACHES = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+METRICS_DIR = tempfile.mkdtemp(prefix='blc_erp_metrics-')
+atexit.register(shutil.rmtree, METRICS_DIR, ignore_errors=True)
@@ -17,9 +17,14 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from core.throttle import login_throttled
+
 urlpatterns = [
+    # antes que admin.site.urls para que el login del admin pase por el límite de intentos
+    path('admin/login/', login_throttled(admin.site.login)),
     path('admin/', admin.site.urls),
     path('', include('core.urls')),
     path('clients/', include('clients.urls')),
     path('suppliers/', include('suppliers.urls')),
+    path('api/', include('api.urls')),
 ]
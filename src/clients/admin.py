@@ -1,8 +1,10 @@
 from django.contrib import admin
+from core.admin import FullTextSearchMixin, merge_selected
 from .models import Client
 
 @admin.register(Client)
-class ClientAdmin(admin.ModelAdmin):
+class ClientAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ('name', 'email', 'phone', 'is_active')
     search_fields = ('name', 'email', 'phone')
     list_filter = ('is_active',)
+    actions = [merge_selected]
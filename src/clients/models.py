@@ -4,7 +4,7 @@ from core.models import Entity
 class Client(Entity):
     notes = models.TextField(verbose_name="Notas", blank=True, null=True)
 
-    class Meta:
+    class Meta(Entity.Meta):
         verbose_name = "Cliente"
         verbose_name_plural = "Clientes"
 
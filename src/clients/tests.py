@@ -243,4 +243,72 @@ class ClientViewsTests(TestCase):
         
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'clients/edit_select.html')
-        self.assertEqual(len(response.context['clients']), 1)
+        self.assertEqual(response.context['autocomplete_url'], reverse('clients:autocomplete'))
+
+    def test_client_edit_select_does_not_load_clients(self):
+        """Test que la página de selección no consulta la tabla (costo constante)"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        Client.objects.create(**self.client_data)
+        with CaptureQueriesContext(connection) as ctx:
+            self.test_client.get(reverse('clients:edit_select'))
+        self.assertFalse([q for q in ctx.captured_queries if 'clients_client' in q['sql']])
+
+    def test_client_edit_select_post_redirects(self):
+        """Test que el POST de la selección redirige a la edición"""
+        obj = Client.objects.create(**self.client_data)
+        response = self.test_client.post(reverse('clients:edit_select'), {'client_id': obj.pk})
+        self.assertRedirects(response, reverse('clients:edit', args=[obj.pk]))
+
+        response = self.test_client.post(reverse('clients:edit_select'), {'client_id': ''})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['error'])
+
+    def test_client_autocomplete(self):
+        """Test del typeahead por prefijo de razón social, nombre o CUIT"""
+        obj = Client.objects.create(**self.client_data)
+        Client.objects.create(company_name='Otra Empresa', name='Otro')
+        prefix = obj.company_name[:3]
+        data = self.test_client.get(reverse('clients:autocomplete'), {'q': prefix}).json()
+        self.assertEqual([r['id'] for r in data['results']], [obj.pk])
+        self.assertEqual(data['results'][0]['url'], reverse('clients:edit', args=[obj.pk]))
+        self.assertEqual(self.test_client.get(reverse('clients:autocomplete'), {'q': 'x'}).json(), {'results': []})
+
+    def test_client_list_paginates_with_cursor(self):
+        """Test paginación por cursor del listado"""
+        from core.pagination import DEFAULT_PAGE_SIZE
+        for i in range(DEFAULT_PAGE_SIZE + 1):
+            Client.objects.create(company_name=f'Empresa {i:03d}', name='Contacto')
+
+        response = self.test_client.get(reverse('clients:list'))
+        page = response.context['page']
+        self.assertEqual(len(response.context['object_list']), DEFAULT_PAGE_SIZE)
+        self.assertTrue(page.has_next)
+
+        response = self.test_client.get(reverse('clients:list'), {'cursor': page.next_cursor})
+        names = [c.company_name for c in response.context['object_list']]
+        self.assertEqual(names, [f'Empresa {DEFAULT_PAGE_SIZE:03d}'])
+        self.assertFalse(response.context['page'].has_next)
+
+    def test_client_list_active_filter(self):
+        """Test filtro is_active en el listado"""
+        Client.objects.create(company_name='Activa', name='A', is_active=True)
+        Client.objects.create(company_name='Inactiva', name='B', is_active=False)
+        response = self.test_client.get(reverse('clients:list'), {'active': '0'})
+
+        self.assertEqual(response.status_code, 200)
+        names = [c.company_name for c in response.context['object_list']]
+        self.assertEqual(names, ['Inactiva'])
+
+    def test_client_list_loads_only_card_fields(self):
+        """Test que el listado no carga address ni notes"""
+        Client.objects.create(**self.client_data)
+        response = self.test_client.get(reverse('clients:list'))
+
+        item = response.context['object_list'][0]
+        self.assertEqual(item.get_deferred_fields(), {'email', 'phone', 'address', 'tax_id', 'is_active', 'updated_at', 'notes'})
+
+    def test_client_list_invalid_cursor(self):
+        """Test cursor inválido"""
+        response = self.test_client.get(reverse('clients:list'), {'cursor': 'no-es-un-cursor'})
+        self.assertEqual(response.status_code, 404)
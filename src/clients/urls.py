@@ -6,9 +6,13 @@ app_name = 'clients'
 urlpatterns = [
     path('list/', views.client_list, name='list'),
     path('add/', views.client_add, name='add'),
+    path('import/', views.client_import, name='import'),
+    path('export/', views.client_export, name='export'),
     path('edit_select/', views.client_edit_select, name='edit_select'),
+    path('autocomplete/', views.client_autocomplete, name='autocomplete'),
     path('edit/<int:client_id>/', views.client_edit, name='edit'),    
     path('detail/<int:client_id>/', views.client_detail, name='detail'),
+    path('history/<int:client_id>/', views.client_history, name='history'),
     path('delete/<int:client_id>/', views.client_delete, name='delete'),
 
 ]
\ No newline at end of file
@@ -1,13 +1,24 @@
-from django.shortcuts import render, get_object_or_404, redirect
+from django.shortcuts import aget_object_or_404, render, get_object_or_404, redirect
+from django.db import transaction
 from django.urls import reverse
 from .models import Client
 from .forms import ClientForm
 from django.views.decorators.http import require_POST
+from core import cache
+from core.models import ENTITY_LIST_FIELDS
+from core.pagination import apaginate_entities
+from core.views import acan_view_history, arender, entity_autocomplete, entity_export, entity_history, entity_import
 
-def client_list(request):
-    clients = Client.objects.all()
-    return render(request, 'clients/list.html', {
-        'object_list': clients,
+@cache.cache_page(Client)
+async def client_list(request):
+    # la versión se lee antes que los datos: si cambian en el medio, el
+    # fragmento queda con una versión vieja en lugar de datos viejos
+    cache_version = await cache.amodel_version(Client)
+    page = await apaginate_entities(request, Client.objects.only(*ENTITY_LIST_FIELDS))
+    return await arender(request, 'clients/list.html', {
+        'object_list': page.object_list,
+        'page': page,
+        'cache_version': cache_version,
         'title': 'Listado de Clientes',
         'model_name': 'client'
     })
@@ -16,15 +27,27 @@ def client_add(request):
     if request.method == "POST":
         form = ClientForm(request.POST)
         if form.is_valid():
-            form.save()
+            # la fila y su índice de búsqueda se confirman juntos
+            with transaction.atomic():
+                form.save()
             return redirect("clients:list")
     else:
         form = ClientForm()
     return render(request, "clients/add.html", {"form": form, "title": "Agregar Cliente"})
 
 def client_edit_select(request):
-    clients = Client.objects.all()
-    return render(request, "clients/edit_select.html", {"clients": clients, "title": "Seleccionar Cliente"})
+    # Sin listar todos los registros: el select se completa con el typeahead.
+    error = None
+    if request.method == "POST":
+        client_id = request.POST.get("client_id", "")
+        if client_id.isdigit():
+            return redirect("clients:edit", client_id=int(client_id))
+        error = "Elegí un cliente de la lista."
+    return render(request, "clients/edit_select.html", {
+        "title": "Seleccionar Cliente",
+        "autocomplete_url": reverse("clients:autocomplete"),
+        "error": error,
+    })
 
 def client_edit(request, client_id):
     client = get_object_or_404(Client, id=client_id)
@@ -32,7 +55,8 @@ def client_edit(request, client_id):
     if request.method == 'POST':
         form = ClientForm(request.POST, instance=client)
         if form.is_valid():
-            form.save()
+            with transaction.atomic():
+                form.save()
             return redirect('clients:list')  # o donde quieras redirigir luego de guardar
     else:
         form = ClientForm(instance=client)
@@ -42,12 +66,16 @@ def client_edit(request, client_id):
         'title': 'Modificar Cliente'
     })
 
-def client_detail(request, client_id):
-    client = get_object_or_404(Client, id=client_id)
-    return render(request, 'clients/detail.html', {
+async def client_detail(request, client_id):
+    cache_version = await cache.aobject_version(Client, client_id)
+    client = await aget_object_or_404(Client, id=client_id)
+    return await arender(request, 'clients/detail.html', {
         'entity': client,
+        'model_name': 'client',
+        'cache_version': cache_version,
         'title': 'Detalle de Cliente',
         'edit_url': reverse('clients:edit', args=[client.id]),
+        'history_url': reverse('clients:history', args=[client.id]) if await acan_view_history(request) else None,
         'delete_url': reverse('clients:delete', args=[client.id])
     })
 
@@ -55,4 +83,16 @@ def client_detail(request, client_id):
 def client_delete(request, client_id):
     client = get_object_or_404(Client, id=client_id)
     client.delete()
-    return redirect('clients:list')
\ No newline at end of file
+    return redirect('clients:list')
+
+def client_import(request):
+    return entity_import(request, 'clients', 'Importar Clientes')
+
+async def client_export(request):
+    return await entity_export(request, 'clients')
+
+def client_autocomplete(request):
+    return entity_autocomplete(request, 'clients')
+
+async def client_history(request, client_id):
+    return await entity_history(request, 'clients', client_id)
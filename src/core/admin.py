@@ -1,17 +1,218 @@
-from django.contrib import admin
-from .models import AuditLog
+from datetime import datetime, time, timedelta
+
+from django.contrib import admin, messages
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import PAGE_VAR, ChangeList
+from django.contrib.contenttypes.models import ContentType
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import urlencode
+
+from . import dedup, search
+from .models import AuditLog, DuplicateCandidate
+from .pagination import InvalidCursor, KeysetPaginator, approximate_count
+
+AUDIT_ORDERING = ('-timestamp', '-id')
+AUDIT_ACTIONS = ('create', 'update', 'delete', 'merge', 'import', 'login', 'logout', 'login_failed')
+
+
+class FullTextSearchMixin:
+	"""Resuelve la caja de búsqueda del changelist con el índice FTS5 en vez de icontains."""
+
+	def get_search_results(self, request, queryset, search_term):
+		if not search_term:
+			return queryset, False
+		return search.filter_queryset(queryset, search_term), False
+
+
+@admin.action(description="Fusionar seleccionados (se conserva el de menor id)")
+def merge_selected(modeladmin, request, queryset):
+	objects = list(queryset.order_by('pk'))
+	if len(objects) < 2:
+		modeladmin.message_user(request, "Elegí al menos dos registros para fusionar.", messages.WARNING)
+		return
+	keep = dedup.merge(objects[0], objects[1:], request=request)
+	modeladmin.message_user(request, f"{len(objects) - 1} registro(s) fusionado(s) en «{keep}».", messages.SUCCESS)
+
+
+class InputFilter(admin.ListFilter):
+	"""Filtro de la barra lateral con campos de texto en lugar de una lista de
+	opciones (que para actores o fechas sería una consulta sobre toda la tabla).
+
+	`parameters` es una secuencia de `(parámetro, etiqueta, tipo de input)`;
+	las subclases implementan `queryset()` con `self.values`.
+	"""
+
+	template = 'admin/core/input_filter.html'
+	parameters = ()
+
+	def __init__(self, request, params, model, model_admin):
+		super().__init__(request, params, model, model_admin)
+		self.values = {}
+		for name, _, _ in self.parameters:
+			if name in params:
+				value = params.pop(name)
+				value = (value[-1] if isinstance(value, list) else value).strip()
+				if value:
+					self.values[name] = value
+
+	def has_output(self):
+		return True
+
+	def expected_parameters(self):
+		return [name for name, _, _ in self.parameters]
+
+	def field_options(self, name):
+		"""Sugerencias (`<datalist>`) para el campo `name`."""
+		return []
+
+	def autocomplete_url(self, name):
+		"""URL del autocompletado del admin para sugerir mientras se escribe."""
+		return None
+
+	def choices(self, changelist):
+		own = self.expected_parameters()
+		yield {
+			'selected': bool(self.values),
+			'fields': [
+				{
+					'name': name, 'label': label, 'type': input_type,
+					'value': self.values.get(name, ''),
+					'options': self.field_options(name),
+					'autocomplete_url': self.autocomplete_url(name),
+				}
+				for name, label, input_type in self.parameters
+			],
+			'hidden': [
+				(name, value)
+				for name, values in changelist.filter_params.items() if name not in own
+				for value in values
+			],
+			'clear_query_string': changelist.get_query_string(remove=own),
+		}
+
+
+class ActorFilter(InputFilter):
+	title = 'actor'
+	parameters = (('actor', 'Usuario', 'search'),)
+
+	def autocomplete_url(self, name):
+		query = urlencode({'app_label': 'core', 'model_name': 'auditlog', 'field_name': 'actor'})
+		return f"{reverse('admin:autocomplete')}?{query}"
+
+	def queryset(self, request, queryset):
+		if 'actor' in self.values:
+			# username es único: una búsqueda por índice y después auditlog_actor_ts_idx
+			return queryset.filter(actor__username=self.values['actor'])
+		return queryset
+
+
+class ContentTypeFilter(InputFilter):
+	title = 'tipo de objeto'
+	parameters = (('content_type', 'app_label.model', 'search'),)
+
+	def field_options(self, name):
+		return [f'{ct.app_label}.{ct.model}' for ct in ContentType.objects.order_by('app_label', 'model')]
+
+	def queryset(self, request, queryset):
+		if 'content_type' not in self.values:
+			return queryset
+		try:
+			app_label, model_name = self.values['content_type'].split('.', 1)
+			content_type = ContentType.objects.get_by_natural_key(app_label, model_name)
+		except (ValueError, ContentType.DoesNotExist):
+			return queryset.none()
+		return queryset.filter(content_type=content_type)
+
+
+class DateRangeFilter(InputFilter):
+	"""Rango de fechas (ambas inclusive) sobre el índice de `timestamp`."""
+
+	title = 'fecha'
+	parameters = (('desde', 'Desde', 'date'), ('hasta', 'Hasta', 'date'))
+
+	def _start_of(self, name, days=0):
+		try:
+			day = datetime.strptime(self.values[name], '%Y-%m-%d').date() + timedelta(days=days)
+		except ValueError as exc:
+			raise IncorrectLookupParameters(exc) from exc
+		return timezone.make_aware(datetime.combine(day, time.min))
+
+	def queryset(self, request, queryset):
+		if 'desde' in self.values:
+			queryset = queryset.filter(timestamp__gte=self._start_of('desde'))
+		if 'hasta' in self.values:
+			queryset = queryset.filter(timestamp__lt=self._start_of('hasta', days=1))
+		return queryset
+
+
+class ActionFilter(admin.SimpleListFilter):
+	"""Acciones conocidas; el filtro por defecto de un CharField haría un
+	`SELECT DISTINCT` sobre toda la tabla."""
+
+	title = 'action'
+	parameter_name = 'action'
+
+	def lookups(self, request, model_admin):
+		return [(action, action) for action in AUDIT_ACTIONS]
+
+	def queryset(self, request, queryset):
+		if self.value():
+			return queryset.filter(action=self.value())
+		return queryset
+
+
+class AuditLogChangeList(ChangeList):
+	"""Changelist por cursor sobre `(timestamp, id)` y con cantidad aproximada.
+
+	`?p=` lleva el cursor de `KeysetPaginator` en lugar del número de página:
+	cada página es un rango del índice, sin OFFSET ni `COUNT(*)`.
+	"""
+
+	def get_results(self, request):
+		paginator = KeysetPaginator(self.queryset, AUDIT_ORDERING, self.list_per_page)
+		cursor = request.GET.get(PAGE_VAR) or None
+		try:
+			page = paginator.page(cursor)
+		except InvalidCursor as exc:
+			raise IncorrectLookupParameters(exc) from exc
+
+		self.result_count, self.count_kind = approximate_count(self.queryset)
+		self.full_result_count = None
+		self.show_full_result_count = False
+		self.show_admin_actions = True
+		self.result_list = page.object_list
+		self.can_show_all = False
+		self.multi_page = page.has_next or cursor is not None
+		self.paginator = paginator
+		self.is_first_page = cursor is None
+		self.first_page_url = self.get_query_string(remove=[PAGE_VAR])
+		self.next_page_url = self.get_query_string({PAGE_VAR: page.next_cursor}) if page.has_next else None
 
 
 @admin.register(AuditLog)
 class AuditLogAdmin(admin.ModelAdmin):
+	"""Pensado para decenas de millones de filas: sin `date_hierarchy` ni
+	filtros que listen usuarios, sin `COUNT(*)` completo y paginado por cursor
+	(ver `AuditLogChangeList`)."""
+
 	list_display = (
 		'timestamp', 'action', 'actor', 'content_type', 'object_pk', 'object_repr', 'ip_address'
 	)
-	list_filter = ('action', 'content_type', 'actor')
-	search_fields = ('object_repr', 'object_pk', 'ip_address', 'user_agent')
-	readonly_fields = [f.name for f in AuditLog._meta.fields]
-	date_hierarchy = 'timestamp'
-	ordering = ('-timestamp',)
+	list_filter = (DateRangeFilter, ActionFilter, ContentTypeFilter, ActorFilter)
+	list_select_related = ('actor', 'content_type')
+	search_fields = ('object_repr', 'object_pk', 'ip_address', 'user_agent_ref__value', 'legacy_user_agent')
+	# path y user_agent son propiedades sobre las tablas de lookup (core.lookups)
+	fields = readonly_fields = (
+		'id', 'timestamp', 'actor', 'action', 'content_type', 'object_pk', 'object_repr',
+		'changes', 'ip_address', 'path', 'user_agent', 'entry_hash',
+	)
+	ordering = AUDIT_ORDERING
+	sortable_by = ()
+	show_full_result_count = False
+
+	def get_changelist(self, request, **kwargs):
+		return AuditLogChangeList
 
 	def has_add_permission(self, request):
 		return False
@@ -19,3 +220,35 @@ class AuditLogAdmin(admin.ModelAdmin):
 	def has_delete_permission(self, request, obj=None):
 		return False
 
+
+
+@admin.register(DuplicateCandidate)
+class DuplicateCandidateAdmin(admin.ModelAdmin):
+	"""Candidatos de core.dedup; se recalculan solos, acá sólo se fusionan o descartan."""
+
+	list_display = ('content_type', 'left_pk', 'right_pk', 'score', 'reasons', 'status', 'updated_at')
+	list_filter = ('status', 'content_type')
+	list_select_related = ('content_type',)
+	readonly_fields = [f.name for f in DuplicateCandidate._meta.fields]
+	ordering = ('-score',)
+	actions = ['merge_pairs', 'dismiss']
+
+	def has_add_permission(self, request):
+		return False
+
+	@admin.action(description="Fusionar cada par (se conserva el de menor id)")
+	def merge_pairs(self, request, queryset):
+		merged = 0
+		for candidate in list(queryset.select_related('content_type')):
+			model = candidate.content_type.model_class()
+			objects = model._default_manager.in_bulk([candidate.left_pk, candidate.right_pk])
+			if len(objects) < 2:
+				continue  # uno de los dos ya se fusionó en un par anterior
+			dedup.merge(objects[candidate.left_pk], [objects[candidate.right_pk]], request=request)
+			merged += 1
+		self.message_user(request, f"{merged} par(es) fusionado(s).", messages.SUCCESS)
+
+	@admin.action(description="Descartar (no son duplicados)")
+	def dismiss(self, request, queryset):
+		count = queryset.update(status=DuplicateCandidate.DISMISSED)
+		self.message_user(request, f"{count} par(es) descartado(s).", messages.SUCCESS)
@@ -11,3 +11,13 @@ class CoreConfig(AppConfig):
             import core.signals  # noqa: F401
         except Exception:
             pass
+
+        # Las tablas FTS5 de búsqueda no son modelos: se crean tras migrate
+        from django.db.models.signals import post_migrate
+        from core.search import create_indexes
+        post_migrate.connect(create_indexes, sender=self)
+
+        # Conteo de consultas por vista (core.instrumentation)
+        from django.db.backends.signals import connection_created
+        from core.instrumentation import install
+        connection_created.connect(install)
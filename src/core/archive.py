@@ -0,0 +1,299 @@
+"""Archivo de `AuditLog` vencido en segmentos JSONL comprimidos.
+
+Cada segmento (`auditlog-<primer_pk>-<ultimo_pk>.jsonl.gz`) es una
+concatenación de miembros gzip independientes ("bloques") de hasta
+`block_rows` filas. Junto a él se escribe un índice pequeño
+(`.idx.json`) con el offset, tamaño, rango de pk y de timestamp de cada
+bloque, de modo que `ArchiveReader` puede saltar directo a los bloques que
+intersectan un rango de fechas y descomprimir sólo esos.
+
+Se archiva siempre el prefijo por pk de filas vencidas: así el borrado son
+rangos contiguos de pk y la cadena de hashes (`core.chain`) sigue siendo
+verificable a partir del checkpoint que deja `archive_expired`.
+"""
+import gzip
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from core.chain import HASH_FIELDS, verify_segment
+from core.models import AuditChainCheckpoint, AuditLog
+
+
+ARCHIVE_FIELDS = (
+    'id', 'timestamp', 'actor_id', 'actor__username', 'action', 'content_type_id',
+    'object_pk', 'object_repr', 'changes', 'ip_address', 'path', 'user_agent', 'entry_hash',
+)
+
+
+class ChainBroken(Exception):
+    """Las filas a archivar no verifican contra la cadena de hashes."""
+
+
+def default_directory():
+    return Path(getattr(settings, 'AUDIT_ARCHIVE_DIR', Path(settings.BASE_DIR) / 'audit_archive'))
+
+
+def _iso(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _content_type_label(ct_id):
+    if not ct_id:
+        return None
+    ct = ContentType.objects.get_for_id(ct_id)
+    return f'{ct.app_label}.{ct.model}'
+
+
+def _serialize(row):
+    return {
+        'id': row['id'],
+        'timestamp': _iso(row['timestamp']),
+        'actor_id': row['actor_id'],
+        'actor': row['actor__username'],
+        'action': row['action'],
+        'content_type_id': row['content_type_id'],
+        'content_type': _content_type_label(row['content_type_id']),
+        'object_pk': row['object_pk'],
+        'object_repr': row['object_repr'],
+        'changes': row['changes'],
+        'ip_address': row['ip_address'],
+        'path': row['path'],
+        'user_agent': row['user_agent'],
+        'entry_hash': row['entry_hash'],
+    }
+
+
+class SegmentWriter:
+    """Escribe bloques gzip en un segmento y lo rota al llegar a `segment_rows`."""
+
+    def __init__(self, directory, segment_rows=100000):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_rows = segment_rows
+        self._reset()
+
+    def _reset(self):
+        self._file = None
+        self._tmp_path = None
+        self.blocks = []
+        self.rows = 0
+
+    def write_block(self, records):
+        """Agrega un bloque; devuelve el índice del segmento si se cerró."""
+        if self._file is None:
+            self._tmp_path = self.directory / f'.segment-{os.getpid()}.partial'
+            self._file = open(self._tmp_path, 'wb')
+        payload = ''.join(json.dumps(r, ensure_ascii=False, separators=(',', ':')) + '\n' for r in records)
+        data = gzip.compress(payload.encode('utf-8'))
+        self.blocks.append({
+            'offset': self._file.tell(),
+            'length': len(data),
+            'rows': len(records),
+            'first_pk': records[0]['id'],
+            'last_pk': records[-1]['id'],
+            'first_ts': min(r['timestamp'] for r in records),
+            'last_ts': max(r['timestamp'] for r in records),
+        })
+        self._file.write(data)
+        self.rows += len(records)
+        if self.rows >= self.segment_rows:
+            return self.close()
+        return None
+
+    def abort(self):
+        """Descarta el segmento en curso (sus filas siguen en la base)."""
+        if self._file is not None:
+            self._file.close()
+            os.remove(self._tmp_path)
+        self._reset()
+
+    def close(self):
+        """Cierra el segmento en curso (fsync + rename atómico) y escribe su índice."""
+        if self._file is None:
+            return None
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+        first_pk, last_pk = self.blocks[0]['first_pk'], self.blocks[-1]['last_pk']
+        name = f'auditlog-{first_pk:012d}-{last_pk:012d}.jsonl.gz'
+        os.replace(self._tmp_path, self.directory / name)
+        index = {
+            'segment': name,
+            'rows': self.rows,
+            'first_pk': first_pk,
+            'last_pk': last_pk,
+            'first_ts': min(b['first_ts'] for b in self.blocks),
+            'last_ts': max(b['last_ts'] for b in self.blocks),
+            'blocks': self.blocks,
+        }
+        tmp_index = self.directory / f'{name}.idx.json.partial'
+        with open(tmp_index, 'w', encoding='utf-8') as f:
+            json.dump(index, f, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_index, self.directory / f'{name}.idx.json')
+        self._reset()
+        return index
+
+
+def count_expired(cutoff):
+    """Cantidad de filas que `archive_expired` archivaría con este cutoff."""
+    first_live = (
+        AuditLog.objects.filter(timestamp__gte=cutoff).order_by('pk').values_list('pk', flat=True).first()
+    )
+    queryset = AuditLog.objects.all()
+    if first_live is not None:
+        queryset = queryset.filter(pk__lt=first_live)
+    return queryset.count()
+
+
+def _expired_chunks(cutoff, chunk_size, using):
+    """Prefijo por pk de filas con timestamp < cutoff, en tramos de `chunk_size`."""
+    last_pk = 0
+    queryset = AuditLog.objects.using(using).with_metadata().order_by('pk').values(*ARCHIVE_FIELDS)
+    while True:
+        rows = list(queryset.filter(pk__gt=last_pk)[:chunk_size])
+        expired = []
+        for row in rows:
+            if row['timestamp'] >= cutoff:
+                break
+            expired.append(row)
+        if expired:
+            last_pk = expired[-1]['id']
+            yield expired
+        if len(expired) < chunk_size:
+            return
+
+
+def _delete_range(first_pk, last_pk, batch_size, using):
+    # Rango contiguo de pk: DELETE acotado por lotes, cada uno en su propia
+    # transacción corta para no retener el lock de escritura.
+    table = connections[using].ops.quote_name(AuditLog._meta.db_table)
+    column = connections[using].ops.quote_name(AuditLog._meta.pk.column)
+    deleted = 0
+    lo = first_pk
+    while lo <= last_pk:
+        hi = min(lo + batch_size - 1, last_pk)
+        with transaction.atomic(using=using):
+            with connections[using].cursor() as cursor:
+                cursor.execute(f'DELETE FROM {table} WHERE {column} >= %s AND {column} <= %s', [lo, hi])
+                deleted += cursor.rowcount
+        lo = hi + 1
+    return deleted
+
+
+def archive_expired(cutoff, directory=None, block_rows=1000, segment_rows=100000, delete_batch=1000):
+    """Archiva y borra las entradas con timestamp < cutoff.
+
+    Antes de escribir cada bloque se verifica su tramo de la cadena; si falla
+    se aborta con `ChainBroken` sin borrar nada de lo que no esté ya en un
+    segmento cerrado. Al cerrar cada segmento se borra su rango de pk y se
+    guarda un `AuditChainCheckpoint` que ancla la cadena restante.
+    """
+    using = router.db_for_write(AuditLog)
+    writer = SegmentWriter(directory or default_directory(), segment_rows=segment_rows)
+    stats = {'archived': 0, 'deleted': 0, 'segments': []}
+
+    prev_hash = None
+    last_hash = None
+    started = False
+
+    def finish(index):
+        stats['segments'].append(index['segment'])
+        stats['deleted'] += _delete_range(index['first_pk'], index['last_pk'], delete_batch, using)
+        if last_hash:
+            AuditChainCheckpoint.objects.using(using).create(
+                last_pk=index['last_pk'], entry_hash=last_hash, rows_verified=index['rows'],
+            )
+
+    for rows in _expired_chunks(cutoff, block_rows, using):
+        if not started:
+            started = True
+            anchor = (
+                AuditChainCheckpoint.objects.using(using)
+                .filter(last_pk__lt=rows[0]['id']).order_by('-last_pk').first()
+            )
+            prev_hash = anchor.entry_hash if anchor else None
+        chain_rows = [(r['id'], r['entry_hash'], *(r[f] for f in HASH_FIELDS)) for r in rows]
+        bad, _, prev_hash, _ = verify_segment(prev_hash, chain_rows)
+        if bad:
+            writer.abort()
+            raise ChainBroken(bad)
+        last_hash = prev_hash
+        stats['archived'] += len(rows)
+        index = writer.write_block([_serialize(r) for r in rows])
+        if index:
+            finish(index)
+
+    index = writer.close()
+    if index:
+        finish(index)
+    return stats
+
+
+def _aware(value):
+    if value is not None and timezone.is_naive(value):
+        return timezone.make_aware(value)
+    return value
+
+
+class ArchiveReader:
+    """Consulta segmentos archivados sin volver a cargarlos en la base."""
+
+    def __init__(self, directory=None):
+        self.directory = Path(directory or default_directory())
+
+    def segments(self):
+        indexes = []
+        for path in sorted(self.directory.glob('auditlog-*.jsonl.gz.idx.json')):
+            with open(path, encoding='utf-8') as f:
+                indexes.append(json.load(f))
+        return indexes
+
+    @staticmethod
+    def _overlaps(item, start, end):
+        first = datetime.fromisoformat(item['first_ts'])
+        last = datetime.fromisoformat(item['last_ts'])
+        return (start is None or last >= start) and (end is None or first < end)
+
+    def entries(self, start=None, end=None, content_type=None, object_pk=None, action=None):
+        """Itera las entradas archivadas con `start <= timestamp < end`.
+
+        `start` y `end` naive se interpretan en la zona horaria del sitio,
+        como en el ORM (los timestamps archivados son aware).
+        `content_type` acepta "app_label.model"; `object_pk` se compara como
+        texto, igual que en `AuditLog.object_pk`.
+        """
+        start, end = _aware(start), _aware(end)
+        object_pk = None if object_pk is None else str(object_pk)
+        for index in self.segments():
+            if not self._overlaps(index, start, end):
+                continue
+            with open(self.directory / index['segment'], 'rb') as f:
+                for block in index['blocks']:
+                    if not self._overlaps(block, start, end):
+                        continue
+                    f.seek(block['offset'])
+                    lines = gzip.decompress(f.read(block['length'])).decode('utf-8').splitlines()
+                    for line in lines:
+                        entry = json.loads(line)
+                        ts = datetime.fromisoformat(entry['timestamp'])
+                        if start is not None and ts < start:
+                            continue
+                        if end is not None and ts >= end:
+                            continue
+                        if content_type is not None and entry['content_type'] != content_type:
+                            continue
+                        if object_pk is not None and entry['object_pk'] != object_pk:
+                            continue
+                        if action is not None and entry['action'] != action:
+                            continue
+                        yield entry
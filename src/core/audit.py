@@ -0,0 +1,294 @@
+"""Escritura en lotes de entradas de `AuditLog`.
+
+Los handlers de `core.signals` no insertan directamente: llaman a `record()`,
+que decide dónde acumular la entrada:
+
+- Dentro de un `transaction.atomic()`: en un lote ligado a esa transacción
+  (o savepoint) que se escribe con un único `bulk_create` en el commit. Si la
+  transacción hace rollback, Django descarta el callback y con él el lote, de
+  modo que no quedan registros de cambios que nunca ocurrieron.
+- Fuera de una transacción pero dentro de una request (`collect()`, que abre
+  `RequestMiddleware`): en un buffer que se escribe al terminar la request.
+- En cualquier otro caso (shell, comandos): se escribe en el momento.
+
+Cada lote se encadena al escribirse (`core.chain`): se toma el lock de
+`AuditChainHead`, se calculan los hashes a partir de la cabeza actual, se
+insertan los paths y user agents nuevos en sus tablas de lookup
+(`core.lookups`), las filas, y se actualiza la cabeza, todo en la misma
+transacción.
+
+Con `AUDIT_SINK_MODE = 'background'` los lotes no se insertan en el hilo de
+la request sino que se encolan para un hilo escritor que los vuelca al
+alcanzar `AUDIT_SINK_MAX_BATCH` entradas o cada `AUDIT_SINK_FLUSH_INTERVAL`
+segundos.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connections, router, transaction
+from django.db.models import F
+
+from core import instrumentation, lookups, metrics
+from core.chain import HASH_FIELDS, chain_hash
+from core.models import AuditChainHead, AuditLog, AuditPath, AuditUserAgent
+
+logger = logging.getLogger(__name__)
+
+_request_buffer = ContextVar('audit_request_buffer', default=None)
+_suppressed = ContextVar('audit_suppressed', default=False)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class _TransactionBatch:
+    """Entradas pendientes de una transacción; se registra en `on_commit`."""
+
+    def __init__(self):
+        self.entries = []
+        self.flushed = False
+
+    def __call__(self):
+        self.flushed = True
+        write(self.entries)
+
+
+def _pending_batch(connection):
+    # on_commit guarda (savepoint_ids, func, robust): reutilizamos el lote ya
+    # registrado en el mismo nivel de savepoint para que un rollback parcial
+    # descarte sólo las entradas de ese savepoint.
+    sids = set(connection.savepoint_ids)
+    for callback_sids, func, _ in connection.run_on_commit:
+        if isinstance(func, _TransactionBatch) and not func.flushed and callback_sids == sids:
+            return func
+    batch = _TransactionBatch()
+    transaction.on_commit(batch, using=connection.alias)
+    return batch
+
+
+def record(**fields):
+    """Registra una entrada de auditoría (ver docstring del módulo).
+
+    Dentro de `suppressed()` no registra nada y devuelve None.
+    """
+    if _suppressed.get():
+        return None
+    entry = AuditLog(**fields)
+    connection = connections[router.db_for_write(AuditLog)]
+    if connection.in_atomic_block:
+        _pending_batch(connection).entries.append(entry)
+        return entry
+    buffer = _request_buffer.get()
+    if buffer is not None:
+        buffer.append(entry)
+    else:
+        write([entry])
+    return entry
+
+
+def safe_user(user):
+    return user if user and getattr(user, 'is_authenticated', False) else None
+
+
+class RequestContext:
+    """Metadatos de auditoría de una request, leídos de `META` una sola vez.
+
+    `RequestMiddleware` arma uno por request y los handlers de `core.signals`
+    lo reutilizan en cada evento. El actor no se copia: se lee de
+    `request.user` (que Django ya cachea) para seguir un login o logout
+    hecho en la misma request.
+    """
+
+    __slots__ = ('request', 'ip_address', 'path', 'user_agent')
+
+    def __init__(self, request):
+        meta = request.META
+        agent = meta.get('HTTP_USER_AGENT')
+        self.request = request
+        self.ip_address = meta.get('HTTP_X_FORWARDED_FOR') or meta.get('REMOTE_ADDR')
+        self.path = request.path
+        self.user_agent = agent[:512] if agent else None
+
+    @property
+    def actor(self):
+        return safe_user(getattr(self.request, 'user', None))
+
+    def fields(self, actor=None):
+        return {
+            'actor': safe_user(actor) if actor is not None else self.actor,
+            'ip_address': self.ip_address,
+            'path': self.path,
+            'user_agent': self.user_agent,
+        }
+
+
+def request_fields(request, actor=None):
+    """Actor y metadatos de la request, como los registran los handlers de
+    `core.signals`, para quien escribe entradas sin pasar por los signals."""
+    from core.middleware import get_audit_context
+
+    if request is None:
+        return {'actor': safe_user(actor), 'ip_address': None, 'path': None, 'user_agent': None}
+    context = get_audit_context()
+    if context is None or context.request is not request:
+        context = RequestContext(request)
+    return context.fields(actor)
+
+
+@contextmanager
+def suppressed():
+    """Omite las entradas registradas adentro; para operaciones compuestas
+    (p. ej. `core.dedup.merge`) que escriben una sola entrada propia."""
+    token = _suppressed.set(True)
+    try:
+        yield
+    finally:
+        _suppressed.reset(token)
+
+
+@contextmanager
+def collect():
+    """Acumula las entradas registradas fuera de transacción y las escribe al salir."""
+    buffer = []
+    token = _request_buffer.set(buffer)
+    try:
+        yield buffer
+    finally:
+        _request_buffer.reset(token)
+        write(buffer)
+
+
+@asynccontextmanager
+async def acollect():
+    """`collect()` para requests async: la escritura, si hay algo, va a un hilo."""
+    buffer = []
+    token = _request_buffer.set(buffer)
+    try:
+        yield buffer
+    finally:
+        _request_buffer.reset(token)
+        if buffer:
+            await sync_to_async(write)(buffer)
+
+
+HEAD_PK = 1
+
+
+def _lock_head(using):
+    # El UPDATE va primero a propósito: en SQLite toma el lock de escritura
+    # antes de leer la cabeza, así dos escritores no pueden encadenar sobre
+    # el mismo hash. En otros motores select_for_update bloquea la fila.
+    if not AuditChainHead.objects.using(using).filter(pk=HEAD_PK).update(length=F('length')):
+        AuditChainHead.objects.using(using).get_or_create(pk=HEAD_PK)
+    return AuditChainHead.objects.using(using).select_for_update().get(pk=HEAD_PK)
+
+
+def _bulk_write(entries):
+    using = router.db_for_write(AuditLog)
+    ip_field = AuditLog._meta.get_field('ip_address')
+    with transaction.atomic(using=using):
+        head = _lock_head(using)
+        prev = head.entry_hash
+        for entry in entries:
+            # normalizar como lo guardará la base para que el hash coincida al verificar
+            entry.ip_address = ip_field.get_prep_value(entry.ip_address)
+            entry.entry_hash = prev = chain_hash(prev, [getattr(entry, f) for f in HASH_FIELDS])
+        lookups.ensure(AuditPath, {entry.path for entry in entries}, using)
+        lookups.ensure(AuditUserAgent, {entry.user_agent for entry in entries}, using)
+        AuditLog.objects.using(using).bulk_create(entries)
+        AuditChainHead.objects.using(using).filter(pk=HEAD_PK).update(
+            entry_hash=prev, length=F('length') + len(entries)
+        )
+    for entry in entries:
+        metrics.inc('blc_audit_entries_total', action=entry.action)
+
+
+def write(entries):
+    if not entries:
+        return
+    with instrumentation.timed('audit'):
+        if _setting('AUDIT_SINK_MODE', 'sync') == 'background':
+            get_background_writer().submit(entries)
+        else:
+            _bulk_write(entries)
+
+
+class BackgroundWriter:
+    """Hilo daemon que vuelca entradas por tamaño o por tiempo."""
+
+    def __init__(self, max_batch=500, interval=1.0):
+        self.max_batch = max_batch
+        self.interval = interval
+        self.queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def submit(self, entries):
+        for entry in entries:
+            self.queue.put(entry)
+
+    def _next_batch(self, timeout):
+        batch = []
+        deadline = time.monotonic() + timeout
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self.queue.get(timeout=remaining))
+                else:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        with self._lock:
+            try:
+                _bulk_write(batch)
+            except Exception:
+                logger.exception("No se pudieron escribir %d entradas de auditoría", len(batch))
+
+    def _run(self):
+        while True:
+            batch = self._next_batch(self.interval)
+            if batch:
+                self._write(batch)
+                close_old_connections()
+
+    def flush(self):
+        """Escribe en el hilo actual todo lo que esté encolado."""
+        while True:
+            batch = self._next_batch(0)
+            if not batch:
+                return
+            self._write(batch)
+
+
+_background_writer = None
+_background_lock = threading.Lock()
+
+
+def get_background_writer():
+    global _background_writer
+    with _background_lock:
+        if _background_writer is None:
+            _background_writer = BackgroundWriter(
+                max_batch=_setting('AUDIT_SINK_MAX_BATCH', 500),
+                interval=_setting('AUDIT_SINK_FLUSH_INTERVAL', 1.0),
+            )
+            _background_writer.start()
+    return _background_writer
@@ -0,0 +1,206 @@
+"""Caché de páginas y fragmentos de entidades invalidada por versión.
+
+Cada modelo de Entity tiene un contador de versión y cada objeto el suyo,
+guardados en la misma caché que las páginas. Las claves de página y de
+fragmento incluyen la versión, así que no hay TTL: `core.signals` sube los
+contadores en `post_save`/`pre_delete` y lo cacheado con la versión
+anterior deja de pedirse (y la caché lo descarta por LRU).
+
+- versión de modelo: listados (cambia con cualquier alta, baja o
+  modificación del modelo).
+- versión de objeto: detalle (cambia sólo con ese objeto).
+
+Los contadores se inicializan con `time.time_ns()` en lugar de 1: si la
+caché descarta un contador, el nuevo valor nunca repite uno anterior.
+
+Con varios workers la caché tiene que ser compartida (ver `CACHES` en
+settings); con locmem cada proceso sólo vería sus propias invalidaciones.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections, router, transaction
+
+
+def get_cache():
+    return caches[getattr(settings, 'ENTITY_CACHE_ALIAS', 'default')]
+
+
+def _model_key(model):
+    return f'entity-version:{model._meta.label_lower}'
+
+
+def _object_key(model, pk):
+    return f'entity-version:{model._meta.label_lower}:{pk}'
+
+
+def _version(key):
+    cache = get_cache()
+    value = cache.get(key)
+    if value is None:
+        seed = time.time_ns()
+        cache.add(key, seed, timeout=None)
+        value = cache.get(key, seed)
+    return value
+
+
+async def _aversion(key):
+    cache = get_cache()
+    value = await cache.aget(key)
+    if value is None:
+        seed = time.time_ns()
+        await cache.aadd(key, seed, timeout=None)
+        value = await cache.aget(key, seed)
+    return value
+
+
+def model_version(model):
+    return _version(_model_key(model))
+
+
+def object_version(model, pk):
+    return _version(_object_key(model, pk))
+
+
+async def amodel_version(model):
+    return await _aversion(_model_key(model))
+
+
+async def aobject_version(model, pk):
+    return await _aversion(_object_key(model, pk))
+
+
+def _bump(model, pks):
+    cache = get_cache()
+    try:
+        cache.incr(_model_key(model))
+    except ValueError:
+        cache.set(_model_key(model), time.time_ns(), timeout=None)
+    if pks:
+        # borrar alcanza: la próxima lectura siembra un valor nuevo
+        cache.delete_many([_object_key(model, pk) for pk in pks])
+
+
+class _PendingBumps:
+    """Invalidaciones de una transacción, repetidas juntas en el commit."""
+
+    def __init__(self):
+        self.models = {}
+        self.flushed = False
+
+    def __call__(self):
+        self.flushed = True
+        for model, pks in self.models.items():
+            _bump(model, pks)
+
+
+def _pending(connection):
+    # Un solo callback por nivel de savepoint, como los lotes de core.audit.
+    sids = set(connection.savepoint_ids)
+    for callback_sids, func, _ in connection.run_on_commit:
+        if isinstance(func, _PendingBumps) and not func.flushed and callback_sids == sids:
+            return func
+    pending = _PendingBumps()
+    transaction.on_commit(pending, using=connection.alias)
+    return pending
+
+
+def bump(model, pks=()):
+    """Invalida lo cacheado de `model` (y de los objetos `pks`).
+
+    Se sube ya y otra vez al commit: la segunda evita que una request que
+    leyó la versión nueva antes del commit cachee datos viejos con ella.
+    """
+    pks = list(pks)
+    _bump(model, pks)
+    connection = connections[router.db_for_write(model)]
+    if connection.in_atomic_block:
+        _pending(connection).models.setdefault(model, set()).update(pks)
+
+
+def _has_pending_messages(request):
+    storage = getattr(request, '_messages', None)
+    return storage is not None and len(storage) > 0
+
+
+async def ahas_pending_messages(request):
+    """`_has_pending_messages` sin tocar la base desde el event loop.
+
+    Sin cookie de sesión ni de mensajes no puede haber nada guardado; si la
+    hay, la lectura (que puede ir a la sesión en la base) va a un hilo y deja
+    los mensajes cargados para el template.
+    """
+    if getattr(request, '_messages', None) is None:
+        return False
+    if settings.SESSION_COOKIE_NAME not in request.COOKIES and 'messages' not in request.COOKIES:
+        return False
+    return await sync_to_async(_has_pending_messages)(request)
+
+
+def _page_key(name, version, request):
+    path = hashlib.md5(request.get_full_path().encode('utf-8')).hexdigest()
+    return f'entity-page:{name}:{version}:{path}'
+
+
+def _storable(request, response):
+    # Si se usó el token CSRF la página es propia de ese navegador.
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+    )
+
+
+def cache_page(model, pk_kwarg=None):
+    """Cachea la respuesta de una vista GET bajo la versión del modelo (o del
+    objeto `kwargs[pk_kwarg]`) y la URL completa.
+
+    No se usa la caché si hay mensajes pendientes (se tienen que mostrar) y
+    no se guardan respuestas que no sean 200 ni las que usan el token CSRF.
+    Acepta vistas sync y async.
+    """
+    def decorator(view):
+        name = f'{view.__module__}.{view.__qualname__}'
+
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def awrapped(request, *args, **kwargs):
+                if request.method not in ('GET', 'HEAD') or await ahas_pending_messages(request):
+                    return await view(request, *args, **kwargs)
+                if pk_kwarg:
+                    version = await aobject_version(model, kwargs[pk_kwarg])
+                else:
+                    version = await amodel_version(model)
+                key = _page_key(name, version, request)
+                cache = get_cache()
+                response = await cache.aget(key)
+                if response is not None:
+                    return response
+                response = await view(request, *args, **kwargs)
+                if _storable(request, response):
+                    await cache.aset(key, response, timeout=None)
+                return response
+            return awrapped
+
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or _has_pending_messages(request):
+                return view(request, *args, **kwargs)
+            version = object_version(model, kwargs[pk_kwarg]) if pk_kwarg else model_version(model)
+            key = _page_key(name, version, request)
+            cache = get_cache()
+            response = cache.get(key)
+            if response is not None:
+                return response
+            response = view(request, *args, **kwargs)
+            if _storable(request, response):
+                cache.set(key, response, timeout=None)
+            return response
+        return wrapped
+    return decorator
@@ -0,0 +1,66 @@
+"""Hashing encadenado de `AuditLog` (funciones puras, sin ORM).
+
+    entry_hash(n) = sha256(entry_hash(n-1) + payload canónico de la fila n)
+
+La primera fila encadenada usa `GENESIS` como hash previo. Este módulo no
+importa modelos para que `verify_segment` pueda ejecutarse en procesos de un
+pool sin inicializar Django.
+"""
+import hashlib
+import json
+from datetime import datetime, timezone
+
+
+GENESIS = ''
+
+# Campos que entran en el hash, en orden. `verify_audit_chain` los lee con
+# `values_list('pk', 'entry_hash', *HASH_FIELDS)`.
+HASH_FIELDS = (
+    'timestamp', 'actor_id', 'action', 'content_type_id', 'object_pk',
+    'object_repr', 'changes', 'ip_address', 'path', 'user_agent',
+)
+
+
+def _canonical(value):
+    if isinstance(value, datetime):
+        return value.astimezone(timezone.utc).isoformat()
+    return value
+
+
+def chain_hash(prev_hash, values):
+    """Hash de una fila dada la del registro anterior. `values` sigue HASH_FIELDS."""
+    payload = json.dumps(
+        [_canonical(v) for v in values],
+        sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str,
+    )
+    return hashlib.sha256((prev_hash + payload).encode('utf-8')).hexdigest()
+
+
+def verify_segment(prev_hash, rows):
+    """Verifica un tramo contiguo de filas `(pk, entry_hash, *HASH_FIELDS)`.
+
+    `prev_hash` es el hash almacenado de la fila anterior al tramo (o
+    `GENESIS`, o None si el tramo empieza antes de que exista la cadena: en
+    ese caso se saltean las filas sin hash iniciales). Como cada fila se
+    compara contra el hash *almacenado* de la anterior, los tramos se pueden
+    verificar en paralelo e independientemente.
+
+    Devuelve `(pks_invalidos, ultimo_pk, ultimo_hash, filas_verificadas)`.
+    """
+    bad = []
+    verified = 0
+    last_pk = None
+    for pk, stored, *values in rows:
+        last_pk = pk
+        if stored is None:
+            if prev_hash is None:
+                continue
+            bad.append(pk)
+            continue
+        if prev_hash is None:
+            prev_hash = GENESIS
+        if chain_hash(prev_hash, values) != stored:
+            bad.append(pk)
+        prev_hash = stored
+        verified += 1
+    return bad, last_pk, prev_hash, verified
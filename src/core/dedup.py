@@ -0,0 +1,494 @@
+"""Detección y fusión de entidades duplicadas (Client, Supplier, ...).
+
+Comparar todos los pares de un modelo es O(n²). En su lugar cada entidad
+se reduce a un conjunto de claves de bloqueo (`EntityBlockKey`) y sólo se
+comparan las que comparten alguna:
+
+- `tax_id:`, `email:` y `phone:` con el CUIT, el email y el teléfono
+  normalizados;
+- `tri<i>:` con bandas de MinHash de los trigramas de la razón social
+  normalizada. Cada banda junta `MINHASH_ROWS` hashes, así que dos nombres
+  con similitud de Jaccard J comparten una banda con probabilidad J^2 y
+  alguna de las `MINHASH_BANDS` con 1 - (1 - J^2)^4: 0,98 para J = 0,8 y
+  0,31 para J = 0,3. Las variantes de escritura ("Ferretería López S.A." /
+  "Ferreteria Lopez") quedan juntas sin comparar contra toda la tabla.
+
+Los bloques de más de `MAX_BLOCK_SIZE` entidades (un teléfono de central,
+un trigrama muy común) se ignoran. Cada par se puntúa combinando las
+coincidencias como un "noisy-or" (`score`) y los que llegan al umbral
+quedan en `DuplicateCandidate`.
+
+- `schedule()`: lo llaman los signals, la importación y la API con las
+  instancias ya guardadas; recalcula al commit las claves y los pares de
+  las entidades que cambiaron. Dentro de una request el recálculo se
+  posterga hasta que la respuesta ya salió (`request_finished`), así no
+  suma consultas ni tiempo a la vista.
+- `rebuild()`: recalcula un modelo entero (comando `find_duplicates`).
+- `merge()`: fusiona duplicados en una entidad, con una sola entrada de
+  auditoría `merge`.
+"""
+import hashlib
+import logging
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+from itertools import combinations, groupby
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.signals import request_finished
+from django.db import close_old_connections, connections, router, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from core import audit
+from core.models import DuplicateCandidate, EntityBlockKey, normalize_tax_id
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_THRESHOLD = 0.6
+MAX_BLOCK_SIZE = 200
+MINHASH_BANDS = 4
+MINHASH_ROWS = 2
+SCORE_BATCH_SIZE = 5000
+QUERY_CHUNK_SIZE = 500
+
+# Campos que alimentan las claves y el puntaje: cambiar otros no recalcula.
+DEDUP_FIELDS = ('company_name', 'tax_id', 'email', 'phone')
+
+# Probabilidad de duplicado que aporta cada coincidencia exacta; la del
+# nombre es la similitud de Jaccard de los trigramas.
+MATCH_WEIGHTS = {'tax_id': 0.95, 'email': 0.8, 'phone': 0.6}
+# Dos CUIT distintos casi siempre son dos empresas distintas.
+TAX_ID_MISMATCH_FACTOR = 0.5
+
+LEGAL_SUFFIXES = frozenset({
+    'sa', 'srl', 'sas', 'sau', 'sh', 'sca', 'scs', 'saic', 'sacif', 'ltda', 'inc', 'llc',
+})
+
+_SEPARATOR_RE = re.compile(r'[^a-z0-9]+')
+
+
+def get_threshold():
+    return getattr(settings, 'DEDUP_THRESHOLD', DEFAULT_THRESHOLD)
+
+
+def _delete(queryset):
+    # DELETE directo, sin el Collector de Django: no hay nada que cargar ni
+    # signals que enviar (EntityBlockKey no se audita).
+    return queryset._raw_delete(queryset.db)
+
+
+def _insert_keys(content_type, rows):
+    """Inserta `(object_pk, key)` con un executemany: construir un
+    `EntityBlockKey` por fila costaba más que calcular las claves."""
+    if not rows:
+        return
+    connection = connections[router.db_for_write(EntityBlockKey)]
+    quote = connection.ops.quote_name
+    table = quote(EntityBlockKey._meta.db_table)
+    columns = ', '.join(quote(EntityBlockKey._meta.get_field(name).column)
+                        for name in ('content_type', 'object_pk', 'key'))
+    # en una transacción: en autocommit SQLite confirma (y sincroniza) cada fila
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {table} ({columns}) VALUES (%s, %s, %s)',
+            [(content_type.pk, pk, key) for pk, key in rows],
+        )
+
+
+def _chunks(values, size=QUERY_CHUNK_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+# --- Normalización y claves ------------------------------------------------
+
+def normalize_name(value):
+    """Minúsculas, sin acentos, sin puntuación y sin la forma societaria."""
+    value = unicodedata.normalize('NFKD', value or '')
+    value = ''.join(ch for ch in value if not unicodedata.combining(ch)).lower()
+    # "S.A." y "S.R.L." se unen antes de separar palabras
+    words = _SEPARATOR_RE.split(value.replace('.', ''))
+    return ' '.join(word for word in words if word and word not in LEGAL_SUFFIXES)
+
+
+def normalize_email(value):
+    return (value or '').strip().lower()
+
+
+def normalize_phone(value):
+    # Los últimos 8 dígitos: el número local, sin los prefijos de país y de
+    # área que se escriben de muchas formas (+54 9 11, 011, 15, ...).
+    digits = ''.join(ch for ch in value or '' if ch.isdigit())
+    return digits[-8:] if len(digits) >= 8 else ''
+
+
+def trigrams(name):
+    if not name:
+        return frozenset()
+    padded = f'  {name} '
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+class Features:
+    """Valores normalizados de una entidad, lo único que miran claves y puntaje."""
+
+    __slots__ = ('pk', 'tax_id', 'email', 'phone', 'grams')
+
+    def __init__(self, pk, company_name, tax_id, email, phone):
+        self.pk = pk
+        self.tax_id = normalize_tax_id(tax_id)
+        self.email = normalize_email(email)
+        self.phone = normalize_phone(phone)
+        self.grams = trigrams(normalize_name(company_name))
+
+    @classmethod
+    def of(cls, instance):
+        """Los de una instancia en memoria, sin volver a leerla de la base."""
+        return cls(instance.pk, *(getattr(instance, name) for name in DEDUP_FIELDS))
+
+
+def block_keys(features):
+    keys = set()
+    for field in ('tax_id', 'email', 'phone'):
+        value = getattr(features, field)
+        if value:
+            keys.add(f'{field}:{value}'[:300])
+    if features.grams:
+        # Un solo blake2b por trigrama da todos los hashes: cada uno es un
+        # tramo de 4 bytes del digest.
+        hashes = MINHASH_BANDS * MINHASH_ROWS
+        digests = [
+            hashlib.blake2b(gram.encode('utf-8'), digest_size=4 * hashes).digest()
+            for gram in features.grams
+        ]
+        minimums = [min(digest[4 * i:4 * i + 4] for digest in digests) for i in range(hashes)]
+        for band in range(MINHASH_BANDS):
+            values = minimums[band * MINHASH_ROWS:(band + 1) * MINHASH_ROWS]
+            keys.add(f"tri{band}:{b''.join(values).hex()}")
+    return keys
+
+
+def _jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    common = len(a & b)
+    return common / (len(a) + len(b) - common)
+
+
+def score(a, b):
+    """Puntaje de 0 a 1 de que `a` y `b` (`Features`) sean la misma entidad,
+    y qué coincidió."""
+    reasons = {}
+    miss = 1.0
+    for field, weight in MATCH_WEIGHTS.items():
+        value = getattr(a, field)
+        if value and value == getattr(b, field):
+            reasons[field] = True
+            miss *= 1 - weight
+    name = _jaccard(a.grams, b.grams)
+    if name:
+        reasons['name'] = round(name, 3)
+        miss *= 1 - name
+    value = 1 - miss
+    if a.tax_id and b.tax_id and a.tax_id != b.tax_id:
+        reasons['tax_id'] = False
+        value *= TAX_ID_MISMATCH_FACTOR
+    return round(value, 4), reasons
+
+
+# --- Persistencia ----------------------------------------------------------
+
+def _load(model, pks):
+    features = {}
+    for chunk in _chunks(pks):
+        for row in model._default_manager.filter(pk__in=chunk).values_list('pk', *DEDUP_FIELDS):
+            features[row[0]] = Features(*row)
+    return features
+
+
+def _score_pairs(content_type, model, pairs, features, threshold):
+    """Puntúa `pairs` (tuplas ordenadas) y guarda los que llegan a `threshold`.
+
+    Los pares ya conocidos sólo actualizan puntaje y motivos, así un par
+    descartado sigue descartado.
+    """
+    missing = {pk for pair in pairs for pk in pair} - features.keys()
+    if missing:
+        features.update(_load(model, missing))
+    candidates = []
+    for left, right in pairs:
+        if left not in features or right not in features:
+            continue
+        value, reasons = score(features[left], features[right])
+        if value >= threshold:
+            candidates.append(DuplicateCandidate(
+                content_type=content_type, left_pk=left, right_pk=right, score=value, reasons=reasons,
+            ))
+    DuplicateCandidate.objects.bulk_create(
+        candidates,
+        update_conflicts=True,
+        unique_fields=['content_type', 'left_pk', 'right_pk'],
+        update_fields=['score', 'reasons', 'updated_at'],
+    )
+    return len(candidates)
+
+
+def _neighbour_pairs(content_type, keys):
+    """Pares entre las entidades de `keys` ({pk: claves}) y las que comparten alguna clave."""
+    wanted = set().union(*keys.values())
+    blockers = EntityBlockKey.objects.filter(content_type=content_type)
+    oversized = set()
+    members = defaultdict(set)
+    for chunk in _chunks(wanted):
+        oversized.update(
+            blockers.filter(key__in=chunk).values('key').annotate(size=Count('pk'))
+            .filter(size__gt=MAX_BLOCK_SIZE).values_list('key', flat=True)
+        )
+    for chunk in _chunks(wanted - oversized):
+        for key, pk in blockers.filter(key__in=chunk).values_list('key', 'object_pk'):
+            members[key].add(pk)
+    pairs = set()
+    for pk, own_keys in keys.items():
+        for key in own_keys - oversized:
+            for other in members[key]:
+                if other != pk:
+                    pairs.add((min(pk, other), max(pk, other)))
+    return pairs
+
+
+def refresh(model, pks, threshold=None):
+    """Recalcula claves y candidatos de las entidades `pks` de `model`,
+    leyéndolas de la base.
+
+    Las que ya no existen se quitan de ambas tablas.
+    """
+    pks = set(pks)
+    if pks:
+        _refresh(model, _load(model, pks), pks, threshold)
+
+
+def _refresh(model, features, pks, threshold=None):
+    # `features` ({pk: Features}) son las entidades vigentes; las demás de
+    # `pks` se borraron y se quitan de ambas tablas.
+    threshold = get_threshold() if threshold is None else threshold
+    content_type = ContentType.objects.get_for_model(model)
+    started = timezone.now()
+    keys = {pk: block_keys(item) for pk, item in features.items()}
+    with transaction.atomic(using=router.db_for_write(DuplicateCandidate)):
+        for chunk in _chunks(pks):
+            _delete(EntityBlockKey.objects.filter(content_type=content_type, object_pk__in=chunk))
+        _insert_keys(content_type, [(pk, key) for pk, own_keys in keys.items() for key in own_keys])
+        pairs = _neighbour_pairs(content_type, keys) if keys else set()
+        _score_pairs(content_type, model, sorted(pairs), features, threshold)
+        # Lo que no se reescribió recién dejó de ser candidato.
+        for chunk in _chunks(pks):
+            _delete(DuplicateCandidate.objects.filter(
+                Q(left_pk__in=chunk) | Q(right_pk__in=chunk),
+                content_type=content_type, updated_at__lt=started,
+            ))
+
+
+def rebuild(model, threshold=None, batch_size=SCORE_BATCH_SIZE):
+    """Recalcula las claves y los candidatos de todo `model`; devuelve
+    `(pares puntuados, candidatos)`.
+
+    Los bloques se recorren en orden de clave desde la base, sin cargar la
+    tabla en memoria, y los pares se puntúan de a `batch_size`. Un par que
+    comparte varias claves puede puntuarse más de una vez; es más barato
+    que recordar todos los pares vistos.
+    """
+    threshold = get_threshold() if threshold is None else threshold
+    content_type = ContentType.objects.get_for_model(model)
+    started = timezone.now()
+    blockers = EntityBlockKey.objects.filter(content_type=content_type)
+
+    _delete(blockers)
+    pending = []
+    rows = model._default_manager.order_by('pk').values_list('pk', *DEDUP_FIELDS)
+    for row in rows.iterator(chunk_size=2000):
+        pending.extend((row[0], key) for key in block_keys(Features(*row)))
+        if len(pending) >= batch_size:
+            _insert_keys(content_type, pending)
+            pending = []
+    _insert_keys(content_type, pending)
+
+    scored = found = 0
+    batch = set()
+    members = blockers.order_by('key', 'object_pk').values_list('key', 'object_pk')
+    for _, block in groupby(members.iterator(chunk_size=batch_size), key=lambda row: row[0]):
+        pks = [pk for _, pk in block]
+        if len(pks) < 2 or len(pks) > MAX_BLOCK_SIZE:
+            continue
+        batch.update(combinations(pks, 2))
+        if len(batch) >= batch_size:
+            scored += len(batch)
+            found += _score_pairs(content_type, model, sorted(batch), {}, threshold)
+            batch = set()
+    if batch:
+        scored += len(batch)
+        found += _score_pairs(content_type, model, sorted(batch), {}, threshold)
+    _delete(DuplicateCandidate.objects.filter(content_type=content_type, updated_at__lt=started))
+    return scored, DuplicateCandidate.objects.filter(content_type=content_type).count()
+
+
+def _run(models):
+    # models: {modelo: {pk: Features, o None si se borró}}
+    for model, entries in models.items():
+        features = {pk: item for pk, item in entries.items() if item is not None}
+        _refresh(model, features, set(entries))
+
+
+_deferred = {}
+_deferred_lock = threading.Lock()
+
+
+def _dispatch(models):
+    from core.middleware import get_audit_context
+
+    if get_audit_context() is None:
+        _run(models)
+        return
+    with _deferred_lock:
+        for model, entries in models.items():
+            _deferred.setdefault(model, {}).update(entries)
+
+
+def run_deferred(**kwargs):
+    """Receptor de `request_finished`: recalcula lo que postergaron las
+    requests, ya con la respuesta enviada."""
+    global _deferred
+    with _deferred_lock:
+        models, _deferred = _deferred, {}
+    if not models:
+        return
+    try:
+        _run(models)
+    except Exception:
+        # los candidatos se pueden regenerar con find_duplicates
+        logger.exception("No se pudieron recalcular los duplicados")
+    finally:
+        # Django cierra las conexiones viejas en request_finished antes que
+        # este receptor; la que se haya abierto acá se cierra igual.
+        if not any(conn.in_atomic_block for conn in connections.all(initialized_only=True)):
+            close_old_connections()
+
+
+request_finished.connect(run_deferred, dispatch_uid='dedup:deferred')
+
+
+class _PendingRefresh:
+    """Entidades a recalcular al commit de una transacción."""
+
+    def __init__(self, defer=True):
+        self.models = {}
+        self.defer = defer
+        self.flushed = False
+
+    def __call__(self):
+        self.flushed = True
+        if self.defer:
+            _dispatch(self.models)
+        else:
+            _run(self.models)
+
+
+def _pending(connection, defer):
+    # Un solo callback por nivel de savepoint, como core.cache y core.audit.
+    sids = set(connection.savepoint_ids)
+    for callback_sids, func, _ in connection.run_on_commit:
+        if isinstance(func, _PendingRefresh) and not func.flushed and func.defer == defer and callback_sids == sids:
+            return func
+    pending = _PendingRefresh(defer)
+    # robust: los candidatos se pueden regenerar, un error no debe afectar al commit
+    transaction.on_commit(pending, using=connection.alias, robust=True)
+    return pending
+
+
+def schedule(model, instances=(), deleted=(), defer=True):
+    """Recalcula las entidades `instances` (ya guardadas) y quita las de pk
+    en `deleted`, al commit o en el momento fuera de una transacción.
+
+    Las claves salen de las instancias en memoria, sin releerlas. Dentro de
+    una request el recálculo queda para `request_finished`; con
+    `defer=False` se hace igual al commit (la importación, que no puede
+    guardar las claves de todos sus lotes hasta el final). Con
+    `DEDUP_AUTO_REFRESH = False` no se recalcula nada y la tabla sólo se
+    actualiza con `find_duplicates`.
+    """
+    if not getattr(settings, 'DEDUP_AUTO_REFRESH', True):
+        return
+    entries = {obj.pk: Features.of(obj) for obj in instances if obj.pk is not None}
+    entries.update(dict.fromkeys(deleted))
+    if not entries:
+        return
+    connection = connections[router.db_for_write(model)]
+    if connection.in_atomic_block:
+        _pending(connection, defer).models.setdefault(model, {}).update(entries)
+    elif defer:
+        _dispatch({model: entries})
+    else:
+        _run({model: entries})
+
+
+# --- Fusión ----------------------------------------------------------------
+
+class MergeError(ValueError):
+    """Los duplicados no son del modelo de la entidad conservada o la incluyen."""
+
+
+def merge(keep, duplicates, request=None, actor=None):
+    """Fusiona `duplicates` en `keep` y los borra; devuelve `keep`.
+
+    Los campos vacíos de `keep` se completan con el primer valor no vacío
+    de los duplicados, en el orden recibido, y `keep` queda activo si alguno
+    lo estaba. Las FK de otros modelos que apuntaban a un duplicado pasan a
+    `keep`. El guardado y los borrados no generan auditoría propia: se
+    registra una única entrada `merge` con los campos completados y los
+    objetos absorbidos.
+    """
+    model = type(keep)
+    duplicates = list(duplicates)
+    if not duplicates or any(type(dup) is not model or dup.pk == keep.pk for dup in duplicates):
+        raise MergeError("Los duplicados tienen que ser otros objetos del mismo modelo.")
+
+    changes = {}
+    for field in model._meta.concrete_fields:
+        if field.primary_key or field.name in ('is_active', 'updated_at'):
+            continue
+        if getattr(keep, field.attname) not in (None, ''):
+            continue
+        for dup in duplicates:
+            value = getattr(dup, field.attname)
+            if value not in (None, ''):
+                changes[field.name] = [getattr(keep, field.attname), value]
+                setattr(keep, field.attname, value)
+                break
+    if not keep.is_active and any(dup.is_active for dup in duplicates):
+        changes['is_active'] = [False, True]
+        keep.is_active = True
+
+    merged = {str(dup.pk): str(dup)[:255] for dup in duplicates}
+    using = router.db_for_write(model)
+    with transaction.atomic(using=using):
+        for relation in model._meta.related_objects:
+            if relation.one_to_many:
+                relation.related_model._base_manager.using(using).filter(
+                    **{f'{relation.field.name}__in': duplicates}
+                ).update(**{relation.field.name: keep})
+        with audit.suppressed():
+            keep.save()
+            for dup in duplicates:
+                dup.delete()
+        audit.record(
+            action='merge',
+            content_type=ContentType.objects.get_for_model(model),
+            object_pk=str(keep.pk),
+            object_repr=str(keep)[:255],
+            changes={'merged': merged, 'fields': changes},
+            **audit.request_fields(request, actor),
+        )
+    return keep
@@ -0,0 +1,122 @@
+"""Exportación en streaming de entidades a CSV o JSONL.
+
+Los generadores leen con `values_list(...).iterator(chunk_size)`, así que
+la memoria no depende del tamaño de la tabla, y emiten el encabezado antes
+de la primera consulta para que el primer byte salga enseguida. Con
+`compress=True` la salida se comprime en gzip a medida que se genera.
+"""
+import csv
+import zlib
+from datetime import datetime, time
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+
+DEFAULT_CHUNK_SIZE = 2000
+FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+}
+
+
+class InvalidExport(ValueError):
+    """Parámetros de exportación inválidos (formato o fecha)."""
+
+
+class _Echo:
+    """Pseudo-archivo para `csv.writer`: devuelve la línea en lugar de guardarla."""
+
+    def write(self, value):
+        return value
+
+
+def parse_since(value):
+    """`updated_since` como fecha (YYYY-MM-DD) o fecha y hora ISO 8601."""
+    if not value:
+        return None
+    try:
+        moment = parse_datetime(value)
+        if moment is None:
+            day = parse_date(value)
+            if day is None:
+                raise ValueError(value)
+            moment = datetime.combine(day, time.min)
+    except ValueError:
+        raise InvalidExport(f"Fecha inválida: {value}")
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def export_fields(model):
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def export_queryset(model, active=None, updated_since=None):
+    queryset = model._default_manager.order_by('pk')
+    if active is not None:
+        queryset = queryset.filter(is_active=active)
+    if updated_since is not None:
+        queryset = queryset.filter(updated_at__gte=updated_since)
+    return queryset
+
+
+def _rows(queryset, fields, chunk_size):
+    return queryset.values_list(*fields).iterator(chunk_size=chunk_size)
+
+
+def csv_lines(queryset, fields, chunk_size=DEFAULT_CHUNK_SIZE):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(fields)
+    buffer = []
+    for row in _rows(queryset, fields, chunk_size):
+        buffer.append(writer.writerow(row))
+        if len(buffer) >= chunk_size:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+def jsonl_lines(queryset, fields, chunk_size=DEFAULT_CHUNK_SIZE):
+    encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    first = True
+    buffer = []
+    for row in _rows(queryset, fields, chunk_size):
+        buffer.append(encoder.encode(dict(zip(fields, row))) + '\n')
+        # JSONL no tiene encabezado: la primera fila sale sola.
+        if len(buffer) >= chunk_size or first:
+            first = False
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+def gzip_chunks(chunks, level=6):
+    """Comprime en gzip una secuencia de str, vaciando el compresor por bloque."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        # Z_SYNC_FLUSH para que cada bloque llegue al cliente sin esperar al siguiente.
+        data += compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(model, fmt='csv', active=None, updated_since=None, compress=False,
+                  chunk_size=DEFAULT_CHUNK_SIZE):
+    """Devuelve `(chunks, content_type, extension)` para `StreamingHttpResponse`."""
+    if fmt not in FORMATS:
+        raise InvalidExport(f"Formato desconocido: {fmt}")
+    queryset = export_queryset(model, active=active, updated_since=updated_since)
+    fields = export_fields(model)
+    lines = csv_lines if fmt == 'csv' else jsonl_lines
+    chunks = lines(queryset, fields, chunk_size)
+    content_type, extension = FORMATS[fmt]
+    if compress:
+        return gzip_chunks(chunks), 'application/gzip', f'{extension}.gz'
+    return (chunk.encode('utf-8') for chunk in chunks), content_type, extension
@@ -0,0 +1,145 @@
+"""Importación masiva de entidades desde CSV.
+
+El archivo se lee en streaming con `csv.DictReader` (memoria constante) y
+cada fila se valida con el mismo `ModelForm` que usa el alta manual. Las
+filas válidas se acumulan y se insertan de a `batch_size` con un único
+`bulk_create` por lote, cada uno en su propia transacción. Como
+`bulk_create` no dispara `post_save`, por lote se indexa la búsqueda
+(`core.search.index_instances`), se recalculan los duplicados al commit
+del lote (`core.dedup.schedule`) y se registra una sola entrada de auditoría
+`import` con la cantidad y el rango de pk insertados.
+
+Las filas inválidas no frenan la importación: se escriben en el reporte de
+errores (CSV `linea,campo,error`) y se cuentan en el resultado.
+"""
+import csv
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import router, transaction
+from django.utils.module_loading import import_string
+
+from core import audit, cache, dedup, search
+
+
+DEFAULT_BATCH_SIZE = 1000
+MAX_ERROR_SAMPLES = 100
+ERROR_REPORT_HEADER = ('linea', 'campo', 'error')
+
+# Valores de `is_active` que se leen como False; vacío o ausente es True,
+# igual que el default del modelo.
+FALSE_VALUES = {'0', 'false', 'f', 'no', 'n'}
+
+TARGETS = {
+    'clients': ('clients.models.Client', 'clients.forms.ClientForm'),
+    'suppliers': ('suppliers.models.Supplier', 'suppliers.forms.SupplierForm'),
+}
+
+
+class InvalidFile(ValueError):
+    """El CSV no tiene las columnas obligatorias del formulario."""
+
+
+def get_target(name):
+    """Devuelve `(modelo, form_class)` para 'clients' o 'suppliers'."""
+    model_path, form_path = TARGETS[name]
+    return import_string(model_path), import_string(form_path)
+
+
+class ImportResult:
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.invalid = 0
+        self.batches = 0
+        self.error_samples = []
+
+    def add_errors(self, line, errors):
+        self.invalid += 1
+        if len(self.error_samples) < MAX_ERROR_SAMPLES:
+            self.error_samples.extend((line, field, message) for field, message in errors)
+
+
+def _form_errors(form):
+    for field, messages in form.errors.items():
+        for message in messages:
+            yield ('' if field == '__all__' else field), message
+
+
+def _normalize(row):
+    data = {key.strip(): value.strip() for key, value in row.items() if key and isinstance(value, str)}
+    active = data.get('is_active', '').lower()
+    data['is_active'] = 'false' if active in FALSE_VALUES else 'true'
+    return data
+
+
+def _check_header(fieldnames, form_class):
+    columns = {name.strip() for name in fieldnames or () if name}
+    required = [name for name, field in form_class.base_fields.items() if field.required]
+    missing = [name for name in required if name not in columns]
+    if missing:
+        raise InvalidFile(f"Faltan columnas obligatorias: {', '.join(missing)}")
+
+
+def _insert_batch(model, batch, lines, source, audit_fields):
+    using = router.db_for_write(model)
+    with transaction.atomic(using=using):
+        created = model._default_manager.using(using).bulk_create(batch)
+        search.index_instances(model, created)
+        cache.bump(model)
+        pks = [obj.pk for obj in created if obj.pk is not None]
+        # al commit de cada lote: postergarlo a request_finished guardaría
+        # las claves de todo el archivo
+        dedup.schedule(model, created, defer=False)
+        audit.record(
+            action='import',
+            content_type=ContentType.objects.get_for_model(model),
+            object_pk=None,
+            object_repr=f'{len(created)} {model._meta.verbose_name_plural}'[:255],
+            changes={
+                'rows': len(created),
+                'first_pk': min(pks) if pks else None,
+                'last_pk': max(pks) if pks else None,
+                'lines': [lines[0], lines[-1]],
+                'source': source,
+            },
+            **audit_fields,
+        )
+    return len(created)
+
+
+def import_entities(model, form_class, stream, batch_size=DEFAULT_BATCH_SIZE,
+                    error_report=None, source=None, request=None, actor=None, delimiter=','):
+    """Importa las filas de `stream` (texto CSV con encabezado) en `model`.
+
+    `error_report`, si se indica, es un archivo de texto donde se escribe
+    una línea por error. Los lotes ya insertados quedan aunque una fila
+    posterior falle; devuelve un `ImportResult`.
+    """
+    reader = csv.DictReader(stream, delimiter=delimiter)
+    _check_header(reader.fieldnames, form_class)
+    errors = csv.writer(error_report) if error_report is not None else None
+    if errors:
+        errors.writerow(ERROR_REPORT_HEADER)
+
+    audit_fields = audit.request_fields(request, actor)
+    result = ImportResult()
+    batch, lines = [], []
+    for row in reader:
+        result.rows += 1
+        form = form_class(data=_normalize(row))
+        if not form.is_valid():
+            row_errors = list(_form_errors(form))
+            result.add_errors(reader.line_num, row_errors)
+            if errors:
+                errors.writerows((reader.line_num, field, message) for field, message in row_errors)
+            continue
+        batch.append(form.save(commit=False))
+        lines.append(reader.line_num)
+        if len(batch) >= batch_size:
+            result.created += _insert_batch(model, batch, lines, source, audit_fields)
+            result.batches += 1
+            batch, lines = [], []
+    if batch:
+        result.created += _insert_batch(model, batch, lines, source, audit_fields)
+        result.batches += 1
+    return result
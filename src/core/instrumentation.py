@@ -0,0 +1,264 @@
+"""Métricas por vista, cabecera `Server-Timing` y presupuestos.
+
+`InstrumentationMiddleware` mide cada request con `time.perf_counter`
+(monótono) y guarda las métricas en una ContextVar, así que también cuenta
+lo que una vista async ejecuta en otro hilo con `sync_to_async`:
+
+- `db`: consultas SQL y su tiempo, contados por un `execute_wrapper` que
+  se instala en cada conexión al abrirse (`connection_created`).
+- `tpl`: render de templates, medido en `DjangoTemplates` de este módulo
+  (el backend de `TEMPLATES`) sólo para el template de primer nivel; los
+  `{% include %}` de `components/` quedan adentro.
+- `audit`: escritura de entradas de `AuditLog` (`core.audit.write`).
+- `total`: la request completa.
+
+Las fases se solapan: una consulta perezosa que se ejecuta al renderizar
+cuenta en `db` y en `tpl`, y los INSERT de auditoría en `db` y en `audit`.
+`render_ms` es `total_ms - db_ms` (vista, templates y middleware).
+
+Con `SERVER_TIMING` (activo por defecto) las fases salen en la cabecera
+`Server-Timing`, que muestran las devtools del navegador y se puede
+registrar en el balanceador. Sin nada que medir el costo es una lectura de
+ContextVar por consulta.
+
+Con `VIEW_INSTRUMENTATION` (por defecto con `DEBUG`) además se controlan
+los presupuestos de `VIEW_BUDGETS_FILE` (JSON): por nombre de URL
+(`"clients:list"`), los máximos de `queries`, `db_ms`, `render_ms` y
+`total_ms`; un máximo ausente no se controla. Una request que se pasa deja
+un warning en el log y, con `DEBUG`, la cabecera `X-View-Budget`. En los
+tests, `assert_within_budget(response)` falla con el detalle; por defecto
+sólo controla `queries`, que no dependen de la máquina: los tiempos se
+miran en el log y la cabecera de una corrida real o con `bench_crud`.
+
+Con `METRICS_ENABLED` (activo por defecto) cada request además suma a las
+series de `/metrics` (`core.metrics`).
+
+En respuestas en streaming (exportaciones) sólo se mide hasta que la vista
+devuelve la respuesta, no el cuerpo.
+"""
+import json
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.template import TemplateDoesNotExist
+from django.template.backends import django as django_backend
+from django.template.backends.django import reraise
+
+from core import metrics as app_metrics
+
+logger = logging.getLogger(__name__)
+
+_current_metrics = ContextVar('view_metrics', default=None)
+
+BUDGET_HEADER = 'X-View-Budget'
+LIMITS = ('queries', 'db_ms', 'render_ms', 'total_ms')
+TEST_LIMITS = ('queries',)
+PHASES = ('db', 'tpl', 'audit')
+
+
+class ViewMetrics:
+    """Consultas y tiempos (en segundos, por fase) de una request."""
+
+    def __init__(self):
+        self.view_name = None
+        self.queries = 0
+        self.times = dict.fromkeys(PHASES, 0.0)
+        self.total_time = 0.0
+        self._started = time.perf_counter()
+
+    def finish(self, request):
+        self.total_time = time.perf_counter() - self._started
+        match = getattr(request, 'resolver_match', None)
+        self.view_name = match.view_name if match else None
+
+    @property
+    def db_ms(self):
+        return self.times['db'] * 1000
+
+    @property
+    def total_ms(self):
+        return self.total_time * 1000
+
+    @property
+    def render_ms(self):
+        return max(self.total_ms - self.db_ms, 0.0)
+
+    def as_dict(self):
+        return {
+            'view': self.view_name,
+            'queries': self.queries,
+            'db_ms': round(self.db_ms, 2),
+            'template_ms': round(self.times['tpl'] * 1000, 2),
+            'audit_ms': round(self.times['audit'] * 1000, 2),
+            'render_ms': round(self.render_ms, 2),
+            'total_ms': round(self.total_ms, 2),
+        }
+
+    def server_timing(self):
+        """Valor de la cabecera `Server-Timing`."""
+        parts = [f'db;dur={self.db_ms:.1f};desc="{self.queries} consultas"']
+        parts += [f'{phase};dur={self.times[phase] * 1000:.1f}' for phase in PHASES[1:]]
+        parts.append(f'total;dur={self.total_ms:.1f}')
+        return ', '.join(parts)
+
+    def violations(self, budgets, limits=LIMITS):
+        """Lista de `"límite valor>máximo"` excedidos según `budgets` (sólo `limits`)."""
+        budget = budgets.get(self.view_name) if self.view_name else None
+        if not budget:
+            return []
+        values = self.as_dict()
+        return [
+            f'{limit} {values[limit]:g}>{budget[limit]:g}'
+            for limit in limits
+            if limit in budget and values[limit] > budget[limit]
+        ]
+
+
+def _record(execute, sql, params, many, context):
+    metrics = _current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.times['db'] += time.perf_counter() - start
+
+
+def install(connection, **kwargs):
+    """Receptor de `connection_created`: agrega `_record` a la conexión."""
+    if _record not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record)
+
+
+@contextmanager
+def timed(phase):
+    """Suma a la fase `phase` de la request actual el tiempo del bloque."""
+    metrics = _current_metrics.get()
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.times[phase] += time.perf_counter() - start
+
+
+class Template(django_backend.Template):
+    def render(self, context=None, request=None):
+        with timed('tpl'):
+            return super().render(context, request)
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """Backend de templates de Django que mide el render (fase `tpl`)."""
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+@contextmanager
+def measure():
+    """Mide las consultas ejecutadas adentro; entrega la `ViewMetrics`."""
+    metrics = ViewMetrics()
+    token = _current_metrics.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current_metrics.reset(token)
+
+
+@lru_cache(maxsize=4)
+def _load(path):
+    with open(path, encoding='utf-8') as handle:
+        return json.load(handle)
+
+
+def load_budgets():
+    path = getattr(settings, 'VIEW_BUDGETS_FILE', None)
+    return _load(str(path)) if path else {}
+
+
+def _budgets_enabled():
+    return getattr(settings, 'VIEW_INSTRUMENTATION', settings.DEBUG)
+
+
+def _enabled():
+    return getattr(settings, 'SERVER_TIMING', True) or _budgets_enabled() or app_metrics.enabled()
+
+
+class InstrumentationMiddleware:
+    """Mide cada request, agrega `Server-Timing`, la registra en `/metrics` y
+    controla su presupuesto (ver docstring del módulo).
+
+    Va primero en `MIDDLEWARE` para que el tiempo incluya todo el resto.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not _enabled():
+            return self.get_response(request)
+        with measure() as metrics:
+            response = self.get_response(request)
+        return self._report(request, response, metrics)
+
+    async def __acall__(self, request):
+        if not _enabled():
+            return await self.get_response(request)
+        with measure() as metrics:
+            response = await self.get_response(request)
+        return self._report(request, response, metrics)
+
+    def _report(self, request, response, metrics):
+        metrics.finish(request)
+        response.view_metrics = metrics
+        if getattr(settings, 'SERVER_TIMING', True):
+            response['Server-Timing'] = metrics.server_timing()
+        app_metrics.observe_request(request, response, metrics)
+        if not _budgets_enabled():
+            return response
+        violations = metrics.violations(load_budgets())
+        if violations:
+            logger.warning("%s %s excede su presupuesto: %s", metrics.view_name, request.path, '; '.join(violations))
+            if settings.DEBUG:
+                response[BUDGET_HEADER] = f"{metrics.view_name} {'; '.join(violations)}"
+        return response
+
+
+def assert_within_budget(response, budgets=None, limits=TEST_LIMITS):
+    """Para tests: falla si la request de `response` se pasó de su presupuesto.
+
+    Sólo controla `limits` (por defecto la cantidad de consultas): los
+    máximos de tiempo dependen de la máquina y de la carga.
+    """
+    metrics = getattr(response, 'view_metrics', None)
+    if metrics is None:
+        raise AssertionError("La respuesta no tiene métricas: ¿VIEW_INSTRUMENTATION está activo?")
+    budgets = load_budgets() if budgets is None else budgets
+    if metrics.view_name not in budgets:
+        raise AssertionError(f"{metrics.view_name} no tiene presupuesto en VIEW_BUDGETS_FILE.")
+    violations = metrics.violations(budgets, limits)
+    if violations:
+        raise AssertionError(f"{metrics.view_name} excede su presupuesto: {'; '.join(violations)} ({metrics.as_dict()})")
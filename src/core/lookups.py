@@ -0,0 +1,193 @@
+"""Tablas de lookup para las columnas repetitivas de AuditLog.
+
+`path` y `user_agent` se repiten en casi todas las entradas: cada valor
+distinto se guarda una sola vez en `AuditPath` / `AuditUserAgent` y la
+entrada guarda sólo su id (`path_ref`, `user_agent_ref`). Las propiedades
+`AuditLog.path` y `AuditLog.user_agent` leen y escriben a través de estas
+tablas, y `AuditLog.objects.with_metadata()` anota los valores para
+`values()` / `values_list()`.
+
+El id no es autoincremental sino los primeros 63 bits del sha256 del valor:
+
+- pasar de valor a id es una cuenta, sin consultar la base;
+- un id significa siempre el mismo valor, así que la caché id -> valor
+  nunca queda vieja, aunque la fila se revierta con la transacción que la
+  insertó.
+
+Al escribir (`core.audit`) sólo falta asegurar que las filas existan: un
+INSERT que ignora conflictos con los valores que la caché de ids conocidos
+no tiene. Un id se da por conocido recién cuando confirma la transacción
+propia que lo insertó; dentro de otra transacción (tests) no se recuerda,
+porque si esa revierte la fila desaparece. Con las pocas decenas de valores
+habituales el INSERT deja de hacerse enseguida.
+
+Las entradas anteriores a estas tablas tienen el texto en las columnas de
+siempre (`legacy_path`, `legacy_user_agent`); `intern_audit_metadata` las
+pasa por lotes.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+from django.db import connections, router, transaction
+from django.db.models import Q
+from django.db.models.signals import post_migrate
+
+CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def value_id(value):
+    """Id de `value` en su tabla de lookup: 63 bits del sha256."""
+    return int.from_bytes(hashlib.sha256(value.encode('utf-8')).digest()[:8], 'big') >> 1
+
+
+class LRU:
+    """Diccionario acotado a `maxsize` claves; descarta la menos usada."""
+
+    def __init__(self, maxsize=CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+_values = {}  # modelo -> LRU id -> valor
+_known = {}  # modelo -> LRU id -> True (filas confirmadas)
+
+
+def _cache(caches, model):
+    cache = caches.get(model)
+    if cache is None:
+        cache = caches.setdefault(model, LRU())
+    return cache
+
+
+def intern(model, value):
+    """Id de `value` (None para None); lo deja en caché para leerlo sin consultar."""
+    if value is None:
+        return None
+    pk = value_id(value)
+    _cache(_values, model).set(pk, value)
+    return pk
+
+
+def lookup(model, pk):
+    """Valor del id `pk`; consulta la base sólo si no está en caché."""
+    if pk is None:
+        return None
+    values = _cache(_values, model)
+    value = values.get(pk)
+    if value is None:
+        value = model._default_manager.filter(pk=pk).values_list('value', flat=True).first()
+        if value is not None:
+            values.set(pk, value)
+    return value
+
+
+def ensure(model, values, using):
+    """Inserta las filas de `values` que no se sabe que existan.
+
+    Llamar en la transacción que escribe las entradas que las referencian.
+    """
+    known = _cache(_known, model)
+    missing = {}
+    for value in values:
+        if value is not None:
+            pk = value_id(value)
+            if pk not in missing and not known.get(pk):
+                missing[pk] = value
+    if not missing:
+        return 0
+    model._default_manager.using(using).bulk_create(
+        [model(pk=pk, value=value) for pk, value in missing.items()], ignore_conflicts=True,
+    )
+    if len(connections[using].atomic_blocks) <= 1:
+        def remember():
+            for pk in missing:
+                known.set(pk, True)
+        transaction.on_commit(remember, using=using)
+    return len(missing)
+
+
+def backfill(batch_size=5000, using=None):
+    """Pasa el texto de `legacy_path` / `legacy_user_agent` a las tablas de
+    lookup por tramos de pk, cada uno en su propia transacción corta.
+
+    Sólo cambia cómo se guarda el valor, no el valor: la cadena de hashes
+    sigue verificando. Se puede cortar y volver a correr. Devuelve la
+    cantidad de filas pasadas.
+    """
+    from core.models import AuditLog, AuditPath, AuditUserAgent
+
+    using = using or router.db_for_write(AuditLog)
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    meta = AuditLog._meta
+    sql = (
+        f'UPDATE {quote(meta.db_table)} SET '
+        f'{quote(meta.get_field("path_ref").column)} = %s, {quote(meta.get_field("legacy_path").column)} = NULL, '
+        f'{quote(meta.get_field("user_agent_ref").column)} = %s, {quote(meta.get_field("legacy_user_agent").column)} = NULL '
+        f'WHERE {quote(meta.pk.column)} = %s'
+    )
+    queryset = (
+        AuditLog.objects.using(using)
+        .filter(Q(legacy_path__isnull=False) | Q(legacy_user_agent__isnull=False))
+        .order_by('pk')
+        .values_list('pk', 'legacy_path', 'legacy_user_agent', 'path_ref_id', 'user_agent_ref_id')
+    )
+    total = 0
+    last_pk = 0
+    while True:
+        rows = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+        if not rows:
+            return total
+        with transaction.atomic(using=using):
+            ensure(AuditPath, {row[1] for row in rows}, using)
+            ensure(AuditUserAgent, {row[2] for row in rows}, using)
+            params = [
+                (
+                    value_id(path) if path is not None else path_ref,
+                    value_id(agent) if agent is not None else agent_ref,
+                    pk,
+                )
+                for pk, path, agent, path_ref, agent_ref in rows
+            ]
+            with connection.cursor() as cursor:
+                cursor.executemany(sql, params)
+        total += len(rows)
+        last_pk = rows[-1][0]
+
+
+def clear():
+    """Olvida los ids conocidos (tras un `flush` o `migrate`)."""
+    for cache in _known.values():
+        cache.clear()
+
+
+def _forget_known(**kwargs):
+    clear()
+
+
+post_migrate.connect(_forget_known, dispatch_uid='audit:lookups')
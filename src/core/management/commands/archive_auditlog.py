@@ -0,0 +1,54 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core import archive
+
+
+class Command(BaseCommand):
+    help = (
+        "Mueve las entradas de AuditLog más viejas que la retención a segmentos "
+        "JSONL comprimidos y las borra de la base en lotes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=getattr(settings, 'AUDIT_RETENTION_DAYS', 365),
+                            help="Retención en la base, en días (por defecto AUDIT_RETENTION_DAYS).")
+        parser.add_argument('--output-dir', default=None,
+                            help="Directorio de segmentos (por defecto AUDIT_ARCHIVE_DIR).")
+        parser.add_argument('--block-rows', type=int, default=1000)
+        parser.add_argument('--segment-rows', type=int, default=100000)
+        parser.add_argument('--delete-batch', type=int, default=1000,
+                            help="Filas por DELETE; cada lote es una transacción corta.")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Sólo informar cuántas filas se archivarían.")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+
+        if options['dry_run']:
+            total = archive.count_expired(cutoff)
+            self.stdout.write(f"{total} entradas anteriores a {cutoff:%Y-%m-%d} se archivarían.")
+            return
+
+        try:
+            stats = archive.archive_expired(
+                cutoff,
+                directory=options['output_dir'],
+                block_rows=options['block_rows'],
+                segment_rows=options['segment_rows'],
+                delete_batch=options['delete_batch'],
+            )
+        except archive.ChainBroken as exc:
+            raise CommandError(
+                f"La cadena de hashes no verifica en las entradas {exc.args[0][:20]}; no se archivó ese tramo."
+            )
+
+        for name in stats['segments']:
+            self.stdout.write(f"  {name}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{stats['archived']} entradas archivadas en {len(stats['segments'])} segmentos, "
+            f"{stats['deleted']} borradas de la base."
+        ))
@@ -0,0 +1,152 @@
+"""Compara las vistas de lectura servidas por WSGI (hilos) y por ASGI.
+
+No levanta un servidor: llama directo a los handlers de Django con la misma
+carga, una request por cliente lento que tarda `--client-delay` segundos en
+recibir cada bloque de la respuesta.
+
+- WSGI: un pool de `--threads` hilos (como gunicorn con `--threads`); cada
+  hilo queda tomado hasta que el cliente terminó de leer.
+- ASGI: `--concurrency` requests a la vez sobre un event loop (como uvicorn);
+  mientras un cliente lee, el loop atiende a los demás.
+
+Lee la base configurada (no escribe nada) sin la caché de páginas, salvo
+con `--cache`, para medir las vistas y no la caché.
+"""
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from django.urls import reverse
+
+
+def _stats(statuses, latencies, elapsed):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(statuses),
+        'errors': sum(status != 200 for status in statuses),
+        'elapsed': elapsed,
+        'rps': len(statuses) / elapsed if elapsed else 0.0,
+        'p50_ms': statistics.median(latencies) * 1000 if latencies else 0.0,
+        'p95_ms': latencies[int(len(latencies) * 0.95) - 1] * 1000 if latencies else 0.0,
+    }
+
+
+def run_wsgi(url, requests, threads, client_delay):
+    handler = WSGIHandler()
+    factory = RequestFactory()
+
+    def one(start):
+        status = []
+        response = handler(factory.get(url).environ, lambda code, headers: status.append(int(code.split()[0])))
+        try:
+            for _ in response:
+                time.sleep(client_delay)
+        finally:
+            response.close()
+        return status[0], time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        # todos los clientes llegan juntos: la latencia incluye la espera de un hilo libre
+        results = list(pool.map(one, [start] * requests))
+    elapsed = time.perf_counter() - start
+    return _stats([item[0] for item in results], [item[1] for item in results], elapsed)
+
+
+def _scope(url):
+    parts = urlsplit(url)
+    return {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': parts.path,
+        'raw_path': parts.path.encode(),
+        'query_string': parts.query.encode(),
+        'root_path': '',
+        'headers': [(b'host', b'testserver')],
+        'client': ('127.0.0.1', 0),
+        'server': ('testserver', 80),
+    }
+
+
+async def _arun(url, requests, concurrency, client_delay):
+    handler = ASGIHandler()
+    limit = asyncio.Semaphore(concurrency)
+
+    async def one(start):
+        async with limit:
+            status = []
+            received = asyncio.Event()
+
+            async def receive():
+                if not received.is_set():
+                    received.set()
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                # el cliente no se desconecta: Django cancela esta espera al responder
+                await asyncio.Event().wait()
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    status.append(message['status'])
+                elif message['type'] == 'http.response.body':
+                    await asyncio.sleep(client_delay)
+
+            await handler(_scope(url), receive, send)
+            return status[0], time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(one(start) for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    return _stats([item[0] for item in results], [item[1] for item in results], elapsed)
+
+
+def run_asgi(url, requests, concurrency, client_delay):
+    return asyncio.run(_arun(url, requests, concurrency, client_delay))
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide requests por segundo de una vista de lectura servida por WSGI "
+        "con hilos y por ASGI, con clientes lentos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help="Ruta a pedir (por defecto el listado de clientes).")
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=50, help="Requests simultáneas en ASGI.")
+        parser.add_argument('--threads', type=int, default=4, help="Hilos del pool WSGI.")
+        parser.add_argument('--client-delay', type=float, default=0.05,
+                            help="Segundos que tarda el cliente en recibir cada bloque.")
+        parser.add_argument('--cache', action='store_true', help="Usar la caché de páginas configurada.")
+
+    def handle(self, *args, **options):
+        url = options['url'] or reverse('clients:list')
+        overrides = {'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver']}
+        if not options['cache']:
+            dummy = {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+            overrides['CACHES'] = {alias: dummy for alias in settings.CACHES}
+        self.stdout.write(
+            f"{url}: {options['requests']} requests, cliente de {options['client_delay'] * 1000:.0f} ms por bloque"
+        )
+        with override_settings(**overrides):
+            runs = (
+                (f"WSGI {options['threads']} hilos",
+                 run_wsgi(url, options['requests'], options['threads'], options['client_delay'])),
+                (f"ASGI {options['concurrency']} conc.",
+                 run_asgi(url, options['requests'], options['concurrency'], options['client_delay'])),
+            )
+        for name, stats in runs:
+            self.stdout.write(
+                f"{name:>16}: {stats['rps']:8.1f} req/s  {stats['errors']:4d} errores  "
+                f"p50 {stats['p50_ms']:8.2f} ms  p95 {stats['p95_ms']:8.2f} ms"
+            )
@@ -0,0 +1,375 @@
+"""Benchmark de las operaciones CRUD y de auditoría a escala.
+
+Crea una base de prueba aparte (archivo SQLite en el directorio temporal,
+`--db` para elegir otro) con `--rows` clientes, proveedores y entradas de
+`AuditLog` insertados con `executemany` en lotes, y mide con el cliente de
+prueba de Django (sin caché de páginas):
+
+- listado (primera página y una página profunda por cursor), detalle, alta,
+  modificación y baja de clientes y proveedores;
+- los handlers de `core.signals` solos (`post_save` de una modificación y
+  `pre_delete`), dentro de una transacción que se revierte;
+- la escritura de una entrada de auditoría (`core.audit.write`).
+
+El resultado es un JSON con p50/p95/p99 en milisegundos y la cantidad de
+consultas por operación. Con `--compare base.json` se marca como regresión
+toda operación cuyo p95 empeore más de `--tolerance` (y de `--min-delta-ms`)
+o que haga más consultas que en la base; el comando falla si hay alguna.
+
+Con `--keep` la base sembrada queda para la próxima corrida (sembrar un
+millón de filas lleva un rato). No se calculan claves de duplicados
+(`find_duplicates`): las modificaciones las recalculan sólo para la fila.
+"""
+import json
+import math
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, router, transaction
+from django.test import Client as TestClient
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core import audit, lookups, search, signals
+from core.models import ENTITY_LIST_ORDERING, AuditLog, AuditPath, AuditUserAgent
+from core.pagination import encode_cursor
+
+
+SEED_BATCH_SIZE = 5000
+WORDS = (
+    'Acero', 'Andes', 'Austral', 'Delta', 'Litoral', 'Norte', 'Pampa', 'Patagonia',
+    'Plata', 'Río', 'Sierra', 'Sur', 'Valle', 'Cuyo', 'Centro', 'Oeste',
+)
+KINDS = ('SA', 'SRL', 'SAS', 'Hnos.', 'y Cía.')
+FIRST_NAMES = ('Ana', 'Beto', 'Carla', 'Diego', 'Eva', 'Fede', 'Gabi', 'Hugo', 'Inés', 'Juan')
+
+
+def _percentile(values, q):
+    # nearest-rank sobre valores ordenados
+    return values[max(0, math.ceil(q * len(values)) - 1)]
+
+
+def summarize(samples, queries):
+    samples = sorted(samples)
+    return {
+        'n': len(samples),
+        'mean_ms': round(statistics.fmean(samples) * 1000, 3),
+        'p50_ms': round(_percentile(samples, 0.50) * 1000, 3),
+        'p95_ms': round(_percentile(samples, 0.95) * 1000, 3),
+        'p99_ms': round(_percentile(samples, 0.99) * 1000, 3),
+        'queries': statistics.median_low(queries),
+        'queries_max': max(queries),
+    }
+
+
+# --- Siembra -----------------------------------------------------------------
+
+def _entity_values(i, now):
+    word = WORDS[i % len(WORDS)]
+    other = WORDS[(i // len(WORDS)) % len(WORDS)]
+    return {
+        'company_name': f'{word} {other} {i} {KINDS[i % len(KINDS)]}',
+        'name': f'{FIRST_NAMES[i % len(FIRST_NAMES)]} {other}',
+        'email': f'contacto{i}@{word.lower()}.com.ar' if i % 3 else None,
+        'phone': f'+54 11 {4000 + i % 6000:04d}-{i % 10000:04d}' if i % 2 else None,
+        'address': f'Calle {word} {i % 5000}' if i % 4 else None,
+        'tax_id': f'30-{i:08d}-{i % 10}' if i % 5 else None,
+        'is_active': i % 10 != 0,
+        'updated_at': now - timedelta(minutes=i % 100000),
+    }
+
+
+def _audit_values(i, content_types, now):
+    content_type, pks = content_types[i % len(content_types)]
+    pk = pks[0] + i % max(pks[1] - pks[0] + 1, 1)
+    action = ('create', 'update', 'update', 'update', 'delete')[i % 5]
+    return {
+        'timestamp': now - timedelta(seconds=(i * 37) % (365 * 86400)),
+        'actor_id': None,
+        'action': action,
+        'content_type_id': content_type.pk,
+        'object_pk': str(pk),
+        'object_repr': f'Objeto {pk}',
+        'changes': {'name': [f'Antes {i}', f'Después {i}']} if action == 'update' else None,
+        'ip_address': f'10.0.{i % 256}.{i * 7 % 256}',
+        'path': '/clients/add/' if action == 'create' else f'/clients/edit/{pk}/',
+        'user_agent': 'bench_crud/1.0',
+        'entry_hash': None,
+    }
+
+
+def _insert(model, values_iter, count, connection):
+    fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+    columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+    placeholders = ', '.join(['%s'] * len(fields))
+    sql = f'INSERT INTO {connection.ops.quote_name(model._meta.db_table)} ({columns}) VALUES ({placeholders})'
+    done = 0
+    while done < count:
+        size = min(SEED_BATCH_SIZE, count - done)
+        batch = []
+        for i in range(done, done + size):
+            values = values_iter(i)
+            batch.append([field.get_db_prep_save(values.get(field.attname), connection) for field in fields])
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.executemany(sql, batch)
+        done += size
+
+
+def seed(rows, models):
+    """Completa hasta `rows` filas de cada modelo de `models` y de `AuditLog`.
+
+    Sin pasar por el ORM ni por los signals; el índice FTS se regenera al
+    final y la auditoría apunta a las entidades sembradas.
+    """
+    now = timezone.now()
+    content_types = []
+    for model in models:
+        connection = connections[router.db_for_write(model)]
+        existing = model._default_manager.count()
+        if existing < rows:
+            offset = existing
+            _insert(model, lambda i, offset=offset: _entity_values(offset + i, now), rows - existing, connection)
+            search.rebuild_index(model)
+        pks = model._default_manager.order_by('pk').values_list('pk', flat=True)
+        content_types.append((ContentType.objects.get_for_model(model), (pks.first(), pks.last())))
+    connection = connections[router.db_for_write(AuditLog)]
+    existing = AuditLog.objects.count()
+    if existing < rows:
+        lookup_values = {AuditPath: set(), AuditUserAgent: set()}
+
+        def audit_values(i):
+            # path y user_agent van a las tablas de lookup, como los escribe core.audit
+            values = _audit_values(existing + i, content_types, now)
+            for model, name in ((AuditPath, 'path'), (AuditUserAgent, 'user_agent')):
+                value = values.pop(name)
+                lookup_values[model].add(value)
+                values[f'{name}_ref_id'] = lookups.value_id(value)
+            return values
+
+        _insert(AuditLog, audit_values, rows - existing, connection)
+        for model, values in lookup_values.items():
+            values = sorted(values)
+            for start in range(0, len(values), SEED_BATCH_SIZE):
+                with transaction.atomic(using=connection.alias):
+                    lookups.ensure(model, values[start:start + SEED_BATCH_SIZE], connection.alias)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+# --- Medición ----------------------------------------------------------------
+
+class _QueryCounter:
+    """`execute_wrapper` que cuenta consultas (no depende de `connection.queries`,
+    que guarda sólo las últimas 9000)."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class _Bench:
+    def __init__(self, iterations, seed_value=0):
+        self.iterations = iterations
+        self.random = random.Random(seed_value)
+        self.http = TestClient(raise_request_exception=True)
+        self.results = {}
+
+    def measure(self, name, operation, connection, expected_status=None):
+        samples, queries = [], []
+        for i in range(self.iterations):
+            counter = _QueryCounter()
+            with connection.execute_wrapper(counter):
+                start = time.perf_counter()
+                response = operation(i)
+                samples.append(time.perf_counter() - start)
+            queries.append(counter.count)
+            if expected_status is not None and response.status_code != expected_status:
+                raise CommandError(f"{name}: respuesta {response.status_code}, se esperaba {expected_status}.")
+        self.results[name] = summarize(samples, queries)
+
+    def entity(self, model):
+        target = model._meta.app_label
+        kwarg = f'{model._meta.model_name}_id'
+        connection = connections[router.db_for_read(model)]
+        manager = model._default_manager
+        bounds = manager.order_by('pk').values_list('pk', flat=True)
+        first, last = bounds.first(), bounds.last()
+        sample = self.random.sample(range(first, last + 1), min(self.iterations * 4, last - first + 1))
+        pks = list(manager.filter(pk__in=sample).values_list('pk', flat=True))
+        middle = manager.order_by(*ENTITY_LIST_ORDERING).values_list(*ENTITY_LIST_ORDERING)[manager.count() // 2]
+        list_url = reverse(f'{target}:list')
+
+        def data(i, prefix):
+            return {'company_name': f'{prefix} {i} SA', 'name': f'Bench {i}', 'tax_id': f'20-{i:08d}-1',
+                    'email': f'bench{i}@example.com', 'is_active': 'on'}
+
+        self.measure(f'{target}.list', lambda i: self.http.get(list_url), connection, 200)
+        deep = f'{list_url}?cursor={encode_cursor(list(middle))}'
+        self.measure(f'{target}.list_deep', lambda i: self.http.get(deep), connection, 200)
+        self.measure(f'{target}.detail', lambda i: self.http.get(
+            reverse(f'{target}:detail', kwargs={kwarg: self.random.choice(pks)})), connection, 200)
+        start = manager.order_by('-pk').values_list('pk', flat=True).first()
+        self.measure(f'{target}.create', lambda i: self.http.post(
+            reverse(f'{target}:add'), data(i, 'Alta')), connection, 302)
+        created = list(manager.filter(pk__gt=start).order_by('pk').values_list('pk', flat=True))
+        self.measure(f'{target}.update', lambda i: self.http.post(
+            reverse(f'{target}:edit', kwargs={kwarg: self.random.choice(pks)}), data(i, 'Cambio')), connection, 302)
+        self.measure(f'{target}.delete', lambda i: self.http.post(
+            reverse(f'{target}:delete', kwargs={kwarg: created[i]})), connection, 302)
+
+    def handlers(self, model):
+        target = model._meta.app_label
+        connection = connections[router.db_for_write(model)]
+        objects = list(model._default_manager.order_by('?')[:self.iterations])
+
+        def in_rollback(handler):
+            def operation(i):
+                # Sólo se mide el handler; la transacción se revierte y sus
+                # callbacks de commit (auditoría, dedup) se descartan.
+                with transaction.atomic(using=connection.alias):
+                    start = time.perf_counter()
+                    handler(objects[i % len(objects)])
+                    elapsed = time.perf_counter() - start
+                    transaction.set_rollback(True, using=connection.alias)
+                return elapsed
+            return operation
+
+        def post_save(obj):
+            obj._audit_changes = {'name': [obj.name, f'{obj.name} *']}
+            signals.model_post_save(sender=model, instance=obj, created=False)
+
+        def pre_delete(obj):
+            signals.model_pre_delete(sender=model, instance=obj)
+
+        for name, handler in (('post_save', post_save), ('pre_delete', pre_delete)):
+            self.measure_timed(f'{target}.signal_{name}', in_rollback(handler), connection)
+
+    def measure_timed(self, name, operation, connection):
+        # Como measure(), pero el tiempo lo devuelve la operación.
+        samples, queries = [], []
+        for i in range(self.iterations):
+            counter = _QueryCounter()
+            with connection.execute_wrapper(counter):
+                samples.append(operation(i))
+            queries.append(counter.count)
+        self.results[name] = summarize(samples, queries)
+
+    def audit_write(self):
+        connection = connections[router.db_for_write(AuditLog)]
+
+        def operation(i):
+            entry = AuditLog(action='update', object_pk=str(i), object_repr=f'Bench {i}', path='/bench/')
+            audit.write([entry])
+        self.measure('audit.write', operation, connection)
+
+
+def run(rows, models, iterations, seed_value=0):
+    """Siembra (si falta) y mide; devuelve el informe como dict."""
+    seed(rows, models)
+    bench = _Bench(iterations, seed_value)
+    dummy = {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+    with override_settings(
+        CACHES={alias: dummy for alias in settings.CACHES},
+        ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+    ):
+        for model in models:
+            bench.entity(model)
+            bench.handlers(model)
+        bench.audit_write()
+    return {
+        'rows': rows,
+        'iterations': iterations,
+        'environment': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'audit_sink_mode': getattr(settings, 'AUDIT_SINK_MODE', 'sync'),
+        },
+        'results': bench.results,
+    }
+
+
+def compare(baseline, current, tolerance=0.5, min_delta_ms=1.0):
+    """Regresiones de `current` frente a `baseline` (dos informes de `run`)."""
+    regressions = []
+    for name, base in baseline['results'].items():
+        now = current['results'].get(name)
+        if now is None:
+            continue
+        delta = now['p95_ms'] - base['p95_ms']
+        if delta > base['p95_ms'] * tolerance and delta > min_delta_ms:
+            regressions.append(f"{name}: p95 {base['p95_ms']:.2f} -> {now['p95_ms']:.2f} ms")
+        if now['queries'] > base['queries']:
+            regressions.append(f"{name}: consultas {base['queries']} -> {now['queries']}")
+    return regressions
+
+
+class Command(BaseCommand):
+    help = (
+        "Siembra clientes, proveedores y auditoría a escala en una base aparte y "
+        "mide p50/p95/p99 y consultas de las operaciones CRUD y de los signals."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000,
+                            help="Filas de cada tabla (p. ej. 10000, 100000, 1000000).")
+        parser.add_argument('--iterations', type=int, default=100, help="Repeticiones por operación.")
+        parser.add_argument('--db', help="Archivo de la base de benchmark (por defecto en el directorio temporal).")
+        parser.add_argument('--keep', action='store_true', help="Conservar la base sembrada para otra corrida.")
+        parser.add_argument('--output', help="Guardar el informe JSON en este archivo.")
+        parser.add_argument('--compare', metavar='BASELINE', help="Informe JSON contra el cual comparar.")
+        parser.add_argument('--tolerance', type=float, default=0.5,
+                            help="Empeoramiento relativo del p95 admitido (0.5 = 50%%).")
+        parser.add_argument('--min-delta-ms', type=float, default=1.0,
+                            help="Empeoramiento absoluto del p95 por debajo del cual no se marca.")
+
+    def handle(self, *args, **options):
+        from clients.models import Client
+        from suppliers.models import Supplier
+
+        baseline = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as handle:
+                baseline = json.load(handle)
+
+        connection = connections['default']
+        if connection.vendor == 'sqlite':
+            path = options['db'] or os.path.join(tempfile.gettempdir(), f"blc_erp_bench_{options['rows']}.sqlite3")
+            connection.settings_dict.setdefault('TEST', {})['NAME'] = path
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False, keepdb=options['keep'],
+        )
+        try:
+            started = time.perf_counter()
+            report = run(options['rows'], [Client, Supplier], options['iterations'])
+            report['elapsed_s'] = round(time.perf_counter() - started, 1)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keep'])
+
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as handle:
+                handle.write(output + '\n')
+        self.stdout.write(output)
+
+        if baseline is not None:
+            regressions = compare(baseline, report, options['tolerance'], options['min_delta_ms'])
+            if regressions:
+                for line in regressions:
+                    self.stderr.write(line)
+                raise CommandError(f"{len(regressions)} regresiones frente a {options['compare']}.")
+            self.stdout.write(self.style.SUCCESS(f"Sin regresiones frente a {options['compare']}."))
@@ -0,0 +1,144 @@
+"""Compara escrituras concurrentes en SQLite sin ajustes y con `SQLITE_OPTIONS`.
+
+Cada perfil corre sobre una base temporal nueva: `--writers` procesos hacen
+transacciones de lectura-y-escritura como las de la auditoría (leer la
+cabeza, insertar filas, actualizar la cabeza) mientras `--readers` procesos
+consultan la misma tabla sin parar. Se informan transacciones confirmadas
+por segundo, las que fallaron con "database is locked" y la latencia.
+No usa la base configurada.
+"""
+import multiprocessing
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+SCHEMA = (
+    'CREATE TABLE head (id INTEGER PRIMARY KEY, entry_hash TEXT, length INTEGER)',
+    'CREATE TABLE log (id INTEGER PRIMARY KEY AUTOINCREMENT, ts REAL, payload TEXT)',
+    'CREATE INDEX log_ts ON log (ts)',
+    "INSERT INTO head VALUES (1, '', 0)",
+)
+
+
+def _connect(path, options):
+    # Lo mismo que hace el backend de Django con OPTIONS: timeout del
+    # driver y las sentencias de init_command en cada conexión nueva.
+    connection = sqlite3.connect(path, timeout=options.get('timeout', 5.0), isolation_level=None)
+    for command in options.get('init_command', '').split(';'):
+        if command.strip():
+            connection.execute(command)
+    return connection
+
+
+def _writer(path, options, transactions, rows, results):
+    connection = _connect(path, options)
+    begin = f"BEGIN {options.get('transaction_mode') or 'DEFERRED'}"
+    payload = 'x' * 200
+    committed = locked = 0
+    latencies = []
+    for _ in range(transactions):
+        start = time.perf_counter()
+        try:
+            connection.execute(begin)
+            connection.execute('SELECT entry_hash FROM head WHERE id = 1').fetchone()
+            connection.executemany('INSERT INTO log (ts, payload) VALUES (?, ?)', [(time.time(), payload)] * rows)
+            connection.execute('UPDATE head SET length = length + ? WHERE id = 1', (rows,))
+            connection.execute('COMMIT')
+            committed += 1
+        except sqlite3.OperationalError as exc:
+            if 'locked' not in str(exc) and 'busy' not in str(exc):
+                raise
+            if connection.in_transaction:
+                connection.execute('ROLLBACK')
+            locked += 1
+        latencies.append(time.perf_counter() - start)
+    connection.close()
+    results.put(('writer', committed, locked, latencies))
+
+
+def _reader(path, options, stop, results):
+    connection = _connect(path, options)
+    reads = 0
+    while not stop.is_set():
+        connection.execute('SELECT count(*), max(ts) FROM log').fetchone()
+        reads += 1
+    connection.close()
+    results.put(('reader', reads, 0, []))
+
+
+def run_profile(options, writers, readers, transactions, rows):
+    """Corre la carga con `options` (formato de DATABASES OPTIONS) y devuelve las métricas."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'bench.sqlite3')
+        connection = _connect(path, options)
+        for statement in SCHEMA:
+            connection.execute(statement)
+        connection.close()
+
+        results = multiprocessing.Queue()
+        stop = multiprocessing.Event()
+        reader_procs = [
+            multiprocessing.Process(target=_reader, args=(path, options, stop, results)) for _ in range(readers)
+        ]
+        writer_procs = [
+            multiprocessing.Process(target=_writer, args=(path, options, transactions, rows, results))
+            for _ in range(writers)
+        ]
+        for process in reader_procs:
+            process.start()
+        start = time.perf_counter()
+        for process in writer_procs:
+            process.start()
+        collected = [results.get() for _ in writer_procs]
+        elapsed = time.perf_counter() - start
+        stop.set()
+        collected += [results.get() for _ in reader_procs]
+        for process in reader_procs + writer_procs:
+            process.join()
+
+    committed = sum(item[1] for item in collected if item[0] == 'writer')
+    latencies = sorted(value for item in collected for value in item[3])
+    return {
+        'committed': committed,
+        'locked': sum(item[2] for item in collected),
+        'reads': sum(item[1] for item in collected if item[0] == 'reader'),
+        'elapsed': elapsed,
+        'tps': committed / elapsed if elapsed else 0.0,
+        'p50_ms': statistics.median(latencies) * 1000 if latencies else 0.0,
+        'p95_ms': latencies[int(len(latencies) * 0.95) - 1] * 1000 if latencies else 0.0,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide el throughput de escrituras concurrentes en SQLite sin ajustes "
+        "y con el perfil de settings (SQLITE_OPTIONS)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--readers', type=int, default=2)
+        parser.add_argument('--transactions', type=int, default=200, help="Transacciones por escritor.")
+        parser.add_argument('--rows', type=int, default=10, help="Filas insertadas por transacción.")
+
+    def handle(self, *args, **options):
+        profiles = (('sin ajustes', {}), ('SQLITE_OPTIONS', settings.SQLITE_OPTIONS))
+        self.stdout.write(
+            f"{options['writers']} escritores x {options['transactions']} transacciones "
+            f"de {options['rows']} filas, {options['readers']} lectores"
+        )
+        for name, profile in profiles:
+            stats = run_profile(
+                profile, options['writers'], options['readers'], options['transactions'], options['rows'],
+            )
+            self.stdout.write(
+                f"{name:>15}: {stats['tps']:8.1f} tx/s  {stats['committed']:6d} ok  "
+                f"{stats['locked']:5d} locked  p50 {stats['p50_ms']:7.2f} ms  "
+                f"p95 {stats['p95_ms']:8.2f} ms  {stats['reads']} lecturas"
+            )
@@ -0,0 +1,261 @@
+"""Verifica con EXPLAIN QUERY PLAN que las vistas usan los índices.
+
+Recorre las vistas de listados, detalle, historial, edición, autocompletado, búsqueda,
+la API y el changelist de `AuditLog` en el admin con el cliente de prueba de Django, captura cada SELECT que se
+ejecuta y lo explica. Sobre las tablas de Entity y `core_auditlog` es una
+violación:
+
+- `SCAN <tabla>` sin índice (lectura completa de la tabla), y
+- `USE TEMP B-TREE` (ordenar en memoria porque ningún índice da el orden).
+
+La excepción es el recorrido en orden de pk que corta en LIMIT (la
+primera página de la API): se decide con el `Query` de Django que generó
+el SQL, no con el texto. La consulta tiene que tener LIMIT, ordenar sólo
+por el pk de la tabla recorrida y filtrar sólo por columnas que encabezan
+algún índice; con un filtro sobre una columna sin índice el recorrido
+puede leer la tabla entera antes de juntar LIMIT filas.
+
+Los datos de ejemplo se crean dentro de una transacción que se revierte al
+final, así que se puede correr contra la base real (y conviene: con
+`ANALYZE` hecho el planner decide con las estadísticas de producción).
+Las exportaciones no se revisan: leen la tabla entera a propósito.
+"""
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, router, transaction
+from django.db.models import Value
+from django.db.models.expressions import Col
+from django.db.models.lookups import Lookup
+from django.db.models.sql.compiler import SQLCompiler
+from django.db.models.sql.where import WhereNode
+from django.test import Client as TestClient
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from core import search
+from core.models import AuditLog
+from core.pagination import encode_cursor
+
+
+class _Rollback(Exception):
+    pass
+
+
+class _Capture:
+    """`execute_wrapper` que guarda (sql, params, query) de cada SELECT.
+
+    `query` es el `Query` del ORM que se estaba ejecutando (None si el SQL
+    no viene del ORM); lo anota `compilers()`.
+    """
+
+    def __init__(self):
+        self.queries = []
+        self.current = None
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many and sql.lstrip().upper().startswith('SELECT'):
+            self.queries.append((sql, params, self.current))
+        return execute(sql, params, many, context)
+
+    @contextmanager
+    def compilers(self):
+        original = SQLCompiler.execute_sql
+        capture = self
+
+        def execute_sql(compiler, *args, **kwargs):
+            previous, capture.current = capture.current, compiler.query
+            try:
+                return original(compiler, *args, **kwargs)
+            finally:
+                capture.current = previous
+
+        SQLCompiler.execute_sql = execute_sql
+        try:
+            yield
+        finally:
+            SQLCompiler.execute_sql = original
+
+
+def _expressions(node):
+    """`node` y todas sus subexpresiones (los hijos de un `WhereNode`, los
+    lados de un lookup...)."""
+    yield node
+    for source in node.get_source_expressions() if hasattr(node, 'get_source_expressions') else ():
+        if source is not None:
+            yield from _expressions(source)
+
+
+def ordered_pk_walk(query, table, indexed):
+    """Si un SCAN de `table` para `query` es el recorrido en orden de pk que
+    corta en LIMIT: `query` tiene LIMIT, ordena sólo por el pk de `table` y
+    sus filtros son lookups sobre columnas de `indexed` (las que encabezan
+    un índice de la tabla)."""
+    if query is None or query.high_mark is None or query.model is None:
+        return False
+    opts = query.get_meta()
+    if opts.db_table != table:
+        return False
+    ordering = query.order_by or (opts.ordering if query.default_ordering else ())
+    pk_names = {'pk', opts.pk.name, opts.pk.attname}
+    if not ordering or not all(isinstance(name, str) and name.lstrip('-') in pk_names for name in ordering):
+        return False
+    for node in _expressions(query.where):
+        if isinstance(node, Lookup):
+            if not isinstance(node.lhs, Col):
+                return False
+        elif isinstance(node, Col):
+            if node.target.model._meta.db_table == table and node.target.column not in indexed:
+                return False
+        elif not isinstance(node, (WhereNode, Value)):
+            return False
+    return True
+
+
+class Command(BaseCommand):
+    help = (
+        "Explica las consultas de cada vista (EXPLAIN QUERY PLAN) y falla si "
+        "alguna recorre una tabla de entidades o de auditoría sin índice."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true',
+                            help="Mostrar el plan de cada consulta, no sólo las violaciones.")
+
+    def _sample(self):
+        """Una entidad de cada modelo y un usuario para los filtros de la API."""
+        user = get_user_model().objects.create(username='check-query-plans', is_staff=True, is_superuser=True)
+        objects = {}
+        for model in search.indexed_models():
+            data = {'company_name': 'Plan SA', 'name': 'Plan', 'tax_id': '20-12345678-9'}
+            objects[model] = model.objects.create(**data)
+        return user, objects
+
+    def _urls(self, user, objects):
+        for model, obj in objects.items():
+            target = model._meta.app_label
+            kwarg = f'{model._meta.model_name}_id'
+            list_url = reverse(f'{target}:list')
+            yield list_url
+            yield f'{list_url}?active=1'
+            yield f'{list_url}?active=0'
+            yield f'{list_url}?cursor={encode_cursor([obj.company_name, obj.name, obj.pk])}'
+            yield f'{list_url}?active=1&cursor={encode_cursor([obj.company_name, obj.name, obj.pk])}'
+            yield reverse(f'{target}:detail', kwargs={kwarg: obj.pk})
+            history_url = reverse(f'{target}:history', kwargs={kwarg: obj.pk})
+            yield history_url
+            yield f'{history_url}?cursor={encode_cursor(["2000-01-01T00:00:00Z", 1])}'
+            yield reverse(f'{target}:edit', kwargs={kwarg: obj.pk})
+            yield reverse(f'{target}:edit_select')
+            yield f"{reverse(f'{target}:autocomplete')}?q=pla"
+
+            api_list = reverse(f'api:{target}')
+            yield api_list
+            yield f'{api_list}?active=1'
+            yield f'{api_list}?active=0'
+            yield f'{api_list}?cursor={encode_cursor([obj.pk])}'
+            yield f'{api_list}?tax_id=20123456789'
+            yield reverse(f'api:{model._meta.model_name}', kwargs={'pk': obj.pk})
+
+            audit_url = reverse('api:audit')
+            yield f'{audit_url}?content_type={model._meta.label_lower}&object_pk={obj.pk}'
+        yield f"{reverse('core:search')}?q=plan"
+        audit_url = reverse('api:audit')
+        yield audit_url
+        yield f'{audit_url}?action=update'
+        yield f'{audit_url}?actor={user.pk}'
+        yield f'{audit_url}?cursor={encode_cursor(["2000-01-01T00:00:00Z", 1])}'
+        admin_url = reverse('admin:core_auditlog_changelist')
+        yield admin_url
+        yield f'{admin_url}?action=update'
+        yield f'{admin_url}?actor={user.username}'
+        yield f'{admin_url}?desde=2000-01-01&hasta=2000-01-31'
+        yield f'{admin_url}?content_type=clients.client&action=update'
+        yield f'{admin_url}?p={encode_cursor(["2000-01-01T00:00:00Z", 1])}'
+
+    @staticmethod
+    def _violations(plan, tables, query=None, indexed=None):
+        """Pasos de `plan` que leen entera una de `tables` u ordenan en memoria.
+
+        `indexed` es, por tabla, el conjunto de columnas que encabezan un
+        índice (ver `ordered_pk_walk`)."""
+        if any('USE TEMP B-TREE' in detail for detail in plan):
+            return [detail for detail in plan if 'USE TEMP B-TREE' in detail]
+        indexed = indexed or {}
+        bad = []
+        for detail in plan:
+            words = detail.split()
+            if len(words) >= 2 and words[0] == 'SCAN' and words[1] in tables and 'INDEX' not in detail:
+                if not ordered_pk_walk(query, words[1], indexed.get(words[1], frozenset())):
+                    bad.append(detail)
+        return bad
+
+    def _explain(self, connection, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    @staticmethod
+    def _indexed_columns(connection, tables):
+        """Por tabla, las columnas que encabezan un índice (incluido el pk)."""
+        indexed = {}
+        with connection.cursor() as cursor:
+            for table in tables:
+                constraints = connection.introspection.get_constraints(cursor, table)
+                indexed[table] = frozenset(
+                    constraint['columns'][0] for constraint in constraints.values()
+                    if (constraint['index'] or constraint['primary_key'] or constraint['unique'])
+                    and constraint['columns'] and constraint['columns'][0]
+                )
+        return indexed
+
+    def handle(self, *args, **options):
+        using = router.db_for_read(AuditLog)
+        connection = connections[using]
+        if connection.vendor != 'sqlite':
+            raise CommandError("El chequeo usa EXPLAIN QUERY PLAN de SQLite.")
+        tables = {model._meta.db_table for model in search.indexed_models()} | {AuditLog._meta.db_table}
+
+        capture = _Capture()
+        results = []
+        # Sin caché (una página cacheada no consulta) y con el host del cliente de prueba.
+        dummy = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+        overrides = override_settings(
+            CACHES={alias: dummy['default'] for alias in settings.CACHES},
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+        )
+        try:
+            with overrides, transaction.atomic(using=using):
+                user, objects = self._sample()
+                client = TestClient(raise_request_exception=True)
+                client.force_login(user)
+                for url in self._urls(user, objects):
+                    capture.queries.clear()
+                    with connection.execute_wrapper(capture), capture.compilers():
+                        response = client.get(url)
+                    if response.status_code != 200:
+                        raise CommandError(f"{url}: respuesta {response.status_code}.")
+                    for sql, params, query in capture.queries:
+                        if not any(f'"{table}"' in sql for table in tables):
+                            continue
+                        results.append((url, sql, query, self._explain(connection, sql, params)))
+                raise _Rollback
+        except _Rollback:
+            pass
+
+        indexed = self._indexed_columns(connection, tables)
+        failures = 0
+        for url, sql, query, plan in results:
+            bad = self._violations(plan, tables, query, indexed)
+            failures += bool(bad)
+            if bad or options['verbose_plans']:
+                style = self.style.ERROR if bad else self.style.SUCCESS
+                self.stdout.write(style(url))
+                self.stdout.write(f'  {sql}')
+                for detail in plan:
+                    self.stdout.write(f"  {'!!' if detail in bad else '  '} {detail}")
+        if failures:
+            raise CommandError(f"{failures} de {len(results)} consultas sin índice.")
+        self.stdout.write(self.style.SUCCESS(f"{len(results)} consultas revisadas, todas usan índices."))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import dedup, search
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula las claves de bloqueo y los candidatos a duplicado de "
+        "clientes y proveedores (ver core.dedup)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'models', nargs='*',
+            help="Modelos a revisar como app_label.Model (por defecto todos los de Entity).",
+        )
+        parser.add_argument('--threshold', type=float, default=None,
+                            help=f"Puntaje mínimo de un candidato (por defecto DEDUP_THRESHOLD o {dedup.DEFAULT_THRESHOLD}).")
+        parser.add_argument('--batch-size', type=int, default=dedup.SCORE_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        models = search.indexed_models()
+        if options['models']:
+            wanted = {label.lower() for label in options['models']}
+            unknown = wanted - {m._meta.label_lower for m in models}
+            if unknown:
+                raise CommandError(f"Modelos desconocidos: {', '.join(sorted(unknown))}")
+            models = [m for m in models if m._meta.label_lower in wanted]
+
+        for model in models:
+            scored, candidates = dedup.rebuild(
+                model, threshold=options['threshold'], batch_size=options['batch_size'],
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f"{model._meta.label}: {scored} pares comparados, {candidates} candidatos."
+            ))
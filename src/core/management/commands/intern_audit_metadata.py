@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from core import lookups
+
+
+class Command(BaseCommand):
+    help = (
+        "Pasa path y user_agent de las entradas viejas de AuditLog a las tablas "
+        "de lookup (AuditPath, AuditUserAgent) por lotes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help="Filas por lote; cada lote es una transacción corta.")
+
+    def handle(self, *args, **options):
+        total = lookups.backfill(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"{total} entradas pasadas a las tablas de lookup."))
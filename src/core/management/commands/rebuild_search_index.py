@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import search
+
+
+class Command(BaseCommand):
+    help = "Regenera los índices FTS5 de búsqueda de clientes y proveedores."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'models', nargs='*',
+            help="Modelos a reindexar como app_label.Model (por defecto todos los de Entity).",
+        )
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        models = search.indexed_models()
+        if options['models']:
+            wanted = {label.lower() for label in options['models']}
+            unknown = wanted - {m._meta.label_lower for m in models}
+            if unknown:
+                raise CommandError(f"Modelos no indexables: {', '.join(sorted(unknown))}")
+            models = [m for m in models if m._meta.label_lower in wanted]
+
+        for model in models:
+            if not search.is_available(model):
+                self.stdout.write(self.style.WARNING(f"{model._meta.label}: la base no es SQLite, se omite."))
+                continue
+            total = search.rebuild_index(model, batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f"{model._meta.label}: {total} filas indexadas."))
@@ -0,0 +1,112 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core.chain import HASH_FIELDS, verify_segment
+from core.models import AuditChainCheckpoint, AuditLog
+
+
+class Command(BaseCommand):
+    help = (
+        "Verifica la cadena de hashes de AuditLog por tramos ordenados por pk, "
+        "en paralelo, retomando desde el último checkpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=10000)
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help="Procesos verificadores (1 = en el proceso actual).")
+        parser.add_argument('--full', action='store_true',
+                            help="Ignorar checkpoints y verificar toda la tabla.")
+        parser.add_argument('--no-checkpoint', action='store_true',
+                            help="No guardar un checkpoint nuevo al terminar.")
+
+    def _chunks(self, start_pk, chunk_size):
+        """Lee la tabla en tramos `pk > último` sin mantener un cursor abierto."""
+        columns = ('pk', 'entry_hash') + HASH_FIELDS
+        last_pk = start_pk
+        while True:
+            rows = list(
+                AuditLog.objects.with_metadata().filter(pk__gt=last_pk).order_by('pk')
+                .values_list(*columns)[:chunk_size]
+            )
+            if not rows:
+                return
+            last_pk = rows[-1][0]
+            yield rows
+
+    def handle(self, *args, **options):
+        checkpoints = AuditChainCheckpoint.objects.order_by('-last_pk')
+        if options['full']:
+            # Si hubo archivado, las primeras filas ya no están: se parte del
+            # checkpoint que dejó archive_auditlog antes de la primera fila.
+            first_pk = AuditLog.objects.order_by('pk').values_list('pk', flat=True).first()
+            checkpoint = checkpoints.filter(last_pk__lt=first_pk).first() if first_pk else None
+        else:
+            checkpoint = checkpoints.first()
+
+        if checkpoint:
+            start_pk, prev = checkpoint.last_pk, checkpoint.entry_hash
+            stored = AuditLog.objects.filter(pk=start_pk).values_list('entry_hash', flat=True).first()
+            if stored is not None and stored != checkpoint.entry_hash:
+                raise CommandError(
+                    f"La entrada #{start_pk} no coincide con el checkpoint {checkpoint.pk}: "
+                    "la cadena fue modificada antes del checkpoint (usar --full)."
+                )
+            self.stdout.write(f"Retomando desde el checkpoint #{start_pk}.")
+        else:
+            start_pk, prev = 0, None
+
+        workers = max(1, options['workers'])
+        results = self._verify(start_pk, prev, options['chunk_size'], workers)
+
+        bad, verified, last_pk, last_hash = [], 0, None, prev
+        for seg_bad, seg_last_pk, seg_last_hash, seg_verified in results:
+            bad.extend(seg_bad)
+            verified += seg_verified
+            if seg_last_pk is not None:
+                last_pk, last_hash = seg_last_pk, seg_last_hash
+
+        if bad:
+            shown = ', '.join(str(pk) for pk in bad[:20])
+            raise CommandError(f"{len(bad)} entradas no verifican: {shown}{'…' if len(bad) > 20 else ''}")
+
+        if last_pk is None:
+            self.stdout.write(self.style.SUCCESS("Sin entradas nuevas desde el último checkpoint."))
+            return
+
+        if not options['no_checkpoint'] and last_hash:
+            AuditChainCheckpoint.objects.create(last_pk=last_pk, entry_hash=last_hash, rows_verified=verified)
+        self.stdout.write(self.style.SUCCESS(f"{verified} entradas verificadas hasta #{last_pk}."))
+
+    def _verify(self, start_pk, prev, chunk_size, workers):
+        chunks = self._chunks(start_pk, chunk_size)
+        if workers == 1:
+            for rows in chunks:
+                result = verify_segment(prev, rows)
+                prev = result[2]
+                yield result
+            return
+
+        # Los procesos hijos no tocan la base: sólo reciben filas ya leídas.
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            for rows in chunks:
+                pending.append(pool.submit(verify_segment, prev, rows))
+                prev = _last_hash(rows, prev)
+                # acotar la memoria: no leer más de 2 tramos por proceso por adelantado
+                while len(pending) >= workers * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+
+def _last_hash(rows, default):
+    for row in reversed(rows):
+        if row[1] is not None:
+            return row[1]
+    return default
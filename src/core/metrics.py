@@ -0,0 +1,317 @@
+"""Métricas de la aplicación en formato de texto de Prometheus (`/metrics`).
+
+Cada proceso (worker de gunicorn o uvicorn) suma sus valores en su propio
+archivo `metrics-<pid>.db` de `METRICS_DIR`, mapeado en memoria con `mmap`:
+registrar un valor es un `dict.get` y un `struct.pack_into` bajo un lock,
+sin syscalls ni I/O (unos microsegundos por request). La vista `metrics`
+lee todos los archivos del directorio y suma por serie, así que el
+resultado es el mismo sin importar qué worker atienda el scrape y no hace
+falta ningún servicio externo.
+
+Formato del archivo: 8 bytes con los bytes usados y después entradas de
+`<longitud uint32><clave utf-8 rellenada a 8 bytes><valor float64>`. La
+clave es el JSON de `[nombre, etiquetas]`. Sólo el proceso dueño escribe;
+una entrada nueva se copia completa antes de avanzar el contador de usados,
+así que quien lee nunca ve una a medio escribir.
+
+Series:
+
+- `blc_http_requests_total{view,method,status}`
+- `blc_http_request_duration_seconds{view}` (histograma)
+- `blc_db_queries_total{view}`
+- `blc_audit_entries_total{action}`: entradas escritas en `AuditLog`.
+- `blc_login_failures_total`: la tasa sale de `rate()` en Prometheus.
+- `blc_login_throttled_total`: intentos rechazados por `core.throttle`.
+
+`view` es el nombre de URL (`clients:list`); lo que no resuelve queda como
+`<unresolved>` para no crear una serie por cada URL inexistente.
+
+Los contadores de workers que terminaron siguen sumando (un contador no
+baja). Al reiniciar el servicio hay que vaciar `METRICS_DIR` antes de
+levantar los workers (ver `docs/DEPLOYMENT.md`).
+"""
+import json
+import mmap
+import os
+import struct
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+
+HEADER = struct.Struct('<Q')
+LENGTH = struct.Struct('<I')
+VALUE = struct.Struct('<d')
+INITIAL_SIZE = 64 * 1024
+
+# segundos; cubre desde un fragmento cacheado hasta una exportación grande
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+UNRESOLVED = '<unresolved>'
+METHODS = frozenset(('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'))
+
+FAMILIES = {
+    'blc_http_requests_total': ('counter', 'Requests atendidas por nombre de URL, método y status.'),
+    'blc_http_request_duration_seconds': ('histogram', 'Duración de las requests por nombre de URL.'),
+    'blc_db_queries_total': ('counter', 'Consultas SQL ejecutadas por nombre de URL.'),
+    'blc_audit_entries_total': ('counter', 'Entradas de auditoría escritas por acción.'),
+    'blc_login_failures_total': ('counter', 'Intentos de login fallidos.'),
+    'blc_login_throttled_total': ('counter', 'Intentos de login rechazados por demora (429).'),
+}
+
+
+def _key(name, labels):
+    return json.dumps([name, labels], sort_keys=True, separators=(',', ':'))
+
+
+class MmapStore:
+    """Valores de un proceso en un archivo mapeado en memoria."""
+
+    def __init__(self, path):
+        self.path = path
+        self.pid = os.getpid()
+        self.directory = None
+        self._lock = threading.Lock()
+        self._positions = {}
+        self._file = open(path, 'a+b')
+        size = os.fstat(self._file.fileno()).st_size
+        if size < INITIAL_SIZE:
+            self._file.truncate(INITIAL_SIZE)
+            size = INITIAL_SIZE
+        self._map = mmap.mmap(self._file.fileno(), size)
+        self._used = HEADER.unpack_from(self._map, 0)[0] or HEADER.size
+        for key, position, _ in _entries(self._map, self._used):
+            self._positions[key] = position
+
+    def inc(self, key, amount=1.0):
+        self.inc_many(((key, amount),))
+
+    def inc_many(self, increments):
+        """Suma cada `(clave, cantidad)` tomando el lock una sola vez."""
+        with self._lock:
+            data, positions = self._map, self._positions
+            for key, amount in increments:
+                position = positions.get(key)
+                if position is None:
+                    position = self._add(key)
+                    data = self._map
+                VALUE.pack_into(data, position, VALUE.unpack_from(data, position)[0] + amount)
+
+    def _add(self, key):
+        encoded = key.encode('utf-8')
+        padded = LENGTH.size + len(encoded)
+        padded += -padded % 8
+        needed = self._used + padded + VALUE.size
+        if needed > len(self._map):
+            self._grow(needed)
+        LENGTH.pack_into(self._map, self._used, len(encoded))
+        self._map[self._used + LENGTH.size:self._used + LENGTH.size + len(encoded)] = encoded
+        position = self._used + padded
+        VALUE.pack_into(self._map, position, 0.0)
+        self._used = position + VALUE.size
+        HEADER.pack_into(self._map, 0, self._used)
+        self._positions[key] = position
+        return position
+
+    def _grow(self, needed):
+        size = len(self._map)
+        while size < needed:
+            size *= 2
+        self._map.close()
+        self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), size)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+def _entries(data, used):
+    position = HEADER.size
+    while position < used:
+        length = LENGTH.unpack_from(data, position)[0]
+        start = position + LENGTH.size
+        key = bytes(data[start:start + length]).decode('utf-8')
+        position = start + length
+        position += -position % 8
+        yield key, position, VALUE.unpack_from(data, position)[0]
+        position += VALUE.size
+
+
+def read_file(path):
+    """Valores de un archivo de métricas: `{clave: valor}`."""
+    with open(path, 'rb') as handle:
+        data = handle.read()
+    if len(data) < HEADER.size:
+        return {}
+    used = min(HEADER.unpack_from(data, 0)[0], len(data))
+    return {key: value for key, _, value in _entries(data, used)}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def enabled():
+    return getattr(settings, 'METRICS_ENABLED', True)
+
+
+def _directory():
+    return str(settings.METRICS_DIR)
+
+
+def get_store():
+    """El `MmapStore` de este proceso; se reabre tras un fork o si cambia
+    `METRICS_DIR`."""
+    global _store
+    store = _store
+    directory = settings.METRICS_DIR
+    if store is not None and store.pid == os.getpid() and store.directory == directory:
+        return store
+    with _store_lock:
+        if _store is None or _store.pid != os.getpid() or _store.directory != directory:
+            os.makedirs(directory, exist_ok=True)
+            _store = MmapStore(os.path.join(directory, f'metrics-{os.getpid()}.db'))
+            _store.directory = directory
+        return _store
+
+
+@lru_cache(maxsize=4096)
+def _request_keys(view, method, status, le):
+    return (
+        _key('blc_http_requests_total', {'view': view, 'method': method, 'status': str(status)}),
+        _key('blc_http_request_duration_seconds_bucket', {'view': view, 'le': _format(le)}),
+        _key('blc_http_request_duration_seconds_sum', {'view': view}),
+        _key('blc_http_request_duration_seconds_count', {'view': view}),
+        _key('blc_db_queries_total', {'view': view}),
+    )
+
+
+@lru_cache(maxsize=4096)
+def _cached_key(name, labels):
+    return _key(name, dict(labels))
+
+
+def inc(name, amount=1, **labels):
+    if enabled():
+        get_store().inc(_cached_key(name, tuple(labels.items())), amount)
+
+
+def observe_request(request, response, view_metrics):
+    """Registra una request ya medida por `core.instrumentation`."""
+    if not enabled():
+        return
+    store = get_store()
+    seconds = view_metrics.total_time
+    # cada bucket guarda sólo sus observaciones; se acumulan al leer
+    le = BUCKETS[bisect_left(BUCKETS, seconds)]
+    requests, bucket, total, count, queries = _request_keys(
+        view_metrics.view_name or UNRESOLVED,
+        request.method if request.method in METHODS else 'OTHER',
+        response.status_code,
+        le,
+    )
+    store.inc_many(((requests, 1), (bucket, 1), (total, seconds), (count, 1), (queries, view_metrics.queries)))
+
+
+def collect(directory=None):
+    """Suma por clave los archivos de todos los procesos."""
+    directory = directory or _directory()
+    totals = defaultdict(float)
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return totals
+    for name in names:
+        if name.startswith('metrics-') and name.endswith('.db'):
+            try:
+                values = read_file(os.path.join(directory, name))
+            except FileNotFoundError:
+                continue
+            for key, value in values.items():
+                totals[key] += value
+    return totals
+
+
+def _format(value):
+    return '+Inf' if value == float('inf') else repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _family(name):
+    for suffix in ('_bucket', '_sum', '_count'):
+        if name.endswith(suffix) and name[:-len(suffix)] in FAMILIES:
+            return name[:-len(suffix)]
+    return name
+
+
+def render(totals=None):
+    """Texto para Prometheus (formato de exposición 0.0.4)."""
+    totals = collect() if totals is None else totals
+    samples = defaultdict(list)
+    for key, value in totals.items():
+        name, labels = json.loads(key)
+        samples[_family(name)].append((name, labels, value))
+
+    lines = []
+    for family in sorted(samples):
+        kind, help_text = FAMILIES.get(family, ('untyped', ''))
+        lines.append(f'# HELP {family} {help_text}')
+        lines.append(f'# TYPE {family} {kind}')
+        if kind == 'histogram':
+            lines.extend(_histogram(family, samples[family]))
+            continue
+        for name, labels, value in sorted(samples[family], key=lambda s: (s[0], sorted(s[1].items()))):
+            lines.append(f'{name}{_labels(labels)} {_format(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def _histogram(family, samples):
+    series = defaultdict(lambda: {'buckets': {}, 'sum': 0.0, 'count': 0.0})
+    for name, labels, value in samples:
+        le = labels.pop('le', None)
+        entry = series[tuple(sorted(labels.items()))]
+        if name.endswith('_bucket'):
+            entry['buckets'][le] = value
+        elif name.endswith('_sum'):
+            entry['sum'] = value
+        else:
+            entry['count'] = value
+    lines = []
+    for labels, entry in sorted(series.items()):
+        cumulative = 0.0
+        for bound in BUCKETS:
+            le = _format(bound)
+            cumulative += entry['buckets'].get(le, 0.0)
+            lines.append(f'{family}_bucket{_labels(dict(labels, le=le))} {_format(cumulative)}')
+        lines.append(f'{family}_sum{_labels(dict(labels))} {_format(entry["sum"])}')
+        lines.append(f'{family}_count{_labels(dict(labels))} {_format(entry["count"])}')
+    return lines
+
+
+def clear(directory=None):
+    """Borra los archivos de métricas (al reiniciar el servicio)."""
+    global _store
+    directory = directory or _directory()
+    with _store_lock:
+        if _store is not None and os.path.dirname(_store.path) == str(directory):
+            _store.close()
+            _store = None
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return
+    for name in names:
+        if name.startswith('metrics-') and name.endswith('.db'):
+            os.remove(os.path.join(directory, name))
@@ -1,26 +1,63 @@
-import threading
+from contextvars import ContextVar
 
-_thread_locals = threading.local()
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from core import audit
+
+_current_context = ContextVar('current_request_context', default=None)
 
 
 class RequestMiddleware:
-    """Middleware que guarda la request actual en thread-local.
+    """Middleware que guarda la request actual en una ContextVar.
 
     Permite acceder a la request y al user desde código que no recibe
-    el objeto request (por ejemplo signals).
+    el objeto request (por ejemplo signals), junto con sus metadatos de
+    auditoría ya extraídos (`core.audit.RequestContext`). Además abre el
+    buffer de auditoría de la request (`core.audit.collect`), que se
+    escribe en un único INSERT al terminar.
+
+    Funciona en WSGI y en ASGI: una ContextVar, a diferencia de un
+    thread-local, la ven también las vistas sync que Django corre en un
+    hilo (`sync_to_async` copia el contexto) y no se mezcla entre requests
+    concurrentes del mismo event loop.
     """
 
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
-        _thread_locals.request = request
-        response = self.get_response(request)
-        return response
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _current_context.set(audit.RequestContext(request))
+        try:
+            with audit.collect():
+                return self.get_response(request)
+        finally:
+            # si queda, la próxima auditoría fuera de una request (shell,
+            # comandos, tests) se atribuye al último usuario
+            _current_context.reset(token)
+
+    async def __acall__(self, request):
+        token = _current_context.set(audit.RequestContext(request))
+        try:
+            async with audit.acollect():
+                return await self.get_response(request)
+        finally:
+            _current_context.reset(token)
+
+
+def get_audit_context():
+    return _current_context.get()
 
 
 def get_current_request():
-    return getattr(_thread_locals, 'request', None)
+    context = _current_context.get()
+    return context.request if context else None
 
 
 def get_current_user():
@@ -1,7 +1,56 @@
 from django.db import models
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
+from django.db.models import F, Q, Value
+from django.db.models.functions import Coalesce, Replace, Upper
+from django.utils import timezone
 
+from core import lookups
+
+
+# Orden estable de los listados (el id desempata) y columnas que renderiza
+# `components/list_card.html`; el resto (address, notes, ...) no se carga.
+ENTITY_LIST_ORDERING = ('company_name', 'name', 'id')
+ENTITY_LIST_FIELDS = ('id', 'company_name', 'name')
+
+# Separadores que se ignoran al comparar CUIT/CUIL ("20-12345678-9" ==
+# "20 12345678 9" == "20123456789").
+TAX_ID_SEPARATORS = ('-', ' ', '.', '/')
+
+
+def normalize_tax_id(value):
+    value = (value or '').upper()
+    for separator in TAX_ID_SEPARATORS:
+        value = value.replace(separator, '')
+    return value
+
+
+class _Literal(Value):
+    # Como literal y no como parámetro: SQLite sólo usa un índice sobre una
+    # expresión si la consulta la repite igual, y `?` no es igual a `'-'`.
+    # Sólo para las constantes de TAX_ID_SEPARATORS, nunca para datos.
+    def as_sql(self, compiler, connection):
+        return "'%s'" % self.value, []
+
+
+def normalized_tax_id_expression():
+    """`normalize_tax_id` en SQL. Tiene que ser idéntica a la del índice
+    `*_taxid_idx` para que SQLite lo use."""
+    expression = Upper('tax_id')
+    for separator in TAX_ID_SEPARATORS:
+        expression = Replace(expression, _Literal(separator), _Literal(''))
+    return expression
+
+
+class EntityQuerySet(models.QuerySet):
+    def active(self):
+        return self.filter(is_active=True)
+
+    def by_tax_id(self, value):
+        """Busca por CUIT/CUIL ignorando separadores, por el índice funcional."""
+        return self.alias(tax_id_normalized=normalized_tax_id_expression()).filter(
+            tax_id_normalized=normalize_tax_id(value)
+        )
 
 
 class Entity(models.Model):
@@ -12,9 +61,174 @@ class Entity(models.Model):
     address = models.TextField(verbose_name="Dirección", blank=True, null=True)  # Opcional
     tax_id = models.CharField(max_length=50, verbose_name="CUIT/CUIL", blank=True, null=True)  # Opcional
     is_active = models.BooleanField(default=True, verbose_name="Activo")  # Siempre definido (True o False)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, verbose_name="Actualizado")  # Filtro de exportaciones incrementales
+
+    objects = EntityQuerySet.as_manager()
 
     class Meta:
         abstract = True
+        indexes = [
+            # Listado completo e inactivos: orden de ENTITY_LIST_ORDERING sin sort.
+            models.Index(fields=list(ENTITY_LIST_ORDERING), name='%(app_label)s_%(class)s_list_idx'),
+            # ?active=1, el filtro más usado: índice parcial, sólo filas activas.
+            models.Index(
+                fields=list(ENTITY_LIST_ORDERING), condition=Q(is_active=True),
+                name='%(app_label)s_%(class)s_active_idx',
+            ),
+            models.Index(normalized_tax_id_expression(), name='%(app_label)s_%(class)s_taxid_idx'),
+            # API y exportaciones con ?active=: orden de pk entre activos o
+            # inactivos, sin recorrer los del otro grupo.
+            models.Index(fields=['id'], condition=Q(is_active=True), name='%(app_label)s_%(class)s_actpk_idx'),
+            models.Index(fields=['id'], condition=Q(is_active=False), name='%(app_label)s_%(class)s_inactpk_idx'),
+        ]
+
+    # --- Seguimiento de cambios -------------------------------------------
+    # Al cargar desde la base se guarda una copia de los valores leídos; al
+    # guardar se compara contra ella, sin re-SELECT. El diff queda en
+    # `_audit_changes` para que `core.signals` lo registre en AuditLog.
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        loaded = getattr(self, '_loaded_values', None)
+        if fields is None or loaded is None:
+            self._snapshot()
+            return
+        # Carga perezosa de un campo diferido: sólo se actualizan esos
+        # campos, para no absorber cambios aún no guardados en los demás.
+        for name in fields:
+            attname = self._meta.get_field(name).attname
+            loaded[attname] = getattr(self, attname)
+
+    def _snapshot(self):
+        deferred = self.get_deferred_fields()
+        self._loaded_values = {
+            f.attname: getattr(self, f.attname)
+            for f in self._meta.concrete_fields if f.attname not in deferred
+        }
+
+    def tracked_changes(self):
+        """Campos modificados desde la carga: `{campo: [antes, después]}`.
+
+        Devuelve None si la instancia no vino de la base. Un campo diferido
+        que se asignó sin haberse leído figura con valor anterior None.
+        `updated_at` no se compara: lo fija `auto_now` al guardar.
+        """
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return None
+        changes = {}
+        for field in self._meta.concrete_fields:
+            if field.primary_key or field.name == 'updated_at' or field.attname not in self.__dict__:
+                continue
+            old = loaded.get(field.attname)
+            new = getattr(self, field.attname)
+            if field.attname not in loaded or old != new:
+                changes[field.name] = [old, new]
+        return changes
+
+    def save(self, *args, **kwargs):
+        changes = None if self._state.adding else self.tracked_changes()
+        if changes is not None and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            if not changes:
+                # Nada cambió: ni UPDATE ni entrada de auditoría.
+                self._audit_changes = {}
+                return
+            kwargs['update_fields'] = [*changes, 'updated_at']
+        self._audit_changes = changes
+        super().save(*args, **kwargs)
+        self._snapshot()
+
+
+class AuditLookup(models.Model):
+    """Valor repetido de AuditLog guardado una sola vez (ver core.lookups).
+
+    El pk es un hash del valor, no un autoincremental.
+    """
+
+    id = models.BigIntegerField(primary_key=True, editable=False)
+    value = models.CharField(max_length=512, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def __str__(self):
+        return self.value
+
+
+class AuditPath(AuditLookup):
+    class Meta:
+        verbose_name = "Audit Path"
+
+
+class AuditUserAgent(AuditLookup):
+    class Meta:
+        verbose_name = "Audit User Agent"
+
+
+# nombre de la propiedad -> (FK a la tabla de lookup, columna vieja)
+AUDIT_METADATA_FIELDS = {
+    'path': ('path_ref', 'legacy_path'),
+    'user_agent': ('user_agent_ref', 'legacy_user_agent'),
+}
+
+
+def metadata_q(name, lookup, value):
+    """Condición sobre `path` / `user_agent` (`name`) expresada con la FK y
+    la columna vieja, para combinar en un `Q`. La igualdad y `in` comparan
+    el id (el hash del valor), sin JOIN."""
+    ref, legacy = AUDIT_METADATA_FIELDS[name]
+    if lookup == 'exact' and value is None:
+        lookup, value = 'isnull', True
+    if lookup == 'exact':
+        return Q(**{f'{ref}_id': lookups.value_id(value)}) | Q(**{f'{ref}__isnull': True, legacy: value})
+    if lookup == 'in':
+        values = [item for item in value if item is not None]
+        return (Q(**{f'{ref}_id__in': [lookups.value_id(item) for item in values]})
+                | Q(**{f'{ref}__isnull': True, f'{legacy}__in': values}))
+    if lookup == 'isnull':
+        both = Q(**{f'{ref}__isnull': True, f'{legacy}__isnull': True})
+        return both if value else ~both
+    return Q(**{f'{ref}__value__{lookup}': value}) | Q(**{f'{ref}__isnull': True, f'{legacy}__{lookup}': value})
+
+
+class AuditLogQuerySet(models.QuerySet):
+    """`path` y `user_agent` no son columnas (ver `core.lookups`): se filtra
+    con `by_path()` / `by_user_agent()` (o `metadata_q()` dentro de un `Q`) y
+    se leen en `values()` / `values_list()` con `with_metadata()`."""
+
+    def by_path(self, value, lookup='exact'):
+        """Entradas cuyo `path` cumple `lookup` (`exact`, `in`, `startswith`,
+        `icontains`, `isnull`...) con `value`."""
+        return self.filter(metadata_q('path', lookup, value))
+
+    def by_user_agent(self, value, lookup='exact'):
+        """Como `by_path()`, sobre `user_agent`."""
+        return self.filter(metadata_q('user_agent', lookup, value))
+
+    def with_metadata(self):
+        """Anota `path` y `user_agent` (de las tablas de lookup o de las
+        columnas viejas) para usarlos en `values()` / `values_list()`."""
+        if 'path' in self.query.annotations:
+            return self
+        return self.annotate(
+            path=Coalesce(F('path_ref__value'), F('legacy_path')),
+            user_agent=Coalesce(F('user_agent_ref__value'), F('legacy_user_agent')),
+        )
+
+
+class AuditLogManager(models.Manager.from_queryset(AuditLogQuerySet)):
+    """Trae las filas de lookup con un JOIN: leer `path` o `user_agent` de
+    una entrada no consulta aparte. Con `.only()` / `.defer()` sin esos
+    campos, quitarlo con `select_related(None)`."""
+
+    def get_queryset(self):
+        return super().get_queryset().select_related('path_ref', 'user_agent_ref')
 
 
 class AuditLog(models.Model):
@@ -26,25 +240,161 @@ class AuditLog(models.Model):
     - action: tipo ('create','update','delete','login','logout','login_failed',...)
     - content_type/object_pk/object_repr: referencia al objeto afectado
     - changes: JSON con cambios (opcional)
-    - ip_address/path/user_agent: metadatos de la request
+    - ip_address/path/user_agent: metadatos de la request (path y user_agent
+      en tablas de lookup, ver core.lookups)
+    - entry_hash: sha256 encadenado con la entrada anterior (ver core.chain)
     """
 
-    timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
-    actor = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
+    # default en lugar de auto_now_add: el timestamp forma parte del hash y
+    # tiene que estar fijado antes del bulk_create.
+    timestamp = models.DateTimeField(default=timezone.now, editable=False, db_index=True)
+    # Sin índice propio en las FK: los cubren los compuestos de Meta.indexes
+    # (columna líder), y cada índice de menos es un write menos por entrada.
+    actor = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, db_index=False)
     action = models.CharField(max_length=32)
-    content_type = models.ForeignKey(ContentType, null=True, blank=True, on_delete=models.SET_NULL)
+    content_type = models.ForeignKey(ContentType, null=True, blank=True, on_delete=models.SET_NULL, db_index=False)
     object_pk = models.CharField(max_length=255, null=True, blank=True)
     object_repr = models.CharField(max_length=255, null=True, blank=True)
     changes = models.JSONField(null=True, blank=True)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
-    path = models.CharField(max_length=512, null=True, blank=True)
-    user_agent = models.CharField(max_length=512, null=True, blank=True)
+    # path y user_agent se guardan una vez en tablas de lookup y acá sólo el
+    # id (core.lookups); se leen y asignan con las propiedades de abajo.
+    path_ref = models.ForeignKey(AuditPath, null=True, blank=True, on_delete=models.PROTECT, db_index=False, related_name='+')
+    user_agent_ref = models.ForeignKey(AuditUserAgent, null=True, blank=True, on_delete=models.PROTECT, db_index=False, related_name='+')
+    # Texto de las entradas anteriores a las tablas de lookup, en las mismas
+    # columnas de antes; `intern_audit_metadata` lo pasa a *_ref.
+    legacy_path = models.CharField(max_length=512, null=True, blank=True, db_column='path')
+    legacy_user_agent = models.CharField(max_length=512, null=True, blank=True, db_column='user_agent')
     entry_hash = models.CharField(max_length=128, null=True, blank=True, editable=False)
 
+    objects = AuditLogManager()
+
     class Meta:
         ordering = ["-timestamp"]
+        indexes = [
+            # Historial de un objeto, de un usuario y filtros del admin, más recientes primero.
+            models.Index(fields=['content_type', 'object_pk', 'timestamp'], name='auditlog_object_ts_idx'),
+            models.Index(fields=['actor', 'timestamp'], name='auditlog_actor_ts_idx'),
+            models.Index(fields=['action', 'timestamp'], name='auditlog_action_ts_idx'),
+        ]
         verbose_name = "Audit Log"
         verbose_name_plural = "Audit Logs"
 
     def __str__(self):
-        return f"[{self.timestamp.isoformat()}] {self.action} {self.content_type} {self.object_pk}"
\ No newline at end of file
+        return f"[{self.timestamp.isoformat()}] {self.action} {self.content_type} {self.object_pk}"
+
+    @property
+    def path(self):
+        if self.path_ref_id is None:
+            return self.legacy_path
+        if AuditLog.path_ref.is_cached(self):
+            return self.path_ref.value
+        return lookups.lookup(AuditPath, self.path_ref_id)
+
+    @path.setter
+    def path(self, value):
+        self.path_ref_id = lookups.intern(AuditPath, value)
+        self.legacy_path = None
+
+    @property
+    def user_agent(self):
+        if self.user_agent_ref_id is None:
+            return self.legacy_user_agent
+        if AuditLog.user_agent_ref.is_cached(self):
+            return self.user_agent_ref.value
+        return lookups.lookup(AuditUserAgent, self.user_agent_ref_id)
+
+    @user_agent.setter
+    def user_agent(self, value):
+        self.user_agent_ref_id = lookups.intern(AuditUserAgent, value)
+        self.legacy_user_agent = None
+
+
+class AuditChainHead(models.Model):
+    """Cabeza de la cadena de hashes de AuditLog (una única fila, pk=1).
+
+    Permite encadenar entradas nuevas sin releer la tabla de auditoría y
+    sirve de punto de serialización entre escritores concurrentes.
+    """
+
+    entry_hash = models.CharField(max_length=128, blank=True, default='')
+    length = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Audit Chain Head"
+
+
+class AuditChainCheckpoint(models.Model):
+    """Punto hasta el que la cadena fue verificada por `verify_audit_chain`."""
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_pk = models.BigIntegerField()
+    entry_hash = models.CharField(max_length=128)
+    rows_verified = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        ordering = ["-last_pk"]
+        get_latest_by = "last_pk"
+        verbose_name = "Audit Chain Checkpoint"
+        verbose_name_plural = "Audit Chain Checkpoints"
+
+    def __str__(self):
+        return f"#{self.last_pk} {self.entry_hash[:12]}"
+
+
+class EntityBlockKey(models.Model):
+    """Clave de bloqueo de una entidad para la deduplicación (ver core.dedup).
+
+    Sólo se comparan entidades que comparten alguna clave: CUIT, email o
+    teléfono normalizados, o un bucket de trigramas de la razón social.
+    """
+
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, db_index=False)
+    object_pk = models.PositiveBigIntegerField()
+    key = models.CharField(max_length=300)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['content_type', 'key', 'object_pk'], name='dedup_blockkey_key_idx'),
+            models.Index(fields=['content_type', 'object_pk'], name='dedup_blockkey_object_idx'),
+        ]
+        verbose_name = "Dedup Block Key"
+
+    def __str__(self):
+        return f"{self.content_type_id}:{self.object_pk} {self.key}"
+
+
+class DuplicateCandidate(models.Model):
+    """Par de entidades del mismo modelo que probablemente son la misma.
+
+    `left_pk < right_pk`; `core.dedup` mantiene la tabla al día y `status`
+    sobrevive a los recálculos (un par descartado no vuelve a aparecer).
+    """
+
+    PENDING = 'pending'
+    DISMISSED = 'dismissed'
+    STATUS_CHOICES = [(PENDING, "Pendiente"), (DISMISSED, "Descartado")]
+
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, db_index=False)
+    left_pk = models.PositiveBigIntegerField()
+    right_pk = models.PositiveBigIntegerField()
+    score = models.FloatField()
+    reasons = models.JSONField(default=dict)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=PENDING)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-score"]
+        constraints = [
+            models.UniqueConstraint(fields=['content_type', 'left_pk', 'right_pk'], name='dedup_candidate_pair_uniq'),
+            models.CheckConstraint(condition=Q(left_pk__lt=F('right_pk')), name='dedup_candidate_ordered'),
+        ]
+        indexes = [
+            models.Index(fields=['content_type', 'status', 'score'], name='dedup_candidate_status_idx'),
+            models.Index(fields=['content_type', 'right_pk'], name='dedup_candidate_right_idx'),
+        ]
+        verbose_name = "Duplicate Candidate"
+        verbose_name_plural = "Duplicate Candidates"
+
+    def __str__(self):
+        return f"{self.content_type} {self.left_pk} ~ {self.right_pk} ({self.score:.2f})"
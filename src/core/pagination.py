@@ -0,0 +1,191 @@
+import base64
+import binascii
+import datetime
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q
+from django.http import Http404
+
+from core.models import ENTITY_LIST_ORDERING
+
+
+DEFAULT_PAGE_SIZE = 50
+COUNT_LIMIT = 10000
+
+
+class InvalidCursor(ValueError):
+    """El cursor recibido no se puede decodificar o no coincide con el orden."""
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """`DjangoJSONEncoder` sin redondear fechas y horas a milisegundos: el
+    cursor se compara contra la columna y debe tener su valor exacto."""
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(values):
+    """Codifica los valores de la clave de orden en un token opaco y URL-safe."""
+    raw = json.dumps(list(values), cls=CursorEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    padded = cursor + '=' * (-len(cursor) % 4)
+    try:
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (binascii.Error, UnicodeError, ValueError):
+        raise InvalidCursor(cursor)
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor(cursor)
+    return values
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """Paginación por cursor (keyset) sobre una clave de orden única.
+
+    En lugar de OFFSET, cada página filtra "después de la última fila vista",
+    por lo que la página N cuesta lo mismo que la primera siempre que exista
+    un índice sobre `ordering`. El último campo de `ordering` debe ser único
+    (normalmente `id`) para que el orden sea total y el cursor estable.
+    Los campos con prefijo `-` se recorren en orden descendente.
+    """
+
+    def __init__(self, queryset, ordering, per_page=DEFAULT_PAGE_SIZE):
+        self.queryset = queryset.order_by(*ordering)
+        self.keys = [(name.lstrip('-'), name.startswith('-')) for name in ordering]
+        self.per_page = per_page
+
+    def _after(self, values):
+        # (a, b, c) > (x, y, z)  ==>  a > x OR (a = x AND b > y) OR (...)
+        # El primer término redundante (a >= x) le da al planner un rango
+        # sobre la columna líder del índice.
+        first, first_desc = self.keys[0]
+        condition = Q(**{f"{first}__{'lte' if first_desc else 'gte'}": values[0]})
+        expanded = Q()
+        for i, (name, desc) in enumerate(self.keys):
+            term = Q(**{f"{name}__{'lt' if desc else 'gt'}": values[i]})
+            for j, (prev_name, _) in enumerate(self.keys[:i]):
+                term &= Q(**{prev_name: values[j]})
+            expanded |= term
+        return condition & expanded
+
+    @staticmethod
+    def _value(row, name):
+        return row[name] if isinstance(row, dict) else getattr(row, name)
+
+    def _slice(self, cursor):
+        queryset = self.queryset
+        if cursor:
+            queryset = queryset.filter(self._after(decode_cursor(cursor, len(self.keys))))
+        return queryset[:self.per_page + 1]
+
+    def page(self, cursor=None):
+        return self._build(list(self._slice(cursor)))
+
+    async def apage(self, cursor=None):
+        return self._build([row async for row in self._slice(cursor)])
+
+    def _build(self, rows):
+        next_cursor = None
+        if len(rows) > self.per_page:
+            rows = rows[:self.per_page]
+            next_cursor = encode_cursor(self._value(rows[-1], name) for name, _ in self.keys)
+        return KeysetPage(rows, next_cursor)
+
+
+def estimated_row_count(model, using):
+    """Filas de la tabla de `model` según las estadísticas del planner, sin
+    recorrerla: `sqlite_stat1` (lo llena `ANALYZE`) o `pg_class.reltuples`.
+    None si no hay estadísticas."""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+            if cursor.fetchone() is None:
+                return None
+            # la primera cifra de `stat` es la cantidad de filas del índice
+            cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s", [table])
+            counts = [int(row[0].split()[0]) for row in cursor.fetchall() if row[0]]
+            return max(counts) if counts else None
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)", [table])
+            row = cursor.fetchone()
+            return row[0] if row and row[0] >= 0 else None
+    return None
+
+
+def approximate_count(queryset, limit=COUNT_LIMIT):
+    """Cantidad de filas de `queryset` sin un `COUNT(*)` completo.
+
+    Devuelve `(cantidad, tipo)`:
+
+    - `'estimate'`: sin filtros y con la tabla más grande que `limit`, la
+      estimación de `estimated_row_count`.
+    - `'exact'`: se contó hasta `limit + 1` (`COUNT` sobre un subquery con
+      LIMIT, que cuesta lo mismo con cualquier tamaño de tabla) y no se
+      llegó al tope.
+    - `'more'`: hay más de `limit` (la cantidad devuelta es `limit`).
+    """
+    if not queryset.query.has_filters():
+        estimate = estimated_row_count(queryset.model, queryset.db)
+        if estimate is not None and estimate > limit:
+            return estimate, 'estimate'
+    count = queryset.order_by()[:limit + 1].count()
+    if count > limit:
+        return limit, 'more'
+    return count, 'exact'
+
+
+def parse_active_filter(value):
+    """Traduce `?active=` a True/False, o None si no se filtra."""
+    if value in ('1', 'true', 'yes'):
+        return True
+    if value in ('0', 'false', 'no'):
+        return False
+    return None
+
+
+def _entity_paginator(request, queryset, per_page):
+    active = parse_active_filter(request.GET.get('active'))
+    if active is not None:
+        queryset = queryset.filter(is_active=active)
+    return KeysetPaginator(queryset, ENTITY_LIST_ORDERING, per_page)
+
+
+def paginate_entities(request, queryset, per_page=DEFAULT_PAGE_SIZE):
+    """Aplica `?active=` y devuelve la página de `?cursor=` de un listado de Entity."""
+    try:
+        return _entity_paginator(request, queryset, per_page).page(request.GET.get('cursor'))
+    except InvalidCursor:
+        raise Http404("Cursor de paginación inválido.")
+
+
+async def apaginate_entities(request, queryset, per_page=DEFAULT_PAGE_SIZE):
+    """`paginate_entities` con el ORM async (una sola consulta)."""
+    try:
+        return await _entity_paginator(request, queryset, per_page).apage(request.GET.get('cursor'))
+    except InvalidCursor:
+        raise Http404("Cursor de paginación inválido.")
@@ -0,0 +1,105 @@
+"""Registro de los modelos que se auditan.
+
+Cada app registra sus modelos en su `AppConfig.ready()`:
+
+    from core import registry
+    registry.register(self.get_model('Client'))
+
+`register` conecta los handlers de `core.signals` a `post_save` y
+`pre_delete` sólo para ese sender, así que guardar o borrar un modelo no
+registrado (sesiones, usuarios, tablas de búsqueda o de duplicados) no pasa
+por ningún handler de auditoría: Django descarta el envío con una consulta a
+su caché de receivers por sender.
+
+Lo que los handlers necesitan por modelo queda calculado al registrar
+(`AuditedModel`): la función de `object_repr`, los campos cuyos cambios se
+guardan y, para los modelos de `Entity`, los campos de búsqueda y de
+duplicados. El content type no se puede leer en `ready()` (la tabla puede
+no existir todavía): se busca en el primer evento y se guarda; `post_migrate`
+lo olvida porque `flush` y `migrate` pueden recrearlo con otro id.
+"""
+from django.contrib.contenttypes.models import ContentType
+from django.db.models.signals import post_migrate, post_save, pre_delete
+
+from core import dedup, search
+from core.models import AuditLog, Entity
+
+
+class AuditedModel:
+    """Metadatos de auditoría de un modelo registrado."""
+
+    __slots__ = ('model', 'object_repr', 'fields', 'is_entity', 'search_fields', 'dedup_fields', '_content_type_id')
+
+    def __init__(self, model, object_repr=str, fields=None):
+        self.model = model
+        self.object_repr = object_repr
+        self.fields = frozenset(fields) if fields is not None else None
+        self.is_entity = issubclass(model, Entity)
+        self.search_fields = frozenset(search.index_fields(model)) if self.is_entity else frozenset()
+        self.dedup_fields = frozenset(dedup.DEDUP_FIELDS) if self.is_entity else frozenset()
+        self._content_type_id = None
+
+    @property
+    def content_type_id(self):
+        if self._content_type_id is None:
+            self._content_type_id = ContentType.objects.get_for_model(self.model).pk
+        return self._content_type_id
+
+    def repr(self, instance):
+        return str(self.object_repr(instance))[:255]
+
+    def filter_changes(self, changes):
+        """`changes` restringido a `fields` (todos si no se indicaron)."""
+        if not changes or self.fields is None:
+            return changes or None
+        return {name: value for name, value in changes.items() if name in self.fields} or None
+
+
+_registry = {}
+
+
+def register(model, *, object_repr=str, fields=None):
+    """Audita las altas, modificaciones y bajas de `model`.
+
+    `object_repr` arma el texto guardado en `object_repr` (por defecto
+    `str`). Con `fields` sólo se guardan los cambios de esos campos; una
+    modificación sin cambios en ellos igual deja su entrada `update`.
+    """
+    from core import signals
+
+    if model is AuditLog or model._meta.abstract:
+        raise ValueError(f"{model.__name__} no se puede auditar.")
+    if fields is not None:
+        names = {field.name for field in model._meta.concrete_fields}
+        unknown = set(fields) - names
+        if unknown:
+            raise ValueError(f"{model.__name__} no tiene los campos {', '.join(sorted(unknown))}.")
+    _registry[model] = AuditedModel(model, object_repr, fields)
+    uid = f'audit:{model._meta.label_lower}'
+    post_save.connect(signals.model_post_save, sender=model, weak=False, dispatch_uid=uid)
+    pre_delete.connect(signals.model_pre_delete, sender=model, weak=False, dispatch_uid=uid)
+    return _registry[model]
+
+
+def unregister(model):
+    _registry.pop(model, None)
+    uid = f'audit:{model._meta.label_lower}'
+    post_save.disconnect(sender=model, dispatch_uid=uid)
+    pre_delete.disconnect(sender=model, dispatch_uid=uid)
+
+
+def get(model):
+    """El `AuditedModel` de `model`, o None si no se audita."""
+    return _registry.get(model)
+
+
+def audited_models():
+    return list(_registry)
+
+
+def _forget_content_types(**kwargs):
+    for options in _registry.values():
+        options._content_type_id = None
+
+
+post_migrate.connect(_forget_content_types, dispatch_uid='audit:content_types')
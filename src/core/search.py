@@ -0,0 +1,308 @@
+"""Búsqueda full-text de entidades (Client, Supplier, ...) con SQLite FTS5.
+
+Cada modelo concreto de `Entity` tiene una tabla virtual FTS5 "sombra"
+(`<db_table>_fts`) cuyo rowid es el pk de la entidad. Los signals de
+`core.signals` la mantienen sincronizada fila a fila y el comando
+`rebuild_search_index` la regenera completa. En motores que no son SQLite
+se cae a un `icontains` sobre las columnas principales.
+"""
+import re
+
+from django.apps import apps
+from django.db import connections, router, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from core.models import Entity
+
+
+SEARCH_FIELDS = ('company_name', 'name', 'email', 'phone', 'tax_id', 'address', 'notes')
+
+# Peso de cada columna en el ranking bm25 (mismo orden que SEARCH_FIELDS).
+FIELD_WEIGHTS = {
+    'company_name': 10.0,
+    'name': 8.0,
+    'tax_id': 8.0,
+    'email': 5.0,
+    'phone': 5.0,
+    'address': 1.0,
+    'notes': 1.0,
+}
+
+FALLBACK_FIELDS = ('company_name', 'name', 'tax_id', 'email')
+
+# Autocompletado: columnas en las que se busca y que se devuelven.
+SUGGEST_FIELDS = ('company_name', 'name', 'tax_id')
+SUGGEST_MIN_LENGTH = 2
+SUGGEST_CANDIDATES = 200
+# Columnas cuyo comienzo se busca primero en el autocompletado, en orden.
+SUGGEST_PREFIX_FIELDS = ('company_name', 'name')
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def indexed_models():
+    return [m for m in apps.get_models() if issubclass(m, Entity)]
+
+
+def index_fields(model):
+    names = {f.name for f in model._meta.concrete_fields}
+    return [f for f in SEARCH_FIELDS if f in names]
+
+
+def fts_table(model):
+    return f'{model._meta.db_table}_fts'
+
+
+def _connection(model, write=False):
+    alias = router.db_for_write(model) if write else router.db_for_read(model)
+    return connections[alias]
+
+
+def is_available(model):
+    return _connection(model).vendor == 'sqlite'
+
+
+def build_match(query, columns=None, initial=False):
+    """Convierte texto libre en una expresión MATCH con prefijos: `"ac"* "sa"*`.
+
+    Sólo se conservan caracteres de palabra, así que la expresión nunca
+    contiene sintaxis FTS5 proveniente del usuario. Con `columns` la
+    expresión se restringe a esas columnas: `{company_name name} : (...)`.
+    Con `initial` el primer término tiene que ser el comienzo de la columna
+    (`^"ac"* "sa"*`).
+    """
+    match = ' '.join(f'"{term}"*' for term in _TERM_RE.findall(query))
+    if match and initial:
+        match = f'^{match}'
+    if match and columns:
+        return f'{{{" ".join(columns)}}} : ({match})'
+    return match
+
+
+def create_index(model, using=None):
+    connection = connections[using] if using else _connection(model, write=True)
+    if connection.vendor != 'sqlite':
+        return
+    table = fts_table(model)
+    fields = index_fields(model)
+    weights = ', '.join(str(FIELD_WEIGHTS[f]) for f in fields)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS "{table}" USING fts5('
+            f'{", ".join(fields)}, prefix=\'2 3\', tokenize=\'unicode61 remove_diacritics 2\')'
+        )
+        cursor.execute(f'INSERT INTO "{table}"("{table}", rank) VALUES (\'rank\', %s)', [f'bm25({weights})'])
+
+
+def create_indexes(using='default', **kwargs):
+    """Receptor de `post_migrate`: crea las tablas FTS que falten."""
+    for model in indexed_models():
+        create_index(model, using=using)
+
+
+def _row(instance, fields):
+    return [getattr(instance, f) for f in fields]
+
+
+def index_instance(instance, created=False):
+    """(Re)indexa `instance`.
+
+    El DELETE y el INSERT van en la transacción de quien guarda (o en una
+    propia, en autocommit): el índice no puede quedar a medias ni
+    desfasado de la fila si algo falla en el medio.
+    """
+    model = type(instance)
+    if not is_available(model):
+        return
+    table = fts_table(model)
+    fields = index_fields(model)
+    placeholders = ', '.join(['%s'] * (len(fields) + 1))
+    connection = _connection(model, write=True)
+    with transaction.atomic(using=connection.alias, savepoint=False), connection.cursor() as cursor:
+        if not created:
+            cursor.execute(f'DELETE FROM "{table}" WHERE rowid = %s', [instance.pk])
+        cursor.execute(
+            f'INSERT INTO "{table}"(rowid, {", ".join(fields)}) VALUES ({placeholders})',
+            [instance.pk] + _row(instance, fields),
+        )
+
+
+def index_instances(model, instances):
+    """Indexa en un único executemany instancias recién insertadas (p. ej. por
+    `bulk_create`, que no dispara `post_save`)."""
+    if not instances or not is_available(model):
+        return
+    table = fts_table(model)
+    fields = index_fields(model)
+    placeholders = ', '.join(['%s'] * (len(fields) + 1))
+    with _connection(model, write=True).cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO "{table}"(rowid, {", ".join(fields)}) VALUES ({placeholders})',
+            [[obj.pk] + _row(obj, fields) for obj in instances],
+        )
+
+
+def remove_instance(instance):
+    model = type(instance)
+    if not is_available(model):
+        return
+    connection = _connection(model, write=True)
+    with transaction.atomic(using=connection.alias, savepoint=False), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM "{fts_table(model)}" WHERE rowid = %s', [instance.pk])
+
+
+def rebuild_index(model, batch_size=2000):
+    """Regenera la tabla FTS de `model` leyendo la tabla en streaming.
+
+    Devuelve la cantidad de filas indexadas.
+    """
+    connection = _connection(model, write=True)
+    table = fts_table(model)
+    fields = index_fields(model)
+    placeholders = ', '.join(['%s'] * (len(fields) + 1))
+    insert = f'INSERT INTO "{table}"(rowid, {", ".join(fields)}) VALUES ({placeholders})'
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS "{table}"')
+    create_index(model, using=connection.alias)
+
+    total = 0
+    batch = []
+    rows = model._default_manager.using(connection.alias).order_by('pk').values_list('pk', *fields)
+    for row in rows.iterator(chunk_size=batch_size):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            total += _insert_batch(connection, insert, batch)
+            batch = []
+    if batch:
+        total += _insert_batch(connection, insert, batch)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'INSERT INTO "{table}"("{table}") VALUES (\'optimize\')')
+    return total
+
+
+def _insert_batch(connection, sql, batch):
+    with transaction.atomic(using=connection.alias):
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, batch)
+    return len(batch)
+
+
+def _fallback_q(query):
+    q = Q()
+    for term in _TERM_RE.findall(query):
+        term_q = Q()
+        for field in FALLBACK_FIELDS:
+            term_q |= Q(**{f'{field}__icontains': term})
+        q &= term_q
+    return q
+
+
+def filter_queryset(queryset, query):
+    """Restringe `queryset` a las filas que coinciden con `query`.
+
+    La coincidencia se resuelve con una subconsulta sobre la tabla FTS, sin
+    materializar los ids en Python.
+    """
+    model = queryset.model
+    if not is_available(model):
+        return queryset.filter(_fallback_q(query))
+    match = build_match(query)
+    if not match:
+        return queryset.none()
+    table = fts_table(model)
+    return queryset.filter(pk__in=RawSQL(f'SELECT rowid FROM "{table}" WHERE "{table}" MATCH %s', [match]))
+
+
+def search(model, query, limit=20, only=None):
+    """Devuelve hasta `limit` pares (objeto, score) ordenados por relevancia.
+
+    Con FTS5 el score es el `rank` bm25 (menor es mejor); en el fallback es 0.
+    """
+    queryset = model._default_manager.all()
+    if only:
+        queryset = queryset.only(*only)
+    if not is_available(model):
+        return [(obj, 0.0) for obj in queryset.filter(_fallback_q(query)).order_by('company_name', 'name', 'pk')[:limit]]
+    match = build_match(query)
+    if not match:
+        return []
+    table = fts_table(model)
+    with _connection(model).cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid, rank FROM "{table}" WHERE "{table}" MATCH %s ORDER BY rank LIMIT %s',
+            [match, limit],
+        )
+        ranked = cursor.fetchall()
+    objects = queryset.in_bulk([pk for pk, _ in ranked])
+    return [(objects[pk], score) for pk, score in ranked if pk in objects]
+
+
+def search_entities(query, limit=20, only=None):
+    """Busca en todos los modelos indexados y mezcla los resultados por score."""
+    results = []
+    for model in indexed_models():
+        results.extend(search(model, query, limit=limit, only=only))
+    results.sort(key=lambda pair: pair[1])
+    return results[:limit]
+
+
+def _suggest_key(query):
+    prefix = query.casefold()
+
+    def key(row):
+        company, name = (row['company_name'] or '').casefold(), (row['name'] or '').casefold()
+        starts = 0 if company.startswith(prefix) else 1 if name.startswith(prefix) else 2
+        return starts, company, row['id']
+    return key
+
+
+def suggest(model, query, limit=10):
+    """Autocompletado por prefijo: hasta `limit` dicts con id y SUGGEST_FIELDS.
+
+    No se ordena por `rank`: bm25 obliga a puntuar todas las coincidencias y
+    con un prefijo corto sobre una tabla grande eso son cientos de ms. En su
+    lugar, en una sola consulta a la tabla FTS (sin join), se leen hasta
+    SUGGEST_CANDIDATES filas de cada grupo, en orden: las que empiezan con
+    el texto en cada columna de SUGGEST_PREFIX_FIELDS (`^"ac"*`) y después
+    cualquier coincidencia en SUGGEST_FIELDS. FTS5 corta cada grupo en su
+    LIMIT, y las que empiezan con el texto no dependen de caer entre las
+    primeras coincidencias por rowid. Dentro de cada grupo se ordena por
+    razón social.
+    """
+    query = query.strip()
+    if len(query) < SUGGEST_MIN_LENGTH:
+        return []
+    columns = ('id',) + SUGGEST_FIELDS
+    if not is_available(model):
+        q = Q()
+        for field in SUGGEST_FIELDS:
+            q |= Q(**{f'{field}__istartswith': query})
+        rows = list(model._default_manager.filter(q).values(*columns)[:SUGGEST_CANDIDATES])
+        rows.sort(key=_suggest_key(query))
+        return rows[:limit]
+    general = build_match(query, columns=SUGGEST_FIELDS)
+    if not general:
+        return []
+    matches = [build_match(query, columns=(field,), initial=True) for field in SUGGEST_PREFIX_FIELDS] + [general]
+    table = fts_table(model)
+    select = (
+        f'SELECT * FROM (SELECT %s, rowid, {", ".join(SUGGEST_FIELDS)} FROM "{table}" '
+        f'WHERE "{table}" MATCH %s LIMIT %s)'
+    )
+    params = []
+    for group, match in enumerate(matches):
+        params += [group, match, SUGGEST_CANDIDATES]
+    with _connection(model).cursor() as cursor:
+        cursor.execute(' UNION ALL '.join([select] * len(matches)), params)
+        found = cursor.fetchall()
+    found.sort(key=lambda row: (row[0], (row[2] or '').casefold(), row[1]))
+    rows = {}
+    for row in found:
+        if row[1] not in rows:
+            rows[row[1]] = dict(zip(columns, row[1:]))
+            if len(rows) == limit:
+                break
+    return list(rows.values())
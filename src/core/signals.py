@@ -1,113 +1,93 @@
-from django.db.models.signals import post_save, pre_delete
+"""Handlers de auditoría.
+
+`model_post_save` y `model_pre_delete` no se conectan con `@receiver`: los
+conecta `core.registry.register` sólo para los modelos auditados.
+"""
+from django.contrib.auth import get_user_model
 from django.contrib.auth.signals import user_logged_in, user_logged_out, user_login_failed
 from django.dispatch import receiver
-from django.contrib.contenttypes.models import ContentType
-from django.conf import settings
-
-from core.middleware import get_current_request, get_current_user
-from core.models import AuditLog
-
 
-def extract_ip(request):
-    if not request:
-        return None
-    return request.META.get('HTTP_X_FORWARDED_FOR') or request.META.get('REMOTE_ADDR')
+from core import audit, cache, dedup, metrics, registry, search, throttle
+from core.middleware import get_audit_context
 
 
-def safe_user(user):
-    return user if user and getattr(user, 'is_authenticated', False) else None
+def _current_fields():
+    # Metadatos ya extraídos por RequestMiddleware; fuera de una request, vacíos.
+    context = get_audit_context()
+    if context is None:
+        return {'actor': None, 'ip_address': None, 'path': None, 'user_agent': None}
+    return context.fields()
 
 
-@receiver(post_save)
 def model_post_save(sender, instance, created, **kwargs):
-    # Evitar logging de nuestro modelo AuditLog
-    if sender.__name__ == 'AuditLog':
+    # Conectado sólo a los modelos de core.registry
+    options = registry.get(sender)
+    if options is None:
         return
 
-    app_label = getattr(sender._meta, 'app_label', '')
-    if app_label not in ('clients', 'suppliers'):
-        return
-
-    request = get_current_request()
-    user = get_current_user()
-    ct = ContentType.objects.get_for_model(sender)
+    changes = None if created else getattr(instance, '_audit_changes', None)
+    if options.is_entity:
+        if changes is None or not options.search_fields.isdisjoint(changes):
+            search.index_instance(instance, created=created)
+        if changes is None or not options.dedup_fields.isdisjoint(changes):
+            dedup.schedule(sender, [instance])
+        cache.bump(sender, [instance.pk])
 
-    AuditLog.objects.create(
-        actor=safe_user(user),
+    audit.record(
         action='create' if created else 'update',
-        content_type=ct,
+        content_type_id=options.content_type_id,
         object_pk=str(getattr(instance, 'pk', None)),
-        object_repr=str(instance)[:255],
-        changes=None,
-        ip_address=extract_ip(request),
-        path=(getattr(request, 'path', None) if request else None),
-        user_agent=(request.META.get('HTTP_USER_AGENT')[:512] if request and request.META.get('HTTP_USER_AGENT') else None),
+        object_repr=options.repr(instance),
+        changes=options.filter_changes(changes),
+        **_current_fields(),
     )
 
 
-@receiver(pre_delete)
 def model_pre_delete(sender, instance, **kwargs):
-    if sender.__name__ == 'AuditLog':
+    options = registry.get(sender)
+    if options is None:
         return
 
-    app_label = getattr(sender._meta, 'app_label', '')
-    if app_label not in ('clients', 'suppliers'):
-        return
-
-    request = get_current_request()
-    user = get_current_user()
-    ct = ContentType.objects.get_for_model(sender)
+    if options.is_entity:
+        search.remove_instance(instance)
+        dedup.schedule(sender, deleted=[instance.pk])
+        cache.bump(sender, [instance.pk])
 
-    AuditLog.objects.create(
-        actor=safe_user(user),
+    audit.record(
         action='delete',
-        content_type=ct,
+        content_type_id=options.content_type_id,
         object_pk=str(getattr(instance, 'pk', None)),
-        object_repr=str(instance)[:255],
+        object_repr=options.repr(instance),
         changes=None,
-        ip_address=extract_ip(request),
-        path=(getattr(request, 'path', None) if request else None),
-        user_agent=(request.META.get('HTTP_USER_AGENT')[:512] if request and request.META.get('HTTP_USER_AGENT') else None),
+        **_current_fields(),
     )
 
 
 @receiver(user_logged_in)
 def on_user_logged_in(sender, request, user, **kwargs):
-    AuditLog.objects.create(
-        actor=safe_user(user),
+    throttle.reset(throttle.client_ip(request), user.get_username())
+    audit.record(
         action='login',
         content_type=None,
         object_pk=None,
         object_repr=str(user)[:255],
-        ip_address=extract_ip(request),
-        path=getattr(request, 'path', None),
-        user_agent=(request.META.get('HTTP_USER_AGENT')[:512] if request and request.META.get('HTTP_USER_AGENT') else None),
+        **audit.request_fields(request, actor=user),
     )
 
 
 @receiver(user_logged_out)
 def on_user_logged_out(sender, request, user, **kwargs):
-    AuditLog.objects.create(
-        actor=safe_user(user),
+    audit.record(
         action='logout',
         content_type=None,
         object_pk=None,
         object_repr=str(user)[:255] if user else None,
-        ip_address=extract_ip(request),
-        path=getattr(request, 'path', None) if request else None,
-        user_agent=(request.META.get('HTTP_USER_AGENT')[:512] if request and request.META.get('HTTP_USER_AGENT') else None),
+        **audit.request_fields(request, actor=user),
     )
 
 
 @receiver(user_login_failed)
 def on_user_login_failed(sender, credentials, request, **kwargs):
-    AuditLog.objects.create(
-        actor=None,
-        action='login_failed',
-        content_type=None,
-        object_pk=None,
-        object_repr=str(credentials)[:255],
-        ip_address=extract_ip(request),
-        path=getattr(request, 'path', None) if request else None,
-        user_agent=(request.META.get('HTTP_USER_AGENT')[:512] if request and request.META.get('HTTP_USER_AGENT') else None),
-    )
+    # sin una entrada por intento: core.throttle resume los fallos por IP
+    metrics.inc('blc_login_failures_total')
+    throttle.login_failed(request, credentials.get(get_user_model().USERNAME_FIELD))
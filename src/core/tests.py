@@ -1,4 +1,4 @@
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
 from django.core.exceptions import ValidationError
 from .models import Entity
 
@@ -194,3 +194,1700 @@ class CoreViewsTests(TestCase):
         
         # El template home.html se renderiza correctamente
         self.assertEqual(response.status_code, 200)
+
+
+class KeysetPaginatorTests(TestCase):
+    """Tests para la paginación por cursor"""
+
+    def setUp(self):
+        from clients.models import Client
+
+        for company, name in [('B', 'x'), ('A', 'y'), ('A', 'x'), ('C', 'x'), ('B', 'x')]:
+            Client.objects.create(company_name=company, name=name)
+        self.queryset = Client.objects.all()
+
+    def _walk(self, ordering, per_page):
+        from .pagination import KeysetPaginator
+
+        paginator = KeysetPaginator(self.queryset, ordering, per_page)
+        seen, cursor = [], None
+        while True:
+            page = paginator.page(cursor)
+            seen.extend((c.company_name, c.name, c.id) for c in page)
+            if not page.has_next:
+                return seen
+            cursor = page.next_cursor
+
+    def test_pages_cover_every_row_once(self):
+        """Test que recorrer todas las páginas devuelve cada fila una vez y en orden"""
+        expected = sorted((c.company_name, c.name, c.id) for c in self.queryset)
+        self.assertEqual(self._walk(('company_name', 'name', 'id'), 2), expected)
+
+    def test_descending_ordering(self):
+        """Test orden descendente"""
+        expected = sorted(((c.company_name, c.name, c.id) for c in self.queryset), key=lambda r: r[2], reverse=True)
+        self.assertEqual(self._walk(('-id',), 2), expected)
+
+    def test_cursor_roundtrip(self):
+        """Test que el cursor es opaco y reversible"""
+        from .pagination import encode_cursor, decode_cursor
+
+        cursor = encode_cursor(['Razón', 'Nombre', 7])
+        self.assertNotIn('Raz', cursor)
+        self.assertEqual(decode_cursor(cursor, 3), ['Razón', 'Nombre', 7])
+
+    def test_invalid_cursor(self):
+        """Test cursor inválido o de otro orden"""
+        from .pagination import encode_cursor, decode_cursor, InvalidCursor
+
+        with self.assertRaises(InvalidCursor):
+            decode_cursor('%%%', 3)
+        with self.assertRaises(InvalidCursor):
+            decode_cursor(encode_cursor([1]), 3)
+
+    def test_same_millisecond_rows_across_pages(self):
+        """Test que las filas del mismo milisegundo no se saltean ni se repiten entre páginas"""
+        import datetime
+        from django.utils import timezone
+        from .models import AuditLog
+        from .pagination import KeysetPaginator
+
+        base = timezone.now().replace(microsecond=123000)
+        for micro in (100, 400, 700, 900):
+            AuditLog.objects.create(action='create', object_repr='x', timestamp=base + datetime.timedelta(microseconds=micro))
+        queryset = AuditLog.objects.filter(timestamp__gte=base)
+        for ordering in (('-timestamp', '-id'), ('timestamp', 'id')):
+            paginator = KeysetPaginator(queryset, ordering, 1)
+            seen, cursor = [], None
+            while len(seen) < 10:
+                page = paginator.page(cursor)
+                seen.extend(entry.pk for entry in page)
+                if not page.has_next:
+                    break
+                cursor = page.next_cursor
+            expected = list(queryset.order_by(*ordering).values_list('pk', flat=True))
+            self.assertEqual(len(expected), 4)
+            self.assertEqual(seen, expected)
+
+
+class EntitySearchTests(TestCase):
+    """Tests para la búsqueda full-text (FTS5)"""
+
+    def setUp(self):
+        from clients.models import Client
+        from suppliers.models import Supplier
+
+        self.client_obj = Client.objects.create(
+            company_name="Panadería Martínez", name="Juan", tax_id="20-11111111-1",
+            notes="Entrega los martes"
+        )
+        self.supplier_obj = Supplier.objects.create(
+            company_name="Harinas del Sur", name="Martina", email="ventas@harinas.com"
+        )
+
+    def test_build_match_quotes_terms(self):
+        """Test que la consulta del usuario no inyecta sintaxis FTS5"""
+        from .search import build_match
+
+        self.assertEqual(build_match('acme "OR" s.a*'), '"acme"* "OR"* "s"* "a"*')
+        self.assertEqual(build_match('  ** '), '')
+
+    def test_search_prefix_and_accents(self):
+        """Test búsqueda por prefijo e insensible a acentos"""
+        from clients.models import Client
+        from .search import search
+
+        results = search(Client, 'panaderia mart')
+        self.assertEqual([obj.pk for obj, _ in results], [self.client_obj.pk])
+
+    def test_search_across_models_ranked(self):
+        """Test búsqueda combinada ordenada por relevancia"""
+        from .search import search_entities
+
+        results = search_entities('mart')
+        self.assertEqual({type(obj).__name__ for obj, _ in results}, {'Client', 'Supplier'})
+
+    def test_index_follows_updates_and_deletes(self):
+        """Test sincronización incremental desde los signals"""
+        from clients.models import Client
+        from .search import search
+
+        self.client_obj.company_name = "Confitería Rivas"
+        self.client_obj.save()
+        self.assertEqual(search(Client, 'panaderia'), [])
+        self.assertEqual(len(search(Client, 'rivas')), 1)
+
+        self.client_obj.delete()
+        self.assertEqual(search(Client, 'rivas'), [])
+
+    def test_filter_queryset_uses_index(self):
+        """Test filtro de queryset (usado por el admin)"""
+        from clients.models import Client
+        from .search import filter_queryset
+
+        qs = filter_queryset(Client.objects.all(), '20-1111')
+        self.assertEqual(list(qs), [self.client_obj])
+
+    def test_suggest_prefix_on_key_columns(self):
+        """Test que el autocompletado busca sólo en razón social, nombre y CUIT"""
+        from clients.models import Client
+        from .search import suggest
+
+        other = Client.objects.create(company_name="Distribuidora Norte", name="Martín Pan")
+        self.assertEqual([r['id'] for r in suggest(Client, 'pan')], [self.client_obj.pk, other.pk])
+        self.assertEqual(suggest(Client, 'martes'), [])  # sólo está en notes
+        self.assertEqual(suggest(Client, '11111')[0]['tax_id'], "20-11111111-1")
+        self.assertEqual(suggest(Client, 'p'), [])
+
+    def test_suggest_finds_prefix_rows_beyond_candidates(self):
+        """Test que las que empiezan con el texto aparecen aunque haya muchas coincidencias antes por rowid"""
+        from unittest import mock
+        from clients.models import Client
+        from . import search
+
+        for i in range(5):
+            Client.objects.create(company_name=f"Distribuidora Pan {i}", name="Otro")
+        starts = Client.objects.create(company_name="Panificadora Sur", name="Eva")
+        by_name = Client.objects.create(company_name="Molino", name="Pancho")
+        with mock.patch.object(search, 'SUGGEST_CANDIDATES', 3):
+            results = search.suggest(Client, 'pan', limit=4)
+        self.assertEqual([r['id'] for r in results[:3]], [self.client_obj.pk, starts.pk, by_name.pk])
+        self.assertEqual(len(results), 4)
+        self.assertEqual(len({r['id'] for r in results}), 4)
+        self.assertEqual(search.build_match('pan sur', columns=('name',), initial=True), '{name} : (^"pan"* "sur"*)')
+
+    def test_rebuild_command(self):
+        """Test comando rebuild_search_index"""
+        from io import StringIO
+        from django.core.management import call_command
+        from clients.models import Client
+        from .search import search
+
+        Client.objects.filter(pk=self.client_obj.pk).update(company_name="Cambio Directo")
+        self.assertEqual(search(Client, 'cambio'), [])
+        out = StringIO()
+        call_command('rebuild_search_index', 'clients.Client', stdout=out)
+        self.assertIn('1 filas indexadas', out.getvalue())
+        self.assertEqual(len(search(Client, 'cambio')), 1)
+
+    def test_search_view(self):
+        """Test vista de búsqueda"""
+        from django.test import Client as DjangoTestClient
+        from django.urls import reverse
+
+        response = DjangoTestClient().get(reverse('core:search'), {'q': 'harinas'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'search.html')
+        self.assertEqual([r['object'].pk for r in response.context['results']], [self.supplier_obj.pk])
+        self.assertContains(response, reverse('suppliers:detail', args=[self.supplier_obj.pk]))
+
+
+class EntitySearchAutocommitTests(TransactionTestCase):
+    """Tests del índice de búsqueda sin transacción envolvente"""
+
+    def test_failed_reindex_keeps_previous_row(self):
+        """Test que si el INSERT del índice falla no queda aplicado sólo el DELETE"""
+        from unittest import mock
+        from clients.models import Client
+        from . import search
+
+        client = Client.objects.create(company_name="Panadería Martínez", name="Juan")
+        with mock.patch.object(search, '_row', side_effect=RuntimeError), self.assertRaises(RuntimeError):
+            search.index_instance(client)
+        self.assertEqual([obj.pk for obj, _ in search.search(Client, 'panaderia')], [client.pk])
+
+
+class AuditSinkTests(TestCase):
+    """Tests para la escritura en lotes de AuditLog"""
+
+    def test_entries_written_in_one_batch_on_commit(self):
+        """Test que varias entradas de una transacción se insertan juntas al commit"""
+        from clients.models import Client
+        from .models import AuditLog
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            for i in range(3):
+                Client.objects.create(company_name=f"Lote {i}", name="X")
+            self.assertEqual(AuditLog.objects.count(), 0)
+
+        from core.audit import _TransactionBatch
+        self.assertEqual(len([c for c in callbacks if isinstance(c, _TransactionBatch)]), 1)
+        self.assertEqual(AuditLog.objects.filter(action='create').count(), 3)
+
+    def test_entries_dropped_on_rollback(self):
+        """Test que un rollback descarta las entradas pendientes"""
+        from django.db import transaction
+        from clients.models import Client
+        from .models import AuditLog
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Client.objects.create(company_name="Confirmado", name="X")
+            try:
+                with transaction.atomic():
+                    Client.objects.create(company_name="Revertido", name="X")
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+
+        self.assertEqual(list(AuditLog.objects.values_list('object_repr', flat=True)), ["Confirmado - X"])
+
+
+class AuditSinkAutocommitTests(TransactionTestCase):
+    """Tests del buffer por request y del modo background (sin transacción envolvente)"""
+
+    def test_request_buffer_flushes_once(self):
+        """Test que el buffer de la request se escribe con un único INSERT"""
+        from clients.models import Client
+        from . import audit
+        from .models import AuditLog
+
+        with audit.collect():
+            Client.objects.create(company_name="A", name="X")
+            Client.objects.create(company_name="B", name="X")
+            self.assertEqual(AuditLog.objects.count(), 0)
+        self.assertEqual(AuditLog.objects.count(), 2)
+
+    def test_known_lookup_values_skip_insert(self):
+        """Test que un path o user agent ya confirmado no vuelve a insertarse"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from . import audit
+        from .models import AuditLog
+
+        audit.write([AuditLog(action='login', path='/admin/login/', user_agent='Mozilla/5.0')])
+        with CaptureQueriesContext(connection) as queries:
+            audit.write([AuditLog(action='login', path='/admin/login/', user_agent='Mozilla/5.0')])
+        self.assertFalse([q for q in queries if 'core_auditpath' in q['sql'] or 'core_audituseragent' in q['sql']])
+        self.assertEqual(
+            list(AuditLog.objects.with_metadata().order_by().values_list('path', 'user_agent').distinct()),
+            [('/admin/login/', 'Mozilla/5.0')],
+        )
+
+    def test_without_scope_writes_immediately(self):
+        """Test que fuera de request y transacción se escribe en el momento"""
+        from clients.models import Client
+        from .models import AuditLog
+
+        Client.objects.create(company_name="A", name="X")
+        self.assertEqual(AuditLog.objects.count(), 1)
+
+    def test_background_writer_batches(self):
+        """Test que el writer en background agrupa por tamaño máximo"""
+        from . import audit
+        from .models import AuditLog
+
+        writer = audit.BackgroundWriter(max_batch=2, interval=0)
+        writer.submit([AuditLog(action='login') for _ in range(3)])
+        self.assertEqual(len(writer._next_batch(0)), 2)
+        writer.flush()
+        self.assertEqual(AuditLog.objects.count(), 1)
+
+
+class AuditChainTests(TestCase):
+    """Tests para el hashing encadenado de AuditLog y su verificación"""
+
+    def _write(self, n, action='login'):
+        from . import audit
+        from .models import AuditLog
+
+        audit.write([AuditLog(action=action, object_repr=f"evento {i}", ip_address='10.0.0.1') for i in range(n)])
+
+    def _verify(self, *args):
+        from io import StringIO
+        from django.core.management import call_command
+
+        out = StringIO()
+        call_command('verify_audit_chain', '--workers', '1', '--chunk-size', '3', *args, stdout=out)
+        return out.getvalue()
+
+    def test_entries_are_chained(self):
+        """Test que cada entrada encadena con el hash de la anterior"""
+        from .chain import GENESIS, HASH_FIELDS, chain_hash
+        from .models import AuditChainHead, AuditLog
+
+        self._write(2)
+        self._write(1)
+        rows = list(AuditLog.objects.order_by('pk'))
+        prev = GENESIS
+        for row in rows:
+            self.assertEqual(row.entry_hash, chain_hash(prev, [getattr(row, f) for f in HASH_FIELDS]))
+            prev = row.entry_hash
+
+        head = AuditChainHead.objects.get()
+        self.assertEqual((head.entry_hash, head.length), (prev, 3))
+
+    def test_verify_and_checkpoint(self):
+        """Test verificación completa y reanudación incremental desde checkpoint"""
+        from .models import AuditChainCheckpoint
+
+        self._write(7)
+        self.assertIn('7 entradas verificadas', self._verify())
+        self.assertEqual(AuditChainCheckpoint.objects.get().rows_verified, 7)
+
+        self._write(2)
+        self.assertIn('2 entradas verificadas', self._verify())
+        self.assertIn('Sin entradas nuevas', self._verify())
+
+    def test_verify_detects_tampering(self):
+        """Test que una fila modificada rompe la verificación"""
+        from django.core.management.base import CommandError
+        from .models import AuditLog
+
+        self._write(5)
+        target = AuditLog.objects.order_by('pk')[2]
+        AuditLog.objects.filter(pk=target.pk).update(object_repr="alterado")
+
+        with self.assertRaisesMessage(CommandError, str(target.pk)):
+            self._verify()
+
+    def test_checkpoint_mismatch_requires_full(self):
+        """Test que se detecta una alteración de la fila del checkpoint"""
+        from django.core.management.base import CommandError
+        from .models import AuditLog
+
+        self._write(3)
+        self._verify()
+        AuditLog.objects.filter(pk=AuditLog.objects.order_by('-pk')[0].pk).update(entry_hash='x')
+        with self.assertRaises(CommandError):
+            self._verify()
+        with self.assertRaises(CommandError):
+            self._verify('--full')
+
+    def test_verify_segment_skips_legacy_rows(self):
+        """Test que las filas previas a la cadena (sin hash) no cuentan como error"""
+        from .chain import GENESIS, chain_hash, verify_segment
+
+        values = ['2025-01-01T00:00:00+00:00', None, 'login', None, None, 'x', None, None, None, None]
+        h1 = chain_hash(GENESIS, values)
+        rows = [(1, None, *values), (2, h1, *values), (3, None, *values)]
+        bad, last_pk, last_hash, verified = verify_segment(None, rows)
+        self.assertEqual((bad, last_pk, last_hash, verified), ([3], 3, h1, 1))
+
+
+class AuditArchiveTests(TestCase):
+    """Tests para el archivado de AuditLog en segmentos comprimidos"""
+
+    def setUp(self):
+        import tempfile
+        from datetime import timedelta
+        from django.utils import timezone
+        from . import audit
+        from .models import AuditLog
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.now = timezone.now()
+        old = self.now - timedelta(days=400)
+        entries = [
+            AuditLog(action='update', object_pk=str(i % 3), object_repr=f"viejo {i}",
+                     timestamp=old + timedelta(hours=i))
+            for i in range(10)
+        ]
+        entries += [AuditLog(action='update', object_pk='1', object_repr="reciente", timestamp=self.now)]
+        audit.write(entries)
+
+    def _archive(self, **kwargs):
+        from datetime import timedelta
+        from .archive import archive_expired
+
+        return archive_expired(self.now - timedelta(days=365), directory=self.tmp.name,
+                               block_rows=3, segment_rows=6, delete_batch=2, **kwargs)
+
+    def test_archive_moves_expired_rows(self):
+        """Test que las filas vencidas pasan a segmentos y se borran de la base"""
+        from .models import AuditLog
+
+        stats = self._archive()
+        self.assertEqual((stats['archived'], stats['deleted']), (10, 10))
+        self.assertEqual(len(stats['segments']), 2)
+        self.assertEqual(list(AuditLog.objects.values_list('object_repr', flat=True)), ["reciente"])
+
+    def test_reader_filters_by_date_and_object(self):
+        """Test consultas sobre los segmentos archivados"""
+        from datetime import timedelta
+        from .archive import ArchiveReader
+
+        self._archive()
+        reader = ArchiveReader(self.tmp.name)
+        self.assertEqual(len(list(reader.entries())), 10)
+
+        start = self.now - timedelta(days=400) + timedelta(hours=2)
+        end = start + timedelta(hours=3)
+        self.assertEqual(
+            [e['object_repr'] for e in reader.entries(start=start, end=end)],
+            ["viejo 2", "viejo 3", "viejo 4"]
+        )
+        self.assertEqual(len(list(reader.entries(object_pk=1))), 3)
+
+    def test_reader_accepts_naive_dates(self):
+        """Test que fechas naive se interpretan en la zona horaria del sitio en lugar de fallar"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from .archive import ArchiveReader
+
+        self._archive()
+        start = timezone.make_naive(self.now - timedelta(days=400) + timedelta(hours=2))
+        entries = ArchiveReader(self.tmp.name).entries(start=start, end=start + timedelta(hours=3))
+        self.assertEqual([e['object_repr'] for e in entries], ["viejo 2", "viejo 3", "viejo 4"])
+
+    def test_chain_still_verifies_after_archive(self):
+        """Test que la cadena restante se verifica desde el checkpoint del archivado"""
+        from io import StringIO
+        from django.core.management import call_command
+
+        self._archive()
+        for extra in ([], ['--full']):
+            out = StringIO()
+            call_command('verify_audit_chain', '--workers', '1', *extra, stdout=out)
+            self.assertIn('1 entradas verificadas', out.getvalue())
+
+    def test_broken_chain_aborts_without_deleting(self):
+        """Test que una fila alterada impide archivar su tramo"""
+        from .archive import ChainBroken
+        from .models import AuditLog
+
+        AuditLog.objects.filter(object_repr="viejo 1").update(object_repr="alterado")
+        with self.assertRaises(ChainBroken):
+            self._archive()
+        self.assertEqual(AuditLog.objects.count(), 11)
+
+    def test_dry_run(self):
+        """Test del comando en modo dry-run"""
+        from io import StringIO
+        from django.core.management import call_command
+
+        out = StringIO()
+        call_command('archive_auditlog', '--dry-run', '--output-dir', self.tmp.name, stdout=out)
+        self.assertIn('10 entradas', out.getvalue())
+
+
+class EntityChangeTrackingTests(TestCase):
+    """Tests para el registro de cambios campo a campo"""
+
+    def setUp(self):
+        from clients.models import Client
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.obj = Client.objects.create(company_name="Original", name="Contacto", email="a@a.com")
+
+    def _reload(self):
+        from clients.models import Client
+
+        return Client.objects.get(pk=self.obj.pk)
+
+    def test_update_records_field_changes(self):
+        """Test que AuditLog.changes guarda {campo: [antes, después]}"""
+        from .models import AuditLog
+
+        obj = self._reload()
+        obj.company_name = "Nueva"
+        obj.email = None
+        with self.captureOnCommitCallbacks(execute=True):
+            obj.save()
+
+        entry = AuditLog.objects.get(action='update')
+        self.assertEqual(entry.changes, {'company_name': ['Original', 'Nueva'], 'email': ['a@a.com', None]})
+
+    def test_unchanged_save_is_skipped(self):
+        """Test que guardar sin cambios no ejecuta UPDATE ni audita"""
+        from .models import AuditLog
+
+        obj = self._reload()
+        obj.name = "Contacto"
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertNumQueries(0):
+                obj.save()
+        self.assertEqual(callbacks, [])
+        self.assertFalse(AuditLog.objects.filter(action='update').exists())
+
+    def test_update_only_writes_changed_columns(self):
+        """Test que el UPDATE sólo incluye las columnas modificadas"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        obj = self._reload()
+        obj.is_active = False
+        with CaptureQueriesContext(connection) as ctx:
+            obj.save()
+        updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "clients_client"')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"is_active"', updates[0])
+        self.assertNotIn('"company_name"', updates[0])
+
+    def test_deferred_field_access_keeps_pending_changes(self):
+        """Test que cargar un campo diferido no pierde cambios sin guardar"""
+        from clients.models import Client
+
+        obj = Client.objects.only('id', 'company_name', 'name').get(pk=self.obj.pk)
+        obj.name = "Otro"
+        self.assertEqual(obj.email, "a@a.com")
+        self.assertEqual(obj.tracked_changes(), {'name': ['Contacto', 'Otro']})
+
+    def test_edit_view_adds_no_queries(self):
+        """Test que client_edit no hace SELECT extra para obtener los cambios"""
+        from django.db import connection
+        from django.test import Client as DjangoTestClient
+        from django.test.utils import CaptureQueriesContext
+        from django.urls import reverse
+
+        with CaptureQueriesContext(connection) as ctx:
+            DjangoTestClient().post(reverse('clients:edit', args=[self.obj.pk]), {
+                'company_name': 'Editada', 'name': 'Contacto', 'email': 'a@a.com', 'is_active': True,
+            })
+        selects = [q for q in ctx.captured_queries if q['sql'].startswith('SELECT') and 'clients_client' in q['sql']]
+        self.assertEqual(len(selects), 1)
+
+
+class EntityImportTests(TestCase):
+    """Tests para la importación masiva de CSV (core.importer)"""
+
+    CSV = (
+        "company_name,name,email,tax_id,is_active\n"
+        "Alfa S.A.,Ana,ana@alfa.com,20-1-1,\n"
+        "Beta SRL,Bruno,no-es-email,,no\n"
+        ",Sin Razón,,,\n"
+        "Gamma SA,Gabi,,,0\n"
+        "Delta SA,Dani,,,si\n"
+    )
+
+    def _import(self, text, **kwargs):
+        import io
+        from clients.forms import ClientForm
+        from clients.models import Client
+        from core import importer
+
+        with self.captureOnCommitCallbacks(execute=True):
+            return importer.import_entities(Client, ClientForm, io.StringIO(text), **kwargs)
+
+    def test_valid_rows_are_inserted_in_batches(self):
+        """Test que se insertan las filas válidas en lotes y se cuentan las inválidas"""
+        from clients.models import Client
+
+        result = self._import(self.CSV, batch_size=2)
+        self.assertEqual((result.rows, result.created, result.invalid, result.batches), (5, 3, 2, 2))
+        self.assertEqual(
+            dict(Client.objects.values_list('company_name', 'is_active')),
+            {'Alfa S.A.': True, 'Gamma SA': False, 'Delta SA': True},
+        )
+
+    def test_one_audit_entry_per_batch(self):
+        """Test que se registra una entrada de auditoría por lote, no por fila"""
+        from .models import AuditLog
+
+        self._import(self.CSV, batch_size=2, source='alta.csv')
+        entries = list(AuditLog.objects.order_by('pk'))
+        self.assertEqual([e.action for e in entries], ['import', 'import'])
+        self.assertEqual(entries[0].changes['rows'], 2)
+        self.assertEqual(entries[0].changes['lines'], [2, 5])
+        self.assertEqual(entries[1].changes['source'], 'alta.csv')
+
+    def test_imported_rows_are_searchable(self):
+        """Test que las filas importadas quedan en el índice de búsqueda"""
+        from clients.models import Client
+        from core import search
+
+        self._import(self.CSV)
+        self.assertEqual([obj.company_name for obj, _ in search.search(Client, 'gamma')], ['Gamma SA'])
+
+    def test_error_report(self):
+        """Test que el reporte de errores lista línea y campo"""
+        import csv
+        import io
+
+        report = io.StringIO()
+        self._import(self.CSV, error_report=report)
+        rows = list(csv.reader(io.StringIO(report.getvalue())))
+        self.assertEqual(rows[0], ['linea', 'campo', 'error'])
+        self.assertEqual([(r[0], r[1]) for r in rows[1:]], [('3', 'email'), ('4', 'company_name')])
+
+    def test_missing_required_column(self):
+        """Test que un CSV sin columnas obligatorias se rechaza"""
+        from core import importer
+
+        with self.assertRaises(importer.InvalidFile):
+            self._import("name,email\nAna,ana@a.com\n")
+
+    def test_command(self):
+        """Test del comando import_entities"""
+        import os
+        import tempfile
+        from io import StringIO
+        from django.core.management import call_command
+        from suppliers.models import Supplier
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'proveedores.csv')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(self.CSV)
+            out = StringIO()
+            with self.captureOnCommitCallbacks(execute=True):
+                call_command('import_entities', 'suppliers', path,
+                             '--errors', os.path.join(tmp, 'errores.csv'), stdout=out)
+            self.assertTrue(os.path.exists(os.path.join(tmp, 'errores.csv')))
+        self.assertEqual(Supplier.objects.count(), 3)
+        self.assertIn('2 filas con errores', out.getvalue())
+
+    def _uploader(self, *perms):
+        from django.contrib.auth import get_user_model
+        from django.contrib.auth.models import Permission
+        from django.test import Client as DjangoTestClient
+
+        user = get_user_model().objects.create_user('carga', password='x')
+        for perm in perms:
+            app_label, codename = perm.split('.')
+            user.user_permissions.add(Permission.objects.get(content_type__app_label=app_label, codename=codename))
+        browser = DjangoTestClient()
+        with self.captureOnCommitCallbacks(execute=True):
+            browser.force_login(user)
+        return browser
+
+    def test_upload_view_requires_add_permission(self):
+        """Test que la carga de CSV exige el permiso de alta del modelo"""
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from django.test import Client as DjangoTestClient
+        from django.urls import reverse
+        from clients.models import Client
+
+        url = reverse('clients:import')
+        self.assertEqual(DjangoTestClient().get(url).status_code, 403)
+        upload = SimpleUploadedFile('clientes.csv', self.CSV.encode('utf-8'), content_type='text/csv')
+        self.assertEqual(DjangoTestClient().post(url, {'file': upload}).status_code, 403)
+        self.assertEqual(self._uploader('suppliers.add_supplier').get(url).status_code, 403)
+        self.assertEqual(Client.objects.count(), 0)
+
+    def test_upload_view(self):
+        """Test de la vista de carga de CSV"""
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from django.urls import reverse
+        from clients.models import Client
+
+        browser = self._uploader('clients.add_client')
+        upload = SimpleUploadedFile('clientes.csv', self.CSV.encode('utf-8'), content_type='text/csv')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = browser.post(reverse('clients:import'), {'file': upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['result'].created, 3)
+        self.assertContains(response, 'Línea 3')
+        self.assertEqual(Client.objects.count(), 3)
+
+    def test_upload_view_error_report_download(self):
+        """Test que la vista devuelve el reporte de errores como CSV"""
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from django.urls import reverse
+
+        browser = self._uploader('suppliers.add_supplier')
+        upload = SimpleUploadedFile('clientes.csv', self.CSV.encode('utf-8'), content_type='text/csv')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = browser.post(reverse('suppliers:import'), {'file': upload, 'report': '1'})
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        body = b''.join(response.streaming_content).decode('utf-8')
+        self.assertTrue(body.startswith('linea,campo,error'))
+
+
+class EntityExportTests(TestCase):
+    """Tests para la exportación en streaming (core.export)"""
+
+    def setUp(self):
+        """Configuración inicial para las pruebas"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from clients.models import Client
+
+        self.old = Client.objects.create(company_name="Vieja SA", name="Ana", is_active=False)
+        Client.objects.filter(pk=self.old.pk).update(updated_at=timezone.now() - timedelta(days=30))
+        self.new = Client.objects.create(company_name="Nueva, SA", name="Beto", email="b@b.com")
+
+    def _get(self, **params):
+        from django.test import Client as DjangoTestClient
+        from django.urls import reverse
+
+        response = DjangoTestClient().get(reverse('clients:export'), params)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_csv_export(self):
+        """Test que exporta CSV con encabezado y todas las columnas"""
+        import csv
+        import io
+
+        response, body = self._get()
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        rows = list(csv.DictReader(io.StringIO(body.decode('utf-8'))))
+        self.assertEqual([r['company_name'] for r in rows], ['Vieja SA', 'Nueva, SA'])
+        self.assertIn('notes', rows[0])
+        self.assertIn('updated_at', rows[0])
+
+    def test_filters(self):
+        """Test de los filtros active y updated_since"""
+        import json
+        from datetime import timedelta
+        from django.utils import timezone
+
+        _, body = self._get(format='jsonl', active='0')
+        self.assertEqual([json.loads(line)['id'] for line in body.splitlines()], [self.old.pk])
+
+        since = (timezone.now() - timedelta(days=1)).date().isoformat()
+        _, body = self._get(format='jsonl', updated_since=since)
+        self.assertEqual([json.loads(line)['id'] for line in body.splitlines()], [self.new.pk])
+
+    def test_gzip(self):
+        """Test que la exportación comprimida es gzip válido"""
+        import gzip
+
+        response, body = self._get(gzip='1')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('clients.csv.gz', response['Content-Disposition'])
+        self.assertTrue(gzip.decompress(body).decode('utf-8').startswith('id,company_name'))
+
+    def test_invalid_params(self):
+        """Test que formato o fecha inválidos devuelven 400"""
+        self.assertEqual(self._get(format='xml')[0].status_code, 400)
+        self.assertEqual(self._get(updated_since='ayer')[0].status_code, 400)
+
+    def test_streams_in_chunks(self):
+        """Test que el encabezado sale antes de consultar y las filas en bloques"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from clients.models import Client
+        from core import export
+
+        chunks = export.csv_lines(export.export_queryset(Client), export.export_fields(Client), chunk_size=1)
+        with CaptureQueriesContext(connection) as ctx:
+            header = next(chunks)
+            self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertTrue(header.startswith('id,'))
+        self.assertEqual(len(list(chunks)), 2)
+
+    def test_updated_at_follows_saves(self):
+        """Test que updated_at se actualiza al guardar un cambio"""
+        from clients.models import Client
+
+        obj = Client.objects.get(pk=self.old.pk)
+        before = obj.updated_at
+        obj.name = "Ana María"
+        obj.save()
+        self.assertGreater(Client.objects.get(pk=obj.pk).updated_at, before)
+
+
+class EntityCacheTests(TestCase):
+    """Tests para la caché de páginas y fragmentos por versión (core.cache)"""
+
+    def setUp(self):
+        """Configuración inicial para las pruebas"""
+        from django.core.cache import caches
+        from django.test import override_settings
+        from clients.models import Client
+
+        override = override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'entity-cache-tests',
+        }})
+        override.enable()
+        self.addCleanup(override.disable)
+        caches['default'].clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.obj = Client.objects.create(company_name="Cacheada SA", name="Ana")
+
+    def _client_queries(self, url):
+        from django.db import connection
+        from django.test import Client as DjangoTestClient
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = DjangoTestClient().get(url)
+        return response, [q for q in ctx.captured_queries if 'clients_client' in q['sql']]
+
+    def test_list_page_is_cached_until_a_change(self):
+        """Test que el listado se sirve de caché hasta que cambia un cliente"""
+        from django.urls import reverse
+        from clients.models import Client
+
+        url = reverse('clients:list')
+        self._client_queries(url)
+        response, queries = self._client_queries(url)
+        self.assertContains(response, 'Cacheada SA')
+        self.assertEqual(queries, [])
+
+        Client.objects.create(company_name="Nueva SA", name="Beto")
+        response, queries = self._client_queries(url)
+        self.assertContains(response, 'Nueva SA')
+        self.assertTrue(queries)
+
+    def test_detail_fragment_follows_object_version(self):
+        """Test que el fragmento del detalle se invalida al editar ese objeto"""
+        from django.urls import reverse
+
+        url = reverse('clients:detail', args=[self.obj.pk])
+        self.assertContains(self._client_queries(url)[0], 'Ana')
+        self.obj.name = "Ana María"
+        self.obj.save()
+        self.assertContains(self._client_queries(url)[0], 'Ana María')
+
+    def test_detail_fragment_is_keyed_by_model(self):
+        """Test que un cliente y un proveedor con el mismo pk no comparten el fragmento del detalle"""
+        from unittest import mock
+        from django.urls import reverse
+        from core import cache
+        from suppliers.models import Supplier
+
+        supplier = Supplier.objects.create(pk=self.obj.pk, company_name="Proveedora SA", name="Beto")
+        # las dos versiones se siembran con el mismo valor
+        with mock.patch.object(cache.time, 'time_ns', return_value=1):
+            self.assertContains(self._client_queries(reverse('clients:detail', args=[self.obj.pk]))[0], 'Cacheada SA')
+            response = self._client_queries(reverse('suppliers:detail', args=[supplier.pk]))[0]
+        self.assertContains(response, 'Proveedora SA')
+        self.assertNotContains(response, 'Cacheada SA')
+
+    def test_pending_messages_bypass_cache(self):
+        """Test que con mensajes pendientes la página se renderiza (y los muestra)"""
+        from django.test import Client as DjangoTestClient
+        from django.urls import reverse
+        from suppliers.models import Supplier
+
+        supplier = Supplier.objects.create(company_name="Prov", name="P")
+        browser = DjangoTestClient()
+        browser.get(reverse('suppliers:list'))
+        response = browser.post(reverse('suppliers:delete', args=[supplier.pk]), follow=True)
+        self.assertContains(response, 'Proveedor eliminado correctamente.')
+        self.assertNotContains(response, 'Prov - P')
+
+    def test_bump_is_repeated_on_commit(self):
+        """Test que dentro de una transacción la versión se sube ya y al commit"""
+        from clients.models import Client
+        from core import cache
+
+        before = cache.model_version(Client)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.obj.name = "Otro"
+            self.obj.save()
+            during = cache.model_version(Client)
+        self.assertGreater(during, before)
+        self.assertGreater(cache.model_version(Client), during)
+
+
+class QueryPlanTests(TestCase):
+    """Tests para los índices de Entity/AuditLog y check_query_plans"""
+
+    def test_by_tax_id_ignores_separators(self):
+        """Test que by_tax_id compara el CUIT normalizado"""
+        from clients.models import Client
+
+        obj = Client.objects.create(company_name="A", name="B", tax_id="30-71234567.1")
+        Client.objects.create(company_name="C", name="D", tax_id="30712345672")
+        self.assertEqual(list(Client.objects.by_tax_id('30 71234567 1')), [obj])
+        self.assertEqual(Client.objects.active().count(), 2)
+
+    def test_views_use_indexes(self):
+        """Test que ninguna consulta de las vistas recorre una tabla sin índice"""
+        from io import StringIO
+        from django.core.management import call_command
+
+        out = StringIO()
+        call_command('check_query_plans', stdout=out)
+        self.assertIn('todas usan índices', out.getvalue())
+
+    def test_full_scan_is_reported(self):
+        """Test que un SCAN sin índice o un ordenamiento en memoria es una violación"""
+        from core.management.commands.check_query_plans import Command
+
+        tables = {'clients_client'}
+        self.assertEqual(Command._violations(['SCAN clients_client'], tables), ['SCAN clients_client'])
+        self.assertEqual(
+            Command._violations(['SCAN clients_client', 'USE TEMP B-TREE FOR ORDER BY'], tables),
+            ['USE TEMP B-TREE FOR ORDER BY'],
+        )
+        self.assertEqual(
+            Command._violations(['SCAN clients_client USING INDEX clients_client_list_idx'], tables), [],
+        )
+
+    def test_ordered_pk_walk_needs_indexed_filters(self):
+        """Test que sólo se acepta el SCAN en orden de pk con LIMIT y filtros sobre columnas con índice"""
+        from django.db import connection
+        from clients.models import Client
+        from core.management.commands.check_query_plans import Command
+
+        tables = {'clients_client'}
+        indexed = Command._indexed_columns(connection, tables)
+        plan = ['SCAN clients_client']
+
+        def violations(queryset):
+            return Command._violations(plan, tables, queryset.query, indexed)
+
+        self.assertEqual(violations(Client.objects.order_by('id')[:5]), [])
+        self.assertEqual(violations(Client.objects.filter(id__gt=10).order_by('-pk')[:5]), [])
+        self.assertEqual(violations(Client.objects.filter(updated_at__isnull=False).order_by('id')[:5]), [])
+        self.assertEqual(violations(Client.objects.filter(email='a@b.c').order_by('id')[:5]), plan)
+        self.assertEqual(violations(Client.objects.order_by('id')), plan)
+        self.assertEqual(violations(Client.objects.order_by('name', 'id')[:5]), plan)
+
+
+class EntityDedupTests(TestCase):
+    """Tests para la detección y fusión de duplicados (core.dedup)"""
+
+    def _create(self, model=None, **fields):
+        from clients.models import Client
+
+        with self.captureOnCommitCallbacks(execute=True):
+            return (model or Client).objects.create(**{'name': 'Contacto', **fields})
+
+    def _pairs(self):
+        from core.models import DuplicateCandidate
+
+        return set(DuplicateCandidate.objects.values_list('left_pk', 'right_pk', 'status'))
+
+    def test_normalization(self):
+        """Test que nombre, teléfono y email se normalizan antes de comparar"""
+        from core import dedup
+
+        self.assertEqual(dedup.normalize_name("Ferretería López S.A."), "ferreteria lopez")
+        self.assertEqual(dedup.normalize_phone("+54 9 11 4567-8901"), dedup.normalize_phone("011 4567 8901"))
+        self.assertEqual(dedup.normalize_email(" Ventas@Lopez.com "), "ventas@lopez.com")
+
+    def test_same_tax_id_with_other_format_is_candidate(self):
+        """Test que el mismo CUIT con otro formato genera un candidato al guardar"""
+        from core.models import DuplicateCandidate
+
+        a = self._create(company_name="Alfa SA", tax_id="30-71234567-1")
+        b = self._create(company_name="Beta Servicios", tax_id="30712345671")
+        candidate = DuplicateCandidate.objects.get()
+        self.assertEqual((candidate.left_pk, candidate.right_pk), (a.pk, b.pk))
+        self.assertTrue(candidate.reasons['tax_id'])
+
+        # al dejar de parecerse, el par se quita
+        with self.captureOnCommitCallbacks(execute=True):
+            b.tax_id = "27-11111111-1"
+            b.save()
+        self.assertEqual(self._pairs(), set())
+
+    def test_spelling_variants_share_a_trigram_bucket(self):
+        """Test que variantes de escritura de la razón social se detectan"""
+        a = self._create(company_name="Ferretería López S.A.")
+        b = self._create(company_name="Ferreteria Lopez SRL")
+        self._create(company_name="Panadería San Martín")
+        self.assertEqual(self._pairs(), {(a.pk, b.pk, 'pending')})
+
+    def test_models_are_not_mixed(self):
+        """Test que un cliente y un proveedor iguales no son candidatos"""
+        from suppliers.models import Supplier
+
+        self._create(company_name="Alfa SA", tax_id="30712345671")
+        self._create(Supplier, company_name="Alfa SA", tax_id="30712345671")
+        self.assertEqual(self._pairs(), set())
+
+    def test_rebuild_command_keeps_dismissed_pairs(self):
+        """Test que find_duplicates recalcula todo sin reabrir pares descartados"""
+        from io import StringIO
+        from django.core.management import call_command
+        from django.test import override_settings
+        from clients.models import Client
+        from core.models import DuplicateCandidate
+
+        with override_settings(DEDUP_AUTO_REFRESH=False):
+            a = Client.objects.create(company_name="Alfa SA", name="A", email="info@alfa.com")
+            b = Client.objects.create(company_name="Alfa S.A.", name="B", email="INFO@alfa.com")
+            c = Client.objects.create(company_name="Gamma", name="C", email="info@alfa.com")
+        self.assertEqual(self._pairs(), set())
+
+        out = StringIO()
+        call_command('find_duplicates', 'clients.client', stdout=out)
+        self.assertIn('3 candidatos', out.getvalue())
+        DuplicateCandidate.objects.filter(left_pk=a.pk, right_pk=c.pk).update(status=DuplicateCandidate.DISMISSED)
+        call_command('find_duplicates', stdout=StringIO())
+        self.assertEqual(self._pairs(), {
+            (a.pk, b.pk, 'pending'), (a.pk, c.pk, 'dismissed'), (b.pk, c.pk, 'pending'),
+        })
+
+    def test_merge_records_one_audit_entry(self):
+        """Test que la fusión completa vacíos, borra el duplicado y audita una vez"""
+        from clients.models import Client
+        from core import dedup
+        from core.models import AuditLog
+
+        keep = self._create(company_name="Alfa SA", tax_id="30712345671")
+        dup = self._create(company_name="Alfa S.A.", tax_id="30-71234567-1", email="info@alfa.com", phone="4567-8901")
+        before = AuditLog.objects.count()
+        dup_pk, dup_repr = dup.pk, str(dup)
+        with self.captureOnCommitCallbacks(execute=True):
+            dedup.merge(keep, [dup])
+
+        keep.refresh_from_db()
+        self.assertEqual((keep.email, keep.phone), ("info@alfa.com", "4567-8901"))
+        self.assertFalse(Client.objects.filter(pk=dup_pk).exists())
+        entries = list(AuditLog.objects.order_by('id')[before:])
+        self.assertEqual([e.action for e in entries], ['merge'])
+        self.assertEqual(entries[0].changes['merged'], {str(dup_pk): dup_repr})
+        self.assertEqual(entries[0].changes['fields']['email'], [None, "info@alfa.com"])
+        self.assertEqual(self._pairs(), set())
+
+    def test_merge_rejects_other_models(self):
+        """Test que no se fusionan objetos de modelos distintos"""
+        from core import dedup
+        from suppliers.models import Supplier
+
+        client = self._create(company_name="Alfa SA")
+        supplier = self._create(Supplier, company_name="Alfa SA")
+        with self.assertRaises(dedup.MergeError):
+            dedup.merge(client, [supplier])
+
+    def test_admin_merge_pairs_action(self):
+        """Test que la acción del admin fusiona cada par candidato"""
+        from django.contrib.auth import get_user_model
+        from django.urls import reverse
+        from clients.models import Client
+        from core.models import DuplicateCandidate
+
+        a = self._create(company_name="Alfa SA", tax_id="30712345671")
+        b = self._create(company_name="Alfa", tax_id="30-71234567-1")
+        admin_user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'x')
+        self.client.force_login(admin_user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('admin:core_duplicatecandidate_changelist'), {
+                'action': 'merge_pairs',
+                '_selected_action': list(DuplicateCandidate.objects.values_list('pk', flat=True)),
+            })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(list(Client.objects.values_list('pk', flat=True)), [a.pk])
+        self.assertFalse(Client.objects.filter(pk=b.pk).exists())
+
+    def test_schedule_uses_instance_in_memory(self):
+        """Test que las claves salen de la instancia guardada, sin releerla"""
+        from django.db import connection
+        from django.test import override_settings
+        from django.test.utils import CaptureQueriesContext
+        from clients.models import Client
+        from core import dedup
+        from core.models import EntityBlockKey
+
+        with override_settings(DEDUP_AUTO_REFRESH=False):
+            client = Client.objects.create(company_name="Alfa SA", name="A", tax_id="30712345671")
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            dedup.schedule(Client, [client])
+        self.assertFalse([q for q in queries if 'FROM "clients_client"' in q['sql']])
+        self.assertIn('tax_id:30712345671', EntityBlockKey.objects.values_list('key', flat=True))
+
+
+class EntityDedupRequestTests(TransactionTestCase):
+    """Tests del recálculo de duplicados postergado en las requests"""
+
+    def test_refresh_runs_after_the_response(self):
+        """Test que el alta por la vista recalcula duplicados recién al cerrar la respuesta"""
+        from unittest import mock
+        from django.test import Client as DjangoTestClient
+        from django.urls import reverse
+        from clients.models import Client
+        from core import dedup
+        from core.middleware import get_audit_context
+        from core.models import DuplicateCandidate
+
+        Client.objects.create(company_name="Alfa SA", name="A", tax_id="30712345671")
+        contexts = []
+
+        def run(models):
+            contexts.append(get_audit_context())
+            return original(models)
+
+        original = dedup._run
+        with mock.patch.object(dedup, '_run', side_effect=run):
+            response = DjangoTestClient().post(reverse('clients:add'), {
+                'company_name': "Alfa S.A.", 'name': "B", 'tax_id': "30-71234567-1", 'is_active': 'on',
+            })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(contexts, [None])
+        self.assertEqual(DuplicateCandidate.objects.count(), 1)
+
+    def test_import_refreshes_each_batch_at_commit(self):
+        """Test que la importación recalcula duplicados al commit de cada lote, sin juntarlos para el final"""
+        from unittest import mock
+        from django.contrib.auth import get_user_model
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from django.test import Client as DjangoTestClient
+        from django.urls import reverse
+        from clients.models import Client
+        from core import dedup
+        from core.middleware import get_audit_context
+        from core.models import DuplicateCandidate
+
+        Client.objects.create(company_name="Alfa SA", name="A", tax_id="30712345671")
+        browser = DjangoTestClient()
+        browser.force_login(get_user_model().objects.create_superuser('carga', password='x'))
+        calls = []
+
+        def run(models):
+            calls.append((get_audit_context() is not None, dict(dedup._deferred)))
+            return original(models)
+
+        original = dedup._run
+        upload = SimpleUploadedFile('clientes.csv', b"company_name,name,tax_id\nAlfa S.A.,B,30-71234567-1\n")
+        with mock.patch.object(dedup, '_run', side_effect=run):
+            response = browser.post(reverse('clients:import'), {'file': upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(calls, [(True, {})])
+        self.assertEqual(DuplicateCandidate.objects.count(), 1)
+
+
+class SqliteProfileTests(TestCase):
+    """Tests para el perfil de SQLite de settings y bench_sqlite"""
+
+    def test_pragmas_applied_on_connection(self):
+        """Test que SQLITE_OPTIONS aplica las PRAGMAs y el modo de transacción"""
+        import os
+        import tempfile
+        from django.conf import settings
+        from core.management.commands.bench_sqlite import _connect
+
+        options = settings.SQLITE_OPTIONS
+        self.assertEqual(options['transaction_mode'], 'IMMEDIATE')
+        with tempfile.TemporaryDirectory() as directory:
+            connection = _connect(os.path.join(directory, 'x.sqlite3'), options)
+            self.assertEqual(connection.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+            self.assertEqual(connection.execute('PRAGMA synchronous').fetchone()[0], 1)  # NORMAL
+            self.assertEqual(connection.execute('PRAGMA busy_timeout').fetchone()[0], settings.SQLITE_PRAGMAS['busy_timeout'])
+            self.assertEqual(connection.execute('PRAGMA temp_store').fetchone()[0], 2)  # MEMORY
+            connection.close()
+
+    def test_bench_tuned_profile_has_no_lock_errors(self):
+        """Test que con el perfil configurado ninguna escritura falla por lock"""
+        from django.conf import settings
+        from core.management.commands.bench_sqlite import run_profile
+
+        stats = run_profile(settings.SQLITE_OPTIONS, writers=3, readers=1, transactions=20, rows=5)
+        self.assertEqual((stats['committed'], stats['locked']), (60, 0))
+
+
+class AsyncViewsTests(TestCase):
+    """Tests para las vistas de lectura async (ASGI)"""
+
+    def setUp(self):
+        """Configuración inicial para las pruebas"""
+        from clients.models import Client
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client_obj = Client.objects.create(company_name="Asincrónica SA", name="Ana", tax_id="20-1-1")
+
+    async def test_list_and_detail(self):
+        """Test que el listado y el detalle responden por ASGI"""
+        from django.test import AsyncClient
+        from django.urls import reverse
+
+        client = AsyncClient()
+        response = await client.get(reverse('clients:list'))
+        self.assertContains(response, "Asincrónica SA")
+        response = await client.get(reverse('clients:detail', args=[self.client_obj.pk]))
+        self.assertContains(response, "Asincrónica SA")
+        response = await client.get(reverse('clients:detail', args=[self.client_obj.pk + 100]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_search(self):
+        """Test que la búsqueda FTS responde por ASGI"""
+        from django.test import AsyncClient
+        from django.urls import reverse
+
+        response = await AsyncClient().get(reverse('core:search'), {'q': 'asincronica'})
+        self.assertContains(response, "Asincrónica SA")
+
+    async def test_export_streams_async_iterator(self):
+        """Test que bajo ASGI la exportación usa un iterador async"""
+        from django.test import AsyncClient
+        from django.urls import reverse
+
+        response = await AsyncClient().get(reverse('clients:export'))
+        self.assertTrue(response.is_async)
+        body = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertIn(b'Asincr\xc3\xb3nica SA', body)
+
+    async def test_middleware_exposes_request_in_context(self):
+        """Test que RequestMiddleware publica la request en la ContextVar"""
+        from django.test import AsyncRequestFactory
+        from core.middleware import RequestMiddleware, get_current_request
+
+        seen = []
+
+        async def view(request):
+            seen.append(get_current_request())
+            return None
+
+        request = AsyncRequestFactory().get('/')
+        await RequestMiddleware(view)(request)
+        self.assertEqual(seen, [request])
+        self.assertIsNone(get_current_request())
+
+
+class BenchAsgiTests(TransactionTestCase):
+    """Tests para el comando bench_asgi"""
+
+    def test_bench_asgi(self):
+        """Test que bench_asgi sirve la misma vista por WSGI y por ASGI sin errores"""
+        from django.test.utils import override_settings
+        from django.urls import reverse
+        from core.management.commands.bench_asgi import run_asgi, run_wsgi
+
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            url = reverse('clients:list')
+            self.assertEqual(run_wsgi(url, 4, threads=2, client_delay=0)['errors'], 0)
+            self.assertEqual(run_asgi(url, 4, concurrency=2, client_delay=0)['errors'], 0)
+
+
+class BenchCrudTests(TestCase):
+    """Tests para el comando bench_crud"""
+
+    def test_seed_and_run_report(self):
+        """Test que siembra las tres tablas y mide cada operación con percentiles y consultas"""
+        from clients.models import Client
+        from suppliers.models import Supplier
+        from core.management.commands.bench_crud import run
+        from core.models import AuditLog
+
+        report = run(30, [Client, Supplier], iterations=3)
+        self.assertEqual(Client.objects.count(), 30)
+        self.assertEqual(Supplier.objects.count(), 30)
+        self.assertGreaterEqual(AuditLog.objects.count(), 30)
+        for name in ('clients.list', 'clients.list_deep', 'clients.detail', 'clients.create',
+                     'clients.update', 'clients.delete', 'suppliers.signal_post_save', 'audit.write'):
+            self.assertEqual(report['results'][name]['n'], 3)
+            self.assertLessEqual(report['results'][name]['p50_ms'], report['results'][name]['p99_ms'])
+        self.assertEqual(report['results']['clients.list']['queries'], 1)
+
+    def test_compare_flags_regressions(self):
+        """Test que compare marca p95 peores que la tolerancia y consultas de más"""
+        from core.management.commands.bench_crud import compare
+
+        base = {'results': {'a': {'p95_ms': 10.0, 'queries': 3}, 'b': {'p95_ms': 10.0, 'queries': 3}}}
+        current = {'results': {'a': {'p95_ms': 14.0, 'queries': 3}, 'b': {'p95_ms': 20.0, 'queries': 4}}}
+        regressions = compare(base, current, tolerance=0.5)
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(all(line.startswith('b:') for line in regressions))
+
+
+class ViewBudgetTests(TransactionTestCase):
+    """Tests para las métricas por vista y los presupuestos (core.instrumentation)"""
+
+    def _requests(self):
+        from django.urls import reverse
+        from clients.models import Client
+        from suppliers.models import Supplier
+
+        yield 'get', reverse('core:home'), None, False
+        yield 'get', f"{reverse('core:search')}?q=sa", None, False
+        yield 'get', reverse('core:metrics'), None, False
+        for model in (Client, Supplier):
+            app, kwarg = model._meta.app_label, f'{model._meta.model_name}_id'
+            obj = model.objects.create(company_name='Presupuesto SA', name='Ana', tax_id='20-1-1')
+            data = {'company_name': 'Otra SA', 'name': 'Beto', 'is_active': 'on', kwarg: obj.pk}
+            for name in ('list', 'add', 'export', 'edit_select'):
+                yield 'get', reverse(f'{app}:{name}'), None, False
+            yield 'get', reverse(f'{app}:import'), None, True
+            yield 'get', f"{reverse(f'{app}:autocomplete')}?q=pre", None, False
+            yield 'get', reverse(f'{app}:detail', kwargs={kwarg: obj.pk}), None, False
+            yield 'get', reverse(f'{app}:history', kwargs={kwarg: obj.pk}), None, True
+            yield 'get', reverse(f'{app}:edit', kwargs={kwarg: obj.pk}), None, False
+            yield 'post', reverse(f'{app}:add'), data, False
+            yield 'post', reverse(f'{app}:edit', kwargs={kwarg: obj.pk}), data, False
+            yield 'post', reverse(f'{app}:edit_select'), data, False
+            yield 'post', reverse(f'{app}:delete', kwargs={kwarg: obj.pk}), None, False
+
+    @staticmethod
+    def _url_names():
+        from clients import urls as client_urls
+        from core import urls as core_urls
+        from suppliers import urls as supplier_urls
+
+        for module in (client_urls, supplier_urls, core_urls):
+            for pattern in module.urlpatterns:
+                yield module.app_name, pattern.name
+
+    def test_views_within_budget(self):
+        """Test que cada vista de clients, suppliers y core respeta su presupuesto"""
+        from django.contrib.auth import get_user_model
+        from django.test import Client as DjangoTestClient
+        from django.test.utils import override_settings
+        from core.instrumentation import assert_within_budget
+
+        http = DjangoTestClient()
+        # el historial y la importación exigen permisos
+        admin = DjangoTestClient()
+        admin.force_login(get_user_model().objects.create_superuser('admin', password='x'))
+        seen = set()
+        with override_settings(VIEW_INSTRUMENTATION=True):
+            for method, url, data, as_admin in self._requests():
+                send = getattr(admin if as_admin else http, method)
+                response = send(url, data) if data is not None else send(url)
+                self.assertLess(response.status_code, 400, url)
+                assert_within_budget(response)
+                seen.add(response.view_metrics.view_name)
+        self.assertEqual(seen, {f'{app}:{name}' for app, name in self._url_names()})
+
+    def test_budget_file_lists_every_url(self):
+        """Test que el archivo de presupuestos tiene cada nombre de URL"""
+        from core.instrumentation import load_budgets
+
+        budgets = load_budgets()
+        missing = [f'{app}:{name}' for app, name in self._url_names() if f'{app}:{name}' not in budgets]
+        self.assertEqual(missing, [])
+
+    def test_over_budget_warns_and_sets_header_in_debug(self):
+        """Test que pasarse del presupuesto agrega X-View-Budget con DEBUG y falla en assert_within_budget"""
+        from unittest import mock
+        from django.test import Client as DjangoTestClient
+        from django.test.utils import override_settings
+        from django.urls import reverse
+        from core import instrumentation
+        from clients.models import Client
+
+        Client.objects.create(company_name='Uno SA', name='Ana')
+        budgets = {'clients:list': {'queries': 0}}
+        with override_settings(VIEW_INSTRUMENTATION=True, DEBUG=True), \
+                mock.patch.object(instrumentation, 'load_budgets', return_value=budgets), \
+                self.assertLogs('core.instrumentation', 'WARNING'):
+            response = DjangoTestClient().get(reverse('clients:list'))
+        self.assertEqual(response.view_metrics.queries, 1)
+        self.assertEqual(response[instrumentation.BUDGET_HEADER], 'clients:list queries 1>0')
+        with self.assertRaises(AssertionError):
+            instrumentation.assert_within_budget(response, budgets)
+
+    def test_assert_within_budget_ignores_time_by_default(self):
+        """Test que assert_within_budget controla consultas y no tiempos salvo que se pida"""
+        from django.test import Client as DjangoTestClient
+        from django.test.utils import override_settings
+        from django.urls import reverse
+        from core import instrumentation
+
+        with override_settings(VIEW_INSTRUMENTATION=True):
+            response = DjangoTestClient().get(reverse('core:home'))
+        budgets = {'core:home': {'queries': 0, 'total_ms': 0}}
+        instrumentation.assert_within_budget(response, budgets)
+        with self.assertRaises(AssertionError):
+            instrumentation.assert_within_budget(response, budgets, limits=instrumentation.LIMITS)
+
+    def test_disabled(self):
+        """Test que sin VIEW_INSTRUMENTATION, SERVER_TIMING ni METRICS_ENABLED no se mide"""
+        from django.test import Client as DjangoTestClient
+        from django.test.utils import override_settings
+        from django.urls import reverse
+
+        with override_settings(VIEW_INSTRUMENTATION=False, SERVER_TIMING=False, METRICS_ENABLED=False):
+            response = DjangoTestClient().get(reverse('core:home'))
+        self.assertFalse(hasattr(response, 'view_metrics'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    def test_server_timing_phases(self):
+        """Test que Server-Timing trae db, tpl, audit y total, y que se miden"""
+        import re
+        from django.test import Client as DjangoTestClient
+        from django.test.utils import override_settings
+        from django.urls import reverse
+
+        http = DjangoTestClient()
+        with override_settings(VIEW_INSTRUMENTATION=False, SERVER_TIMING=True):
+            listing = http.get(reverse('clients:list'))
+            created = http.post(reverse('clients:add'), {'company_name': 'Timing SA', 'name': 'Ana', 'is_active': 'on'})
+        header = listing['Server-Timing']
+        self.assertEqual(re.findall(r'(\w+);dur=', header), ['db', 'tpl', 'audit', 'total'])
+        self.assertIn('desc="1 consultas"', header)
+        self.assertGreater(listing.view_metrics.times['tpl'], 0)
+        self.assertEqual(listing.view_metrics.times['audit'], 0)
+        self.assertGreater(created.view_metrics.times['audit'], 0)
+
+
+class MetricsTests(TestCase):
+    """Tests para el endpoint /metrics y la agregación entre procesos (core.metrics)"""
+
+    def setUp(self):
+        import tempfile
+        from django.test.utils import override_settings
+
+        self.directory = tempfile.mkdtemp()
+        self.settings_override = override_settings(METRICS_DIR=self.directory, METRICS_ENABLED=True)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        import shutil
+        from core import metrics
+
+        metrics.clear(self.directory)
+        self.settings_override.disable()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _scrape(self, **extra):
+        from django.urls import reverse
+
+        return self.client.get(reverse('core:metrics'), **extra)
+
+    def test_request_counts_histogram_and_queries(self):
+        """Test que /metrics expone requests, histograma de latencia y consultas por nombre de URL"""
+        from django.urls import reverse
+
+        self.client.get(reverse('clients:list'))
+        self.client.get(reverse('clients:list'))
+        response = self._scrape()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        text = response.content.decode()
+        self.assertIn('# TYPE blc_http_request_duration_seconds histogram', text)
+        self.assertIn('blc_http_requests_total{method="GET",status="200",view="clients:list"} 2.0', text)
+        self.assertIn('blc_http_request_duration_seconds_bucket{view="clients:list",le="+Inf"} 2.0', text)
+        self.assertIn('blc_http_request_duration_seconds_count{view="clients:list"} 2.0', text)
+        self.assertIn('blc_db_queries_total{view="clients:list"} 2.0', text)
+
+    def test_unresolved_urls_share_a_series(self):
+        """Test que las URLs inexistentes cuentan en una sola serie"""
+        self.client.get('/no-existe/1/')
+        self.client.get('/no-existe/2/')
+        text = self._scrape().content.decode()
+        self.assertIn('blc_http_requests_total{method="GET",status="404",view="<unresolved>"} 2.0', text)
+
+    def test_audit_entries_and_login_failures(self):
+        """Test que cuenta las entradas de auditoría por acción y los logins fallidos"""
+        from django.test.utils import override_settings
+        from clients.models import Client
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Client.objects.create(company_name='Métrica SA', name='Ana')
+        with override_settings(LOGIN_FAILURE_SUMMARY_INTERVAL=0), self.captureOnCommitCallbacks(execute=True):
+            self.client.login(username='nadie', password='mal')
+        text = self._scrape().content.decode()
+        self.assertIn('blc_audit_entries_total{action="create"} 1.0', text)
+        self.assertIn('blc_audit_entries_total{action="login_failed"} 1.0', text)
+        self.assertIn('blc_login_failures_total 1.0', text)
+
+    def test_aggregates_across_processes(self):
+        """Test que suma los valores escritos por otro proceso en METRICS_DIR"""
+        import multiprocessing
+        from core import metrics
+
+        metrics.inc('blc_login_failures_total', 2)
+        child = multiprocessing.get_context('fork').Process(target=metrics.inc, args=('blc_login_failures_total', 3))
+        child.start()
+        child.join()
+        self.assertEqual(child.exitcode, 0)
+        self.assertIn('blc_login_failures_total 5.0', metrics.render())
+
+    def test_store_grows(self):
+        """Test que el archivo crece cuando las series no entran en el tamaño inicial"""
+        from core import metrics
+
+        for i in range(3000):
+            metrics.inc('blc_audit_entries_total', action=f'accion-{i}')
+        metrics.inc('blc_audit_entries_total', action='accion-0')
+        values = metrics.collect()
+        self.assertEqual(len(values), 3000)
+        self.assertEqual(values[metrics._key('blc_audit_entries_total', {'action': 'accion-0'})], 2.0)
+
+    def test_forbidden_outside_allowed_ips(self):
+        """Test que /metrics responde 403 a IPs no permitidas salvo a staff"""
+        from django.contrib.auth import get_user_model
+
+        self.assertEqual(self._scrape(REMOTE_ADDR='10.0.0.9').status_code, 403)
+        staff = get_user_model().objects.create_user('ops', password='x', is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self._scrape(REMOTE_ADDR='10.0.0.9').status_code, 200)
+
+
+class AuditLogAdminTests(TestCase):
+    """Tests para el changelist de AuditLog en el admin (cursor, filtros y cantidad aproximada)"""
+
+    def setUp(self):
+        from django.contrib.auth import get_user_model
+
+        self.admin_user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'x')
+        self.client.force_login(self.admin_user)
+
+    def _entries(self, count, **extra):
+        from datetime import timedelta
+        from django.utils import timezone
+        from core.models import AuditLog
+
+        now = timezone.now()
+        return AuditLog.objects.bulk_create([
+            AuditLog(action='update', object_pk=str(i), object_repr=f'Objeto {i}', timestamp=now - timedelta(minutes=i), **extra)
+            for i in range(count)
+        ])
+
+    def _changelist(self, **params):
+        from django.urls import reverse
+
+        return self.client.get(reverse('admin:core_auditlog_changelist'), params)
+
+    def test_keyset_pages(self):
+        """Test que el changelist pagina por cursor y la página siguiente sigue donde terminó la primera"""
+        from django.contrib.admin.views.main import PAGE_VAR
+        from urllib.parse import parse_qs
+
+        self._entries(105)
+        first = self._changelist()
+        self.assertEqual(first.status_code, 200)
+        cl = first.context['cl']
+        self.assertEqual([e.object_pk for e in cl.result_list][:2], ['0', '1'])
+        self.assertEqual(len(cl.result_list), 100)
+        self.assertEqual((cl.result_count, cl.count_kind), (105, 'exact'))
+        self.assertContains(first, 'Siguientes')
+        cursor = parse_qs(cl.next_page_url[1:])[PAGE_VAR][0]
+        second = self._changelist(**{PAGE_VAR: cursor}).context['cl']
+        self.assertEqual([e.object_pk for e in second.result_list], [str(i) for i in range(100, 105)])
+        self.assertIsNone(second.next_page_url)
+
+    def test_invalid_cursor(self):
+        """Test que un cursor inválido vuelve al changelist con ?e=1 en lugar de fallar"""
+        response = self._changelist(p='no-es-un-cursor')
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('e=1', response['Location'])
+
+    def test_filters(self):
+        """Test que los filtros por usuario, tipo de objeto, acción y rango de fechas se aplican"""
+        from datetime import timedelta
+        from django.contrib.contenttypes.models import ContentType
+        from django.utils import timezone
+        from core.models import AuditLog
+        from clients.models import Client
+
+        content_type = ContentType.objects.get_for_model(Client)
+        self._entries(3)
+        mine = self._entries(2, actor=self.admin_user, content_type=content_type)
+        AuditLog.objects.filter(pk=mine[0].pk).update(action='delete', timestamp=timezone.now() - timedelta(days=10))
+        day = (timezone.now() - timedelta(days=10)).date().isoformat()
+
+        def pks(**params):
+            return {e.pk for e in self._changelist(**params).context['cl'].result_list}
+
+        self.assertEqual(pks(actor='admin'), {e.pk for e in mine})
+        self.assertEqual(pks(actor='nadie'), set())
+        self.assertEqual(pks(content_type='clients.client'), {e.pk for e in mine})
+        self.assertEqual(pks(content_type='no.existe'), set())
+        self.assertEqual(pks(action='delete'), {mine[0].pk})
+        self.assertEqual(pks(desde=day, hasta=day), {mine[0].pk})
+        self.assertEqual(len(pks(desde=day)), 5)
+
+    def test_filter_form_keeps_other_filters(self):
+        """Test que el formulario de un filtro conserva los demás filtros como campos ocultos"""
+        response = self._changelist(action='update', actor='admin')
+        self.assertContains(response, '<input type="hidden" name="action" value="update">', html=False)
+        self.assertContains(response, 'name="actor" value="admin"', html=False)
+        self.assertContains(response, 'data-autocomplete-url=', html=False)
+        self.assertIsNone(response.context['cl'].date_hierarchy)
+
+    def test_invalid_date(self):
+        """Test que una fecha mal escrita vuelve al changelist con ?e=1"""
+        response = self._changelist(desde='31/12/2024')
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('e=1', response['Location'])
+
+    def test_approximate_count(self):
+        """Test que approximate_count estima sin filtros, cuenta con tope con filtros y es exacto debajo del tope"""
+        from django.db import connection
+        from core.models import AuditLog
+        from core.pagination import approximate_count
+
+        self._entries(5)
+        self.assertEqual(approximate_count(AuditLog.objects.all(), limit=10), (5, 'exact'))
+        self.assertEqual(approximate_count(AuditLog.objects.filter(action='update'), limit=3), (3, 'more'))
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.assertEqual(approximate_count(AuditLog.objects.all(), limit=3), (5, 'estimate'))
+
+
+class EntityHistoryTests(TestCase):
+    """Tests para el panel de historial de auditoría en el detalle (core.views.entity_history)"""
+
+    def _login_auditor(self):
+        from django.contrib.auth import get_user_model
+        from django.contrib.auth.models import Permission
+
+        user = get_user_model().objects.create_user('auditor', password='x', is_staff=True)
+        user.user_permissions.add(Permission.objects.get(content_type__app_label='core', codename='view_auditlog'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.force_login(user)
+
+    def _entries(self, obj, count, actor=None):
+        from datetime import timedelta
+        from django.contrib.contenttypes.models import ContentType
+        from django.utils import timezone
+        from core.models import AuditLog
+
+        now = timezone.now()
+        content_type = ContentType.objects.get_for_model(obj)
+        AuditLog.objects.bulk_create([
+            AuditLog(action='update', content_type=content_type, object_pk=str(obj.pk), object_repr=str(obj),
+                     actor=actor, changes={'name': [f'Antes {i}', f'Después {i}']}, timestamp=now - timedelta(minutes=i))
+            for i in range(count)
+        ])
+
+    def test_detail_includes_lazy_panel(self):
+        """Test que el detalle trae el panel con la URL del historial y sin consultar la auditoría"""
+        from django.urls import reverse
+        from clients.models import Client
+
+        client = Client.objects.create(company_name='Historia SA', name='Ana')
+        self._login_auditor()
+        response = self.client.get(reverse('clients:detail', args=[client.pk]))
+        self.assertContains(response, 'data-history')
+        self.assertContains(response, reverse('clients:history', args=[client.pk]))
+
+    def test_history_requires_audit_permission(self):
+        """Test que el historial y su panel exigen staff con permiso de lectura de auditoría"""
+        from django.contrib.auth import get_user_model
+        from django.urls import reverse
+        from clients.models import Client
+
+        client = Client.objects.create(company_name='Historia SA', name='Ana')
+        url = reverse('clients:history', args=[client.pk])
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(get_user_model().objects.create_user('ana', password='x', is_staff=True))
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertNotContains(self.client.get(reverse('clients:detail', args=[client.pk])), 'data-history')
+        self._login_auditor()
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_history_shows_changes_newest_first(self):
+        """Test que el historial muestra alta y modificación con los cambios, la más nueva primero"""
+        from django.contrib.auth import get_user_model
+        from django.urls import reverse
+        from suppliers.models import Supplier
+
+        user = get_user_model().objects.create_user('ana', password='x')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.force_login(user)
+            supplier = Supplier.objects.create(company_name='Historia SA', name='Ana')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('suppliers:edit', args=[supplier.pk]), {
+                'company_name': 'Historia SA', 'name': 'Beto', 'is_active': 'on',
+            })
+        self.assertEqual(response.status_code, 302)
+        self._login_auditor()
+        content = self.client.get(reverse('suppliers:history', args=[supplier.pk])).content.decode()
+        self.assertLess(content.index('Modificación'), content.index('Alta'))
+        self.assertIn('Ana → Beto', content)
+        self.assertIn('ana', content)
+
+    def test_pages_with_bounded_queries(self):
+        """Test que el historial pagina por cursor con la misma cantidad de consultas en cada página"""
+        import re
+        from django.contrib.auth import get_user_model
+        from django.urls import reverse
+        from clients.models import Client
+
+        client = Client.objects.create(company_name='Historia SA', name='Ana')
+        other = Client.objects.create(company_name='Otra SA', name='Beto')
+        self._entries(client, 25, actor=get_user_model().objects.create_user('ana', password='x'))
+        self._entries(other, 3)
+        url = reverse('clients:history', args=[client.pk])
+        self._login_auditor()
+        self.client.get(url)  # ContentType queda en caché
+
+        with self.assertNumQueries(6):  # sesión, usuario, permisos (2), página y actores
+            first = self.client.get(url).content.decode()
+        self.assertEqual(first.count('Después'), 20)
+        next_url = re.search(r'data-history-next><a href="([^"]+)"', first).group(1)
+        with self.assertNumQueries(6):
+            second = self.client.get(next_url).content.decode()
+        self.assertEqual(second.count('Después'), 5)
+        self.assertIn('Antes 24', second)
+        self.assertNotIn('data-history-next', second)
+
+    def test_empty_history_and_invalid_cursor(self):
+        """Test que un objeto sin historial lo indica y que un cursor inválido da 404"""
+        from django.urls import reverse
+        from clients.models import Client
+
+        client = Client.objects.create(company_name='Historia SA', name='Ana')
+        url = reverse('clients:history', args=[client.pk])
+        self._login_auditor()
+        self.assertContains(self.client.get(url), 'Sin cambios registrados.')
+        self.assertEqual(self.client.get(url, {'cursor': 'x'}).status_code, 404)
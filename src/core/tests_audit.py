@@ -14,11 +14,13 @@ class AuditLogTests(TestCase):
 
     def test_create_client_generates_auditlog(self):
         # autenticamos para que el middleware capture el user
-        self.http.login(username='tester', password='pass')
-        resp = self.http.post(reverse('clients:add'), {
-            'company_name': 'Audit Co',
-            'name': 'Audit Contact'
-        })
+        # las entradas se escriben al commit de la transacción
+        with self.captureOnCommitCallbacks(execute=True):
+            self.http.login(username='tester', password='pass')
+            resp = self.http.post(reverse('clients:add'), {
+                'company_name': 'Audit Co',
+                'name': 'Audit Contact'
+            })
         # debería haberse creado un cliente
         self.assertEqual(Client.objects.filter(company_name='Audit Co').count(), 1)
         # y al menos una entrada de auditlog
@@ -26,7 +28,360 @@ class AuditLogTests(TestCase):
 
     def test_delete_client_generates_auditlog(self):
         client = Client.objects.create(company_name='ToDelete', name='X')
-        self.http.login(username='tester', password='pass')
-        resp = self.http.post(reverse('clients:delete', args=[client.id]))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.http.login(username='tester', password='pass')
+            resp = self.http.post(reverse('clients:delete', args=[client.id]))
         self.assertFalse(Client.objects.filter(id=client.id).exists())
         self.assertTrue(AuditLog.objects.filter(action='delete', object_pk=str(client.id)).exists())
+
+
+class RequestContextTests(TestCase):
+    """Tests para el contexto de auditoría por request de RequestMiddleware"""
+
+    def test_metadata_is_read_once_per_request(self):
+        """Test que IP, path y user agent se extraen una vez y se reutilizan"""
+        from unittest import mock
+        from core import audit
+
+        User = get_user_model()
+        User.objects.create_user(username='ctx', password='pass')
+        http = DjangoTestClient(HTTP_USER_AGENT='Agente/1.0', REMOTE_ADDR='10.0.0.9')
+        with self.captureOnCommitCallbacks(execute=True):
+            http.login(username='ctx', password='pass')
+            with mock.patch.object(audit, 'RequestContext', wraps=audit.RequestContext) as built:
+                http.post(reverse('clients:add'), {'company_name': 'Ctx SA', 'name': 'Ana'})
+        self.assertEqual(built.call_count, 1)
+        entry = AuditLog.objects.get(action='create')
+        self.assertEqual(
+            (entry.actor.username, entry.ip_address, entry.path, entry.user_agent),
+            ('ctx', '10.0.0.9', reverse('clients:add'), 'Agente/1.0'),
+        )
+
+    def test_context_is_cleared_after_request(self):
+        """Test que fuera de una request los signals no heredan la última"""
+        from core.middleware import get_audit_context
+
+        DjangoTestClient().get(reverse('clients:list'))
+        self.assertIsNone(get_audit_context())
+        with self.captureOnCommitCallbacks(execute=True):
+            Client.objects.create(company_name='Shell SA', name='X')
+        entry = AuditLog.objects.get(action='create')
+        self.assertEqual((entry.actor, entry.ip_address, entry.path), (None, None, None))
+
+
+class AuditRegistryTests(TestCase):
+    """Tests para el registro de modelos auditados (core.registry)"""
+
+    def test_only_registered_models_reach_the_handlers(self):
+        """Test que guardar un modelo no registrado no ejecuta los handlers de auditoría"""
+        from unittest import mock
+        from core import registry
+
+        self.assertIn(Client, registry.audited_models())
+        with mock.patch.object(registry, 'get', wraps=registry.get) as get, \
+                self.captureOnCommitCallbacks(execute=True):
+            user = get_user_model().objects.create_user(username='sin_auditoria')
+            user.delete()
+            get.assert_not_called()
+            Client.objects.create(company_name='Registrada SA', name='Ana')
+            get.assert_called_once_with(Client)
+        self.assertEqual(list(AuditLog.objects.values_list('action', 'object_repr')), [('create', 'Registrada SA - Ana')])
+
+    def test_repr_and_fields(self):
+        """Test que object_repr y fields del registro definen lo que se guarda"""
+        from core import registry
+        from suppliers.models import Supplier
+
+        registry.register(Supplier, object_repr=lambda obj: f'Proveedor {obj.tax_id}', fields=['name'])
+        self.addCleanup(registry.register, Supplier)
+        with self.captureOnCommitCallbacks(execute=True):
+            supplier = Supplier.objects.create(company_name='Campos SA', name='Ana', tax_id='30-1')
+            supplier = Supplier.objects.get(pk=supplier.pk)
+            supplier.name = 'Beto'
+            supplier.email = 'beto@example.com'
+            supplier.save()
+        entry = AuditLog.objects.get(action='update')
+        self.assertEqual(entry.object_repr, 'Proveedor 30-1')
+        self.assertEqual(entry.changes, {'name': ['Ana', 'Beto']})
+        self.assertEqual(entry.content_type.model_class(), Supplier)
+
+    def test_invalid_registrations(self):
+        """Test que no se puede registrar AuditLog ni campos inexistentes"""
+        from core import registry
+
+        with self.assertRaises(ValueError):
+            registry.register(AuditLog)
+        with self.assertRaises(ValueError):
+            registry.register(Client, fields=['no_existe'])
+        self.assertIsNone(registry.get(get_user_model()))
+
+
+class AuditLookupTests(TestCase):
+    """Tests para las tablas de lookup de path y user_agent (core.lookups)"""
+
+    def _write(self, *paths, user_agent='Mozilla/5.0'):
+        from core import audit
+
+        audit.write([AuditLog(action='login', object_repr=f'evento {i}', path=path, user_agent=user_agent)
+                     for i, path in enumerate(paths)])
+
+    def _verify(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        out = StringIO()
+        call_command('verify_audit_chain', '--workers', '1', '--full', '--no-checkpoint', stdout=out)
+        return out.getvalue()
+
+    def test_values_are_stored_once(self):
+        """Test que cada path y user agent distinto se guarda una sola vez y se lee transparente"""
+        from core.models import AuditPath, AuditUserAgent
+
+        self._write('/a/', '/b/', '/a/')
+        self._write('/a/', user_agent=None)
+        self.assertEqual(sorted(AuditPath.objects.values_list('value', flat=True)), ['/a/', '/b/'])
+        self.assertEqual(list(AuditUserAgent.objects.values_list('value', flat=True)), ['Mozilla/5.0'])
+        self.assertFalse(AuditLog.objects.filter(legacy_path__isnull=False).exists())
+        entries = list(AuditLog.objects.order_by('pk'))
+        self.assertEqual([(e.path, e.user_agent) for e in entries], [
+            ('/a/', 'Mozilla/5.0'), ('/b/', 'Mozilla/5.0'), ('/a/', 'Mozilla/5.0'), ('/a/', None),
+        ])
+        self.assertEqual(
+            list(AuditLog.objects.with_metadata().order_by('pk').values_list('path', 'user_agent'))[1],
+            ('/b/', 'Mozilla/5.0'),
+        )
+        self.assertIn('4 entradas verificadas', self._verify())
+
+    def test_backfill_moves_legacy_text(self):
+        """Test que intern_audit_metadata pasa el texto viejo a las tablas de lookup sin romper la cadena"""
+        from io import StringIO
+        from django.core.management import call_command
+        from core.models import AuditPath, AuditUserAgent
+
+        self._write('/viejo/1/', '/viejo/2/', '/viejo/1/')
+        # entradas como las escribía la versión anterior: texto en las columnas de siempre
+        for entry in AuditLog.objects.all():
+            AuditLog.objects.filter(pk=entry.pk).update(
+                legacy_path=entry.path, legacy_user_agent=entry.user_agent, path_ref=None, user_agent_ref=None,
+            )
+        AuditPath.objects.all().delete()
+        AuditUserAgent.objects.all().delete()
+        self.assertIn('3 entradas verificadas', self._verify())
+
+        out = StringIO()
+        call_command('intern_audit_metadata', '--batch-size', '2', stdout=out)
+        self.assertIn('3 entradas', out.getvalue())
+        self.assertFalse(AuditLog.objects.filter(legacy_path__isnull=False).exists())
+        self.assertFalse(AuditLog.objects.filter(legacy_user_agent__isnull=False).exists())
+        self.assertEqual(AuditPath.objects.count(), 2)
+        self.assertEqual(
+            list(AuditLog.objects.order_by('pk').values_list('path_ref__value', 'user_agent_ref__value')),
+            [('/viejo/1/', 'Mozilla/5.0'), ('/viejo/2/', 'Mozilla/5.0'), ('/viejo/1/', 'Mozilla/5.0')],
+        )
+        self.assertIn('3 entradas verificadas', self._verify())
+        call_command('intern_audit_metadata', stdout=out)
+        self.assertIn('0 entradas', out.getvalue())
+
+    def test_queries_by_path_and_user_agent(self):
+        """Test que by_path(), by_user_agent() y metadata_q() filtran por los valores, también los viejos"""
+        from django.db.models import Q
+        from core.models import metadata_q
+
+        self._write('/a/', '/b/', '/a/')
+        legacy = AuditLog.objects.order_by('pk').last()
+        AuditLog.objects.filter(pk=legacy.pk).update(legacy_path='/a/', path_ref=None)
+
+        self.assertEqual(AuditLog.objects.by_path('/a/').count(), 2)
+        self.assertEqual(AuditLog.objects.exclude(metadata_q('path', 'exact', '/a/')).get().object_repr, 'evento 1')
+        self.assertEqual(AuditLog.objects.by_path('/b', 'startswith').get().object_repr, 'evento 1')
+        self.assertEqual(AuditLog.objects.by_path(['/b/', '/a/'], 'in').count(), 3)
+        self.assertEqual(AuditLog.objects.by_user_agent('mozilla', 'icontains').count(), 3)
+        self.assertFalse(AuditLog.objects.by_path(None).exists())
+        self.assertEqual(AuditLog.objects.by_path(False, 'isnull').count(), 3)
+        self.assertEqual(
+            AuditLog.objects.filter(Q(object_repr='evento 1') | metadata_q('path', 'exact', '/a/')).count(), 3,
+        )
+        self.assertEqual(
+            list(AuditLog.objects.with_metadata().order_by('pk').values_list('path', flat=True)), ['/a/', '/b/', '/a/'],
+        )
+
+    def test_reading_values_does_not_query_per_row(self):
+        """Test que leer path y user_agent de entradas cargadas no consulta las tablas de lookup"""
+        from core import lookups
+
+        self._write('/a/', '/b/', '/c/')
+        lookups._values.clear()
+        with self.assertNumQueries(1):
+            entries = list(AuditLog.objects.order_by('pk'))
+            self.assertEqual([(e.path, e.user_agent) for e in entries], [
+                ('/a/', 'Mozilla/5.0'), ('/b/', 'Mozilla/5.0'), ('/c/', 'Mozilla/5.0'),
+            ])
+
+    def test_admin_and_api_show_values(self):
+        """Test que el admin y la API muestran path y user agent desde las tablas de lookup"""
+        self._write('/clients/edit/7/', user_agent='Navegador/1.0')
+        entry = AuditLog.objects.get()
+        staff = get_user_model().objects.create_superuser(username='admin', password='pass')
+        http = DjangoTestClient()
+        http.force_login(staff)
+        response = http.get(reverse('admin:core_auditlog_change', args=[entry.pk]))
+        self.assertContains(response, '/clients/edit/7/')
+        self.assertContains(response, 'Navegador/1.0')
+        response = http.get(reverse('admin:core_auditlog_changelist'), {'q': 'Navegador'})
+        self.assertContains(response, 'evento 0')
+        response = http.get(reverse('api:audit'), {'fields': 'id,path,user_agent'})
+        self.assertEqual(response.json()['results'], [
+            {'id': entry.pk, 'path': '/clients/edit/7/', 'user_agent': 'Navegador/1.0'},
+        ])
+
+
+class LoginThrottleTests(TestCase):
+    """Tests para el límite de intentos de login y el resumen de fallos (core.throttle)"""
+
+    def setUp(self):
+        from django.test.utils import override_settings
+
+        self.settings_override = override_settings(
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'throttle-tests'}},
+            LOGIN_THROTTLE_FREE=100,
+            LOGIN_FAILURE_SUMMARY_INTERVAL=60,
+        )
+        self.settings_override.enable()
+        self.http = DjangoTestClient(REMOTE_ADDR='10.1.1.1')
+        self.user = get_user_model().objects.create_user(username='ana', password='correcta')
+
+    def tearDown(self):
+        from django.core.cache import cache
+        from core import throttle
+
+        cache.clear()
+        throttle._pending.clear()
+        throttle._written.clear()
+        throttle._budget[:] = [float('-inf'), 0]
+        self.settings_override.disable()
+
+    def _fail(self, username='ana'):
+        return self.http.post(reverse('admin:login'), {'username': username, 'password': 'mal'})
+
+    def test_failures_are_coalesced_per_ip(self):
+        """Test que muchos fallos de una IP dejan una entrada inmediata y un resumen con la cuenta"""
+        from core import throttle
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(30):
+                self._fail(f'usuario{i}')
+        self.assertEqual(AuditLog.objects.filter(action='login_failed').count(), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            throttle.flush()
+        first, summary = AuditLog.objects.filter(action='login_failed').order_by('id')
+        self.assertEqual(first.changes['count'], 1)
+        self.assertEqual(summary.changes['count'], 29)
+        self.assertEqual(len(summary.changes['usernames']), throttle.MAX_USERNAMES)
+        self.assertLessEqual(summary.changes['first_seen'], summary.changes['last_seen'])
+        self.assertEqual((summary.ip_address, summary.actor), ('10.1.1.1', None))
+        self.assertNotIn('password', summary.object_repr)
+
+    def test_progressive_delay(self):
+        """Test que desde LOGIN_THROTTLE_FREE fallos el login responde 429 y la demora se duplica"""
+        import time
+        from unittest import mock
+        from django.test.utils import override_settings
+        from core import throttle
+
+        with override_settings(LOGIN_THROTTLE_FREE=3), self.captureOnCommitCallbacks(execute=True):
+            for _ in range(3):
+                self.assertEqual(self._fail().status_code, 200)
+            blocked = self._fail()
+            self.assertEqual(blocked.status_code, 429)
+            self.assertEqual(blocked['Retry-After'], '1')
+            # con otro usuario desde la misma IP también se espera
+            self.assertEqual(self._fail('beto').status_code, 429)
+            later = time.time() + 2
+            with mock.patch.object(throttle.time, 'time', return_value=later):
+                self.assertEqual(self._fail().status_code, 200)
+                self.assertEqual(throttle.retry_after('10.1.1.1', 'ana', now=later), 2)
+            throttle.flush()
+        summary = AuditLog.objects.filter(action='login_failed').order_by('id').last()
+        self.assertEqual(summary.changes['blocked'], 2)
+
+    def test_successful_login_resets(self):
+        """Test que un login correcto borra los fallos de la IP y del usuario"""
+        import time
+        from unittest import mock
+        from django.test.utils import override_settings
+        from core import throttle
+
+        # reloj fijo: la demora de 1 segundo no puede vencer entre el fallo y la consulta
+        with override_settings(LOGIN_THROTTLE_FREE=2), self.captureOnCommitCallbacks(execute=True), \
+                mock.patch.object(throttle.time, 'time', return_value=time.time()):
+            self._fail()
+            self._fail()
+            self.assertGreater(throttle.retry_after('10.1.1.1', 'ana'), 0)
+            throttle.reset('10.1.1.1', 'ana')
+            response = self.http.post(reverse('admin:login'), {'username': 'ana', 'password': 'correcta'})
+        self.assertEqual(response.status_code, 200)  # no es staff: el form lo rechaza sin contar un fallo
+        self.assertEqual(throttle.retry_after('10.1.1.1', 'ana'), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.http.login(username='ana', password='correcta')
+        self.assertEqual(throttle.failures('10.1.1.1', 'ana')['user:ana'][0], 0)
+
+    def test_rotating_forwarded_for_does_not_evade_limit(self):
+        """Test que sin proxy de confianza X-Forwarded-For no cambia la IP que se limita"""
+        from django.test.utils import override_settings
+        from core import throttle
+
+        with override_settings(LOGIN_THROTTLE_FREE=3), self.captureOnCommitCallbacks(execute=True):
+            for i in range(3):
+                response = self.http.post(
+                    reverse('admin:login'), {'username': f'usuario{i}', 'password': 'mal'},
+                    HTTP_X_FORWARDED_FOR=f'203.0.113.{i}',
+                )
+                self.assertEqual(response.status_code, 200)
+            response = self.http.post(
+                reverse('admin:login'), {'username': 'otro', 'password': 'mal'}, HTTP_X_FORWARDED_FOR='203.0.113.99',
+            )
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(list(throttle._written), ['10.1.1.1'])
+
+    def test_trusted_proxy_forwards_client_ip(self):
+        """Test que detrás de un proxy de confianza se toma la última IP que no es de un proxy"""
+        from django.test import RequestFactory
+        from django.test.utils import override_settings
+        from core import throttle
+
+        request = RequestFactory().post('/', REMOTE_ADDR='10.0.0.2', HTTP_X_FORWARDED_FOR='1.1.1.1, 203.0.113.5, 10.0.0.1')
+        self.assertEqual(throttle.client_ip(request), '10.0.0.2')
+        with override_settings(LOGIN_THROTTLE_TRUSTED_PROXIES=['10.0.0.1', '10.0.0.2']):
+            self.assertEqual(throttle.client_ip(request), '203.0.113.5')
+
+    def test_summary_writes_are_capped_across_ips(self):
+        """Test que fallos desde muchas IPs no superan el tope de escrituras y se resumen juntos"""
+        from django.test.utils import override_settings
+        from core import throttle
+
+        with override_settings(LOGIN_FAILURE_SUMMARY_MAX=3, LOGIN_THROTTLE_TRUSTED_PROXIES=['10.1.1.1']), \
+                self.captureOnCommitCallbacks(execute=True):
+            for i in range(10):
+                self.http.post(
+                    reverse('admin:login'), {'username': 'ana', 'password': 'mal'}, HTTP_X_FORWARDED_FOR=f'203.0.113.{i}',
+                )
+        self.assertEqual(AuditLog.objects.filter(action='login_failed').count(), 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            throttle.flush()
+        overflow = AuditLog.objects.filter(action='login_failed').order_by('id').last()
+        self.assertIsNone(overflow.ip_address)
+        self.assertEqual(overflow.changes['count'], 7)
+        self.assertEqual(overflow.changes['ips'], [f'203.0.113.{i}' for i in range(3, 10)])
+
+    def test_sliding_window(self):
+        """Test que los fallos del balde anterior pesan según lo que queda de él en la ventana"""
+        from django.test.utils import override_settings
+        from core import throttle
+
+        with override_settings(LOGIN_THROTTLE_WINDOW=100):
+            cache = throttle.get_cache()
+            for _ in range(4):
+                throttle._hit(cache, 'ip:10.9.9.9', 1000.0)
+            self.assertEqual(throttle.failures('10.9.9.9', None, now=1050.0)['ip:10.9.9.9'][0], 4)
+            self.assertEqual(throttle.failures('10.9.9.9', None, now=1125.0)['ip:10.9.9.9'][0], 3)
+            self.assertEqual(throttle.failures('10.9.9.9', None, now=1200.0)['ip:10.9.9.9'][0], 0)
@@ -0,0 +1,306 @@
+"""Límite de intentos de login y auditoría resumida de los fallidos.
+
+Contadores: cada login fallido suma en una ventana deslizante por IP y otra
+por usuario, guardadas en la caché `LOGIN_THROTTLE_CACHE` (compartida entre
+workers si lo es la caché). La ventana se aproxima con dos baldes fijos de
+`LOGIN_THROTTLE_WINDOW` segundos: el actual más el anterior ponderado por lo
+que queda de él dentro de la ventana. Dos `incr` por fallo y un `get_many`
+por intento de login.
+
+Demora progresiva: con `LOGIN_THROTTLE_FREE` fallos o más en la ventana, el
+siguiente intento tiene que esperar 2^(fallos - FREE) segundos desde el
+último fallo (hasta `LOGIN_THROTTLE_MAX_DELAY`). `login_throttled` envuelve
+la vista de login y responde 429 con `Retry-After` sin autenticar, así un
+intento bloqueado no consulta la base ni ocupa un worker esperando.
+
+La IP es `REMOTE_ADDR`. `X-Forwarded-For` lo escribe el cliente y con
+rotarlo se esquivaría el límite por IP, así que sólo se lee si la conexión
+viene de un proxy de `LOGIN_THROTTLE_TRUSTED_PROXIES`: la IP es la última
+de la cadena que no es de un proxy de confianza.
+
+Auditoría: en lugar de una entrada `login_failed` por intento, cada proceso
+acumula los fallos por IP y escribe como mucho una entrada cada
+`LOGIN_FAILURE_SUMMARY_INTERVAL` segundos, con `changes` = `count`,
+`blocked` (intentos rechazados con 429), `first_seen`, `last_seen` y hasta
+`MAX_USERNAMES` usuarios probados. El primer fallo de una IP se escribe en el
+momento; lo que queda pendiente al terminar un ataque lo escribe un timer.
+AuditLog es append-only (cadena de hashes), así que el resumen no se
+actualiza en el lugar: cada intervalo agrega una entrada nueva.
+
+Las escrituras tienen además un tope total: como mucho
+`LOGIN_FAILURE_SUMMARY_MAX` resúmenes por intervalo y por proceso. Se siguen
+por separado hasta esa cantidad de IPs; los fallos de las demás se juntan en
+un único resumen sin IP (`changes['ips']` lleva una muestra). Un ataque
+desde muchas IPs no multiplica las escrituras.
+"""
+import math
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import close_old_connections
+from django.http import HttpResponse
+
+from core import audit, metrics
+
+MAX_USERNAMES = 10
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def get_cache():
+    return caches[_setting('LOGIN_THROTTLE_CACHE', 'default')]
+
+
+def client_ip(request):
+    """IP de la request para los contadores (ver docstring del módulo)."""
+    if request is None:
+        return None
+    meta = request.META
+    remote = meta.get('REMOTE_ADDR')
+    trusted = _setting('LOGIN_THROTTLE_TRUSTED_PROXIES', ())
+    if remote not in trusted:
+        return remote
+    forwarded = [ip.strip() for ip in meta.get('HTTP_X_FORWARDED_FOR', '').split(',') if ip.strip()]
+    for ip in reversed(forwarded):
+        if ip not in trusted:
+            return ip
+    return remote
+
+
+def _keys(ip, username):
+    keys = []
+    if ip:
+        keys.append(f'ip:{ip}')
+    if username:
+        keys.append(f'user:{username.lower()[:150]}')
+    return keys
+
+
+def _bucket_key(key, bucket):
+    return f'login-failures:{key}:{bucket}'
+
+
+def _last_key(key):
+    return f'login-failures:{key}:last'
+
+
+def _window():
+    return _setting('LOGIN_THROTTLE_WINDOW', 900)
+
+
+def _hit(cache, key, now):
+    window = _window()
+    bucket = int(now // window)
+    name = _bucket_key(key, bucket)
+    cache.add(name, 0, timeout=2 * window)
+    try:
+        cache.incr(name)
+    except ValueError:  # expiró entre add e incr
+        cache.set(name, 1, timeout=2 * window)
+    cache.set(_last_key(key), now, timeout=2 * window)
+
+
+def failures(ip, username, now=None):
+    """`{clave: (fallos en la ventana, último fallo)}` para la IP y el usuario."""
+    now = time.time() if now is None else now
+    window = _window()
+    bucket = int(now // window)
+    keys = _keys(ip, username)
+    names = [name for key in keys for name in (_bucket_key(key, bucket), _bucket_key(key, bucket - 1), _last_key(key))]
+    values = get_cache().get_many(names) if names else {}
+    weight = 1 - (now % window) / window
+    result = {}
+    for key in keys:
+        current = values.get(_bucket_key(key, bucket), 0)
+        previous = values.get(_bucket_key(key, bucket - 1), 0)
+        result[key] = (current + previous * weight, values.get(_last_key(key)))
+    return result
+
+
+def retry_after(ip, username, now=None):
+    """Segundos que faltan para poder intentar de nuevo (0 si no hay demora)."""
+    now = time.time() if now is None else now
+    free = _setting('LOGIN_THROTTLE_FREE', 5)
+    max_delay = _setting('LOGIN_THROTTLE_MAX_DELAY', 300)
+    wait = 0.0
+    for count, last in failures(ip, username, now).values():
+        if count >= free and last is not None:
+            delay = min(2 ** (int(count) - free), max_delay)
+            wait = max(wait, last + delay - now)
+    return math.ceil(wait) if wait > 0 else 0
+
+
+def reset(ip, username):
+    """Olvida los fallos de la IP y del usuario (login correcto)."""
+    window = _window()
+    bucket = int(time.time() // window)
+    get_cache().delete_many([
+        name for key in _keys(ip, username)
+        for name in (_bucket_key(key, bucket), _bucket_key(key, bucket - 1), _last_key(key))
+    ])
+
+
+# --- Resumen de auditoría (por proceso) ----------------------------------------
+
+# clave en `_pending` del resumen de las IPs que exceden el tope
+OVERFLOW = '*'
+
+
+class _Summary:
+    __slots__ = ('count', 'blocked', 'first_seen', 'last_seen', 'usernames', 'ips', 'path', 'user_agent')
+
+    def __init__(self, now):
+        self.count = 0
+        self.blocked = 0
+        self.first_seen = self.last_seen = now
+        self.usernames = []
+        self.ips = []
+        self.path = self.user_agent = None
+
+    def add(self, now, username, fields, blocked, ip=None):
+        if blocked:
+            self.blocked += 1
+        else:
+            self.count += 1
+        self.last_seen = now
+        if username and username not in self.usernames and len(self.usernames) < MAX_USERNAMES:
+            self.usernames.append(username[:150])
+        if ip and ip not in self.ips and len(self.ips) < MAX_USERNAMES:
+            self.ips.append(ip)
+        self.path = fields.get('path') or self.path
+        self.user_agent = fields.get('user_agent') or self.user_agent
+
+    def entry_fields(self, ip):
+        def iso(value):
+            return datetime.fromtimestamp(value, dt_timezone.utc).isoformat()
+        changes = {
+            'count': self.count,
+            'blocked': self.blocked,
+            'first_seen': iso(self.first_seen),
+            'last_seen': iso(self.last_seen),
+            'usernames': self.usernames,
+        }
+        if ip == OVERFLOW:
+            ip = None
+            changes['ips'] = self.ips
+        return {
+            'action': 'login_failed',
+            'actor': None,  # un intento fallido no tiene actor
+            'content_type': None,
+            'object_pk': None,
+            'object_repr': ', '.join(self.usernames)[:255] or None,
+            'changes': changes,
+            'ip_address': ip,
+            'path': self.path,
+            'user_agent': self.user_agent,
+        }
+
+
+_pending = {}
+_written = {}  # ip -> cuándo se escribió su último resumen
+_budget = [-math.inf, 0]  # inicio del intervalo actual, resúmenes escritos en él
+_lock = threading.Lock()
+_timer = None
+
+
+def _max_summaries():
+    return _setting('LOGIN_FAILURE_SUMMARY_MAX', 20)
+
+
+def _due(now, force):
+    """Saca de `_pending` los resúmenes que ya se pueden escribir, sin pasar
+    del tope de escrituras del intervalo."""
+    global _timer
+    interval = _setting('LOGIN_FAILURE_SUMMARY_INTERVAL', 60)
+    with _lock:
+        if now - _budget[0] >= interval:
+            _budget[:] = [now, 0]
+        ready = []
+        for ip in _pending:
+            if not force and _budget[1] + len(ready) >= _max_summaries():
+                break
+            if force or now - _written.get(ip, -math.inf) >= interval:
+                ready.append(ip)
+        _budget[1] += len(ready)
+        summaries = [(ip, _pending.pop(ip)) for ip in ready]
+        for ip in ready:
+            _written[ip] = now
+        # una IP sin actividad en el intervalo se olvida: su próximo fallo se
+        # escribe en el momento
+        for ip in [ip for ip, at in _written.items() if now - at >= interval and ip not in _pending]:
+            del _written[ip]
+        if _pending and _timer is None:
+            _timer = threading.Timer(interval, _flush_from_timer)
+            _timer.daemon = True
+            _timer.start()
+    return summaries
+
+
+def _write(summaries):
+    for ip, summary in summaries:
+        audit.record(**summary.entry_fields(ip))
+
+
+def _flush_from_timer():
+    global _timer
+    with _lock:
+        _timer = None
+    try:
+        _write(_due(time.time(), force=False))
+    finally:
+        close_old_connections()
+
+
+def flush():
+    """Escribe ya todos los resúmenes pendientes de este proceso."""
+    _write(_due(time.time(), force=True))
+
+
+def _note(request, username, blocked):
+    now = time.time()
+    fields = audit.request_fields(request)
+    ip = client_ip(request)
+    with _lock:
+        key = ip
+        if ip not in _pending and ip not in _written and len(_pending) + len(_written) >= _max_summaries():
+            key = OVERFLOW
+        summary = _pending.get(key)
+        if summary is None:
+            summary = _pending[key] = _Summary(now)
+        summary.add(now, username, fields, blocked, ip=ip if key == OVERFLOW else None)
+    _write(_due(now, force=False))
+
+
+def login_failed(request, username):
+    """Cuenta un login fallido (handler de `user_login_failed`)."""
+    cache = get_cache()
+    now = time.time()
+    for key in _keys(client_ip(request), username):
+        _hit(cache, key, now)
+    _note(request, username, blocked=False)
+
+
+def login_throttled(view):
+    """Rechaza con 429 los POST de login de una IP o usuario con demora vigente."""
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        if request.method == 'POST':
+            username = request.POST.get('username', '')
+            wait = retry_after(client_ip(request), username)
+            if wait:
+                metrics.inc('blc_login_throttled_total')
+                _note(request, username, blocked=True)
+                response = HttpResponse(
+                    f"Demasiados intentos fallidos. Probá de nuevo en {wait} segundos.",
+                    status=429, content_type='text/plain; charset=utf-8',
+                )
+                response['Retry-After'] = str(wait)
+                return response
+        return view(request, *args, **kwargs)
+    return wrapped
@@ -5,4 +5,6 @@ app_name = 'core'
 
 urlpatterns = [
     path('', views.home, name='home'),
-]
\ No newline at end of file
+    path('search/', views.entity_search, name='search'),
+    path('metrics', views.metrics, name='metrics'),
+]
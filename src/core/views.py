@@ -1,5 +1,220 @@
+import io
+import tempfile
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.handlers.asgi import ASGIRequest
+from django.conf import settings
+from django.db.models import Prefetch
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
+from django.urls import reverse
+
+from core import cache, export, importer, metrics as app_metrics, search
+from core.models import ENTITY_LIST_FIELDS, AuditLog
+from core.pagination import InvalidCursor, KeysetPaginator, parse_active_filter
+
+SEARCH_LIMIT = 50
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 50
+HISTORY_PAGE_SIZE = 20
+HISTORY_ORDERING = ('-timestamp', '-id')
+HISTORY_ACTIONS = {'create': 'Alta', 'update': 'Modificación', 'delete': 'Baja', 'merge': 'Fusión'}
+HISTORY_PERM = 'core.view_auditlog'
+
+
+async def arender(request, template_name, context=None):
+    """`render()` para vistas async.
+
+    Los mensajes pendientes están en la sesión (base de datos): se cargan
+    antes en un hilo, así el template no toca la base desde el event loop.
+    """
+    await cache.ahas_pending_messages(request)
+    return render(request, template_name, context)
+
+
+def _aiterate(chunks):
+    """Iterador async sobre un generador sync que lee de la base.
+
+    Cada bloque se pide con `sync_to_async` en el hilo de la request (el
+    cursor del servidor no puede cambiar de hilo); entre bloque y bloque el
+    event loop queda libre para otras requests.
+    """
+    step = sync_to_async(next, thread_sensitive=True)
+    close = sync_to_async(getattr(chunks, 'close', lambda: None), thread_sensitive=True)
+
+    async def stream():
+        done = object()
+        try:
+            while (chunk := await step(chunks, done)) is not done:
+                yield chunk
+        finally:
+            await close()
+    return stream()
+
 
 # Create your views here.
 def home(request):
-    return render(request, 'home.html')
\ No newline at end of file
+    return render(request, 'home.html')
+
+def metrics(request):
+    """Métricas de todos los workers en formato de texto de Prometheus."""
+    allowed = request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS or request.user.is_staff
+    if not allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(app_metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+async def entity_search(request):
+    query = request.GET.get('q', '').strip()
+    results = []
+    if query:
+        # FTS5 se consulta con un cursor crudo, sin API async: un solo salto a un hilo.
+        matches = await sync_to_async(search.search_entities)(query, limit=SEARCH_LIMIT, only=ENTITY_LIST_FIELDS)
+        for obj, score in matches:
+            results.append({
+                'object': obj,
+                'kind': obj._meta.verbose_name,
+                'url': reverse(f'{obj._meta.app_label}:detail', args=[obj.pk]),
+            })
+    return await arender(request, 'search.html', {
+        'query': query,
+        'results': results,
+        'title': 'Buscar',
+    })
+
+def entity_import(request, target, title):
+    """Carga de CSV para `core.importer` (la usan clients y suppliers).
+
+    Con "Descargar reporte" tildado la respuesta es el CSV de errores; si no,
+    se muestra el resumen con una muestra de los errores. Exige el permiso
+    `add_<modelo>`, como el alta por la API.
+    """
+    model, form_class = importer.get_target(target)
+    if not request.user.has_perm(f'{model._meta.app_label}.add_{model._meta.model_name}'):
+        return HttpResponseForbidden()
+    context = {'title': title, 'list_url': reverse(f'{target}:list')}
+    upload = request.FILES.get('file') if request.method == 'POST' else None
+    if request.method == 'POST' and upload is None:
+        context['error'] = 'Seleccioná un archivo CSV.'
+    if upload is not None:
+        want_report = bool(request.POST.get('report'))
+        report_file = tempfile.TemporaryFile() if want_report else None
+        report = io.TextIOWrapper(report_file, encoding='utf-8', newline='') if want_report else None
+        # upload.file es un BytesIO o un archivo temporal en disco según el
+        # tamaño: se decodifica en streaming sin leerlo entero.
+        stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+        try:
+            context['result'] = importer.import_entities(
+                model, form_class, stream, error_report=report, source=upload.name, request=request,
+            )
+        except (importer.InvalidFile, UnicodeDecodeError) as exc:
+            context['error'] = str(exc)
+        finally:
+            stream.detach()
+            if report:
+                report.flush()
+                report.detach()
+        if report_file is not None:
+            if 'error' in context:
+                report_file.close()
+            else:
+                report_file.seek(0)
+                return FileResponse(report_file, as_attachment=True, filename=f'errores-{target}.csv',
+                                    content_type='text/csv')
+    return render(request, 'import.html', context)
+
+
+async def entity_export(request, target):
+    """Exportación en streaming (`core.export`) con `?format=csv|jsonl`,
+    `?active=`, `?updated_since=` y `?gzip=1`.
+
+    Bajo ASGI el cuerpo es un iterador async (ver `_aiterate`); bajo WSGI se
+    deja el generador sync, que Django sirve sin juntarlo en memoria.
+    """
+    model, _ = importer.get_target(target)
+    try:
+        chunks, content_type, extension = export.export_stream(
+            model,
+            fmt=request.GET.get('format', 'csv'),
+            active=parse_active_filter(request.GET.get('active')),
+            updated_since=export.parse_since(request.GET.get('updated_since')),
+            compress=parse_active_filter(request.GET.get('gzip')) is True,
+        )
+    except export.InvalidExport as exc:
+        return HttpResponseBadRequest(str(exc))
+    if isinstance(request, ASGIRequest):
+        chunks = _aiterate(chunks)
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{target}.{extension}"'
+    return response
+
+
+def entity_autocomplete(request, target):
+    """JSON para el typeahead de `edit_select`: `?q=` (mínimo 2 caracteres) y `?limit=`."""
+    model, _ = importer.get_target(target)
+    try:
+        limit = min(int(request.GET.get('limit', AUTOCOMPLETE_LIMIT)), AUTOCOMPLETE_MAX_LIMIT)
+    except ValueError:
+        return HttpResponseBadRequest("limit debe ser un entero.")
+    results = search.suggest(model, request.GET.get('q', ''), limit=max(limit, 1))
+    for row in results:
+        row['label'] = f"{row['company_name']} - {row['name']}"
+        row['url'] = reverse(f'{target}:edit', args=[row['id']])
+    return JsonResponse({'results': results})
+
+
+def _history_changes(entry, labels):
+    """Cambios de una entrada de auditoría como `(campo, antes, después)`."""
+    changes = entry.changes or {}
+    if entry.action == 'merge':
+        changes = changes.get('fields') or {}
+    return [
+        (labels.get(name, name), *values)
+        for name, values in changes.items()
+        if isinstance(values, list) and len(values) == 2
+    ]
+
+
+async def acan_view_history(request):
+    """Si el usuario puede ver el historial de auditoría: staff con
+    `core.view_auditlog`, lo mismo que pide `/api/v1/audit/`."""
+    user = await request.auser()
+    return user.is_authenticated and user.is_staff and await user.ahas_perm(HISTORY_PERM)
+
+
+async def entity_history(request, target, pk):
+    """Fragmento con una página del historial de auditoría de un objeto.
+
+    Lo pide el panel de historial del detalle a medida que se hace scroll
+    (`?cursor=` de `KeysetPaginator`): cada página es un rango de
+    `auditlog_object_ts_idx` sobre `(content_type, object_pk, timestamp)` y
+    los actores se traen en una sola consulta, así que cuesta lo mismo con
+    cualquier largo de historial.
+
+    Muestra actores y valores de los campos: exige `acan_view_history`.
+    """
+    if not await acan_view_history(request):
+        return HttpResponseForbidden()
+    model, _ = importer.get_target(target)
+    content_type = await sync_to_async(ContentType.objects.get_for_model)(model)
+    queryset = (
+        AuditLog.objects
+        .filter(content_type=content_type, object_pk=str(pk))
+        .select_related(None)
+        .only('timestamp', 'action', 'actor', 'changes')
+        .prefetch_related(Prefetch('actor', queryset=get_user_model().objects.only('username')))
+    )
+    try:
+        page = await KeysetPaginator(queryset, HISTORY_ORDERING, HISTORY_PAGE_SIZE).apage(request.GET.get('cursor'))
+    except InvalidCursor:
+        raise Http404("Cursor de paginación inválido.")
+    labels = {field.name: field.verbose_name for field in model._meta.fields}
+    for entry in page:
+        entry.action_label = HISTORY_ACTIONS.get(entry.action, entry.action)
+        entry.change_list = _history_changes(entry, labels)
+    return await arender(request, 'components/history_entries.html', {
+        'entries': page.object_list,
+        'next_url': f"{request.path}?cursor={page.next_cursor}" if page.has_next else None,
+        'first_page': not request.GET.get('cursor'),
+    })
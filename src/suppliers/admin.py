@@ -1,8 +1,10 @@
 from django.contrib import admin
+from core.admin import FullTextSearchMixin, merge_selected
 from .models import Supplier
 
 @admin.register(Supplier)
-class SupplierAdmin(admin.ModelAdmin):
+class SupplierAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ('name', 'company_name', 'email', 'is_active')
     search_fields = ('name', 'company_name', 'email')
     list_filter = ('is_active',)
+    actions = [merge_selected]
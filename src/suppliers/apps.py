@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class SuppliersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'suppliers'
+
+    def ready(self):
+        # Altas, modificaciones y bajas auditadas (core.registry)
+        from core import registry
+        registry.register(self.get_model('Supplier'))
@@ -5,7 +5,7 @@ from core.models import Entity
 class Supplier(Entity):
     notes = models.TextField(verbose_name="Notas", blank=True, null=True)
 
-    class Meta:
+    class Meta(Entity.Meta):
         verbose_name = "Proveedor"
         verbose_name_plural = "Proveedores"
 
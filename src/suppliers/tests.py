@@ -261,4 +261,55 @@ class SupplierViewsTests(TestCase):
         
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'suppliers/edit_select.html')
-        self.assertEqual(len(response.context['suppliers']), 1)
+        self.assertEqual(response.context['autocomplete_url'], reverse('suppliers:autocomplete'))
+
+    def test_supplier_edit_select_does_not_load_suppliers(self):
+        """Test que la página de selección no consulta la tabla (costo constante)"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        Supplier.objects.create(**self.supplier_data)
+        with CaptureQueriesContext(connection) as ctx:
+            self.test_client.get(reverse('suppliers:edit_select'))
+        self.assertFalse([q for q in ctx.captured_queries if 'suppliers_supplier' in q['sql']])
+
+    def test_supplier_edit_select_post_redirects(self):
+        """Test que el POST de la selección redirige a la edición"""
+        obj = Supplier.objects.create(**self.supplier_data)
+        response = self.test_client.post(reverse('suppliers:edit_select'), {'supplier_id': obj.pk})
+        self.assertRedirects(response, reverse('suppliers:edit', args=[obj.pk]))
+
+        response = self.test_client.post(reverse('suppliers:edit_select'), {'supplier_id': ''})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['error'])
+
+    def test_supplier_autocomplete(self):
+        """Test del typeahead por prefijo de razón social, nombre o CUIT"""
+        obj = Supplier.objects.create(**self.supplier_data)
+        Supplier.objects.create(company_name='Otra Empresa', name='Otro')
+        prefix = obj.company_name[:3]
+        data = self.test_client.get(reverse('suppliers:autocomplete'), {'q': prefix}).json()
+        self.assertEqual([r['id'] for r in data['results']], [obj.pk])
+        self.assertEqual(data['results'][0]['url'], reverse('suppliers:edit', args=[obj.pk]))
+        self.assertEqual(self.test_client.get(reverse('suppliers:autocomplete'), {'q': 'x'}).json(), {'results': []})
+
+    def test_supplier_list_active_filter(self):
+        """Test filtro is_active en el listado"""
+        Supplier.objects.create(company_name='Activo', name='A', is_active=True)
+        Supplier.objects.create(company_name='Inactivo', name='B', is_active=False)
+        response = self.test_client.get(reverse('suppliers:list'), {'active': '1'})
+
+        self.assertEqual(response.status_code, 200)
+        names = [s.company_name for s in response.context['object_list']]
+        self.assertEqual(names, ['Activo'])
+
+    def test_supplier_list_ordered_by_company_name(self):
+        """Test orden estable del listado"""
+        Supplier.objects.create(company_name='Zeta', name='A')
+        Supplier.objects.create(company_name='Alfa', name='B')
+        Supplier.objects.create(company_name='Alfa', name='A')
+        response = self.test_client.get(reverse('suppliers:list'))
+
+        self.assertEqual(
+            [str(s) for s in response.context['object_list']],
+            ['Alfa - A', 'Alfa - B', 'Zeta - A']
+        )
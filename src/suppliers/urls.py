@@ -6,8 +6,12 @@ app_name = 'suppliers'
 urlpatterns = [
     path('list/', views.supplier_list, name='list'),
     path('add/', views.supplier_add, name='add'),
+    path('import/', views.supplier_import, name='import'),
+    path('export/', views.supplier_export, name='export'),
     path('edit/', views.supplier_edit_select, name='edit_select'),
+    path('autocomplete/', views.supplier_autocomplete, name='autocomplete'),
     path('edit/<int:supplier_id>/', views.supplier_edit, name='edit'),
     path('detail/<int:supplier_id>/', views.supplier_detail, name='detail'),
+    path('history/<int:supplier_id>/', views.supplier_history, name='history'),
 path('delete/<int:supplier_id>/', views.supplier_delete, name='delete'),
 ]
\ No newline at end of file
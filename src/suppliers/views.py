@@ -1,14 +1,25 @@
-from django.shortcuts import render, get_object_or_404, redirect
+from django.shortcuts import aget_object_or_404, render, get_object_or_404, redirect
+from django.db import transaction
 from django.urls import reverse
 from django.views.decorators.http import require_POST
 from django.contrib import messages  # 👈 NEW
 from .models import Supplier
 from .forms import SupplierForm
+from core import cache
+from core.models import ENTITY_LIST_FIELDS
+from core.pagination import apaginate_entities
+from core.views import acan_view_history, arender, entity_autocomplete, entity_export, entity_history, entity_import
 
-def supplier_list(request):
-    suppliers = Supplier.objects.all()
-    return render(request, 'suppliers/list.html', {
-        'object_list': suppliers,
+@cache.cache_page(Supplier)
+async def supplier_list(request):
+    # la versión se lee antes que los datos: si cambian en el medio, el
+    # fragmento queda con una versión vieja en lugar de datos viejos
+    cache_version = await cache.amodel_version(Supplier)
+    page = await apaginate_entities(request, Supplier.objects.only(*ENTITY_LIST_FIELDS))
+    return await arender(request, 'suppliers/list.html', {
+        'object_list': page.object_list,
+        'page': page,
+        'cache_version': cache_version,
         'title': 'Listado de Proveedores',
         'model_name': 'supplier'
     })
@@ -17,7 +28,9 @@ def supplier_add(request):
     if request.method == "POST":
         form = SupplierForm(request.POST)
         if form.is_valid():
-            form.save()
+            # la fila y su índice de búsqueda se confirman juntos
+            with transaction.atomic():
+                form.save()
             messages.success(request, "Proveedor creado correctamente.")  # 👈 NEW
             return redirect("suppliers:list")
         else:
@@ -27,8 +40,18 @@ def supplier_add(request):
     return render(request, "suppliers/add.html", {"form": form, "title": "Agregar Proveedor"})
 
 def supplier_edit_select(request):
-    suppliers = Supplier.objects.all()
-    return render(request, "suppliers/edit_select.html", {"suppliers": suppliers, "title": "Seleccionar Proveedor"})
+    # Sin listar todos los registros: el select se completa con el typeahead.
+    error = None
+    if request.method == "POST":
+        supplier_id = request.POST.get("supplier_id", "")
+        if supplier_id.isdigit():
+            return redirect("suppliers:edit", supplier_id=int(supplier_id))
+        error = "Elegí un proveedor de la lista."
+    return render(request, "suppliers/edit_select.html", {
+        "title": "Seleccionar Proveedor",
+        "autocomplete_url": reverse("suppliers:autocomplete"),
+        "error": error,
+    })
 
 def supplier_edit(request, supplier_id):
     supplier = get_object_or_404(Supplier, id=supplier_id)
@@ -36,7 +59,8 @@ def supplier_edit(request, supplier_id):
     if request.method == 'POST':
         form = SupplierForm(request.POST, instance=supplier)
         if form.is_valid():
-            form.save()
+            with transaction.atomic():
+                form.save()
             messages.success(request, "Proveedor actualizado correctamente.")  # 👈 NEW
             return redirect('suppliers:list')
         else:
@@ -49,12 +73,16 @@ def supplier_edit(request, supplier_id):
         'title': 'Modificar Proveedor'
     })
 
-def supplier_detail(request, supplier_id):
-    supplier = get_object_or_404(Supplier, id=supplier_id)
-    return render(request, 'suppliers/detail.html', {
+async def supplier_detail(request, supplier_id):
+    cache_version = await cache.aobject_version(Supplier, supplier_id)
+    supplier = await aget_object_or_404(Supplier, id=supplier_id)
+    return await arender(request, 'suppliers/detail.html', {
         'entity': supplier,
+        'model_name': 'supplier',
+        'cache_version': cache_version,
         'title': 'Detalle de Proveedor',
         'edit_url': reverse('suppliers:edit', args=[supplier.id]),
+        'history_url': reverse('suppliers:history', args=[supplier.id]) if await acan_view_history(request) else None,
         'delete_url': reverse('suppliers:delete', args=[supplier.id])
     })
 
@@ -64,3 +92,15 @@ def supplier_delete(request, supplier_id):
     supplier.delete()
     messages.success(request, 'Proveedor eliminado correctamente.')  # 👈 NEW
     return redirect('suppliers:list')
+
+def supplier_import(request):
+    return entity_import(request, 'suppliers', 'Importar Proveedores')
+
+async def supplier_export(request):
+    return await entity_export(request, 'suppliers')
+
+def supplier_autocomplete(request):
+    return entity_autocomplete(request, 'suppliers')
+
+async def supplier_history(request, supplier_id):
+    return await entity_history(request, 'suppliers', supplier_id)